@@ -1,17 +1,26 @@
 #!/usr/bin/python
 from __future__ import print_function
-import matplotlib.pyplot as plt
 import numpy as np
 import pga
-from mpl_toolkits.mplot3d import Axes3D
 from rsclib.autosuper import autosuper
 from argparse import ArgumentParser
 from math import ceil, log, isnan
 
 import sys
+import json
+import time
 import numbers
+import multiprocessing
 import PyNEC
 
+from .pattern import Pattern_Analyzer, Radiation_Pattern
+from .cache   import LRU_Cache, Disk_Cache, Nec_Cache, Recording_Context
+from .nport   import Port_Context
+from .farfield import Segments, Far_Field
+from .mbpe     import MBPE
+from .coaxmodel import coax_models
+from .transmission import complex_voltage
+
 class Excitation (object):
     """ An excitation of the antenna, stores the element tag and segment
         and the voltage (both the real and the imag part
@@ -23,6 +32,24 @@ class Excitation (object):
         self.u_imag  = u_imag
     # end def __init__
 
+    @property
+    def voltage (self):
+        return complex (self.u_real, self.u_imag)
+    # end def voltage
+
+    @voltage.setter
+    def voltage (self, u):
+        u = complex (u)
+        self.u_real, self.u_imag = u.real, u.imag
+    # end def voltage
+
+    def set_phase (self, phi, u = 1):
+        """ Set the voltage from a phase phi (in rad), e.g. computed by
+            phase_shift for a phasing line, and an amplitude u
+        """
+        self.u_real, self.u_imag = complex_voltage (phi, u)
+    # end def set_phase
+
 # end class Excitation
 
 class Nec_File (object):
@@ -98,6 +125,10 @@ class Nec_File (object):
             )
     # end def helix
 
+    def reflect (self, ix, iy, iz, itx):
+        self.repr.append ("GX %d %d%d%d" % (itx, ix, iy, iz))
+    # end def reflect
+
     def wire (self, tag, segs, x1, y1, z1, x2, y2, z2, r, rdel, rrad):
         self.repr.append \
             ( "GW %d %d %g %g %g %g %g %g %g"
@@ -212,6 +243,28 @@ class Antenna_Model (autosuper):
     theta_inc     = 5
     phi_range     = 360
     theta_range   = 180
+    # Adaptive pattern computation: Instead of the fixed grid given by
+    # theta_inc and phi_inc we search the maximum forward gain first
+    # on a coarse grid and then refine around the maximum with the
+    # given steps (in degrees). The same is done for the rear window.
+    # The final resolution is adaptive_inc degrees.
+    adaptive_pattern    = False
+    adaptive_inc        = 1
+    adaptive_steps      = (15, 5, 1)
+    adaptive_rear_steps = (5, 1)
+    # Models with a geometry symmetric to the y-z plane set this and
+    # generate only the half with x >= 0 if use_symmetry is set, the
+    # other half is generated by NEC with a reflection (GX card), see
+    # mirror. NEC then exploits the symmetry when filling and factoring
+    # the interaction matrix.
+    symmetric           = False
+    # Size (in bytes) of the cache of a Port_Context with port_reduction
+    # if no nec_cache is given, this holds the structures of one model.
+    port_cache_size     = 64 * 1024 * 1024
+    # Maximum relative difference of the rational fits of the input
+    # impedance with mbpe and the maximum number of NEC solutions
+    mbpe_tolerance      = 1e-3
+    mbpe_max_points     = 25
 
     def __init__ \
         ( self
@@ -226,6 +279,13 @@ class Antenna_Model (autosuper):
         , copper_loading   = True
         , frq_min          = None
         , frq_max          = None
+        , reduced_pattern  = False
+        , adaptive_pattern = None
+        , nec_cache        = None
+        , use_symmetry     = False
+        , port_reduction   = False
+        , far_field        = False
+        , mbpe             = False
         ):
         self.theta_max     = int (self.theta_range / self.theta_inc + 1)
         self.phi_max       = int (self.phi_range   / self.phi_inc   + 1)
@@ -251,21 +311,107 @@ class Antenna_Model (autosuper):
         self.force_backward   = force_backward
         self.force_same_theta = force_same_theta
         self.copper_loading   = copper_loading
+        if adaptive_pattern is not None:
+            self.adaptive_pattern = adaptive_pattern
+        theta_inc, phi_inc    = self.theta_inc, self.phi_inc
+        if self.adaptive_pattern:
+            theta_inc = phi_inc = self.adaptive_inc
+        self.analyzer         = Pattern_Analyzer \
+            ( int (self.theta_range / theta_inc + 1)
+            , int (self.phi_range   / phi_inc   + 1)
+            , theta_inc
+            , phi_inc
+            , force_horizontal = force_horizontal
+            , force_forward    = force_forward
+            , force_backward   = force_backward
+            , force_same_theta = force_same_theta
+            )
+        # With reduced_pattern we compute the radiation pattern only
+        # for the directions needed by max_f_r_gain if the force_*
+        # options restrict the forward direction. The resulting
+        # patterns cannot be plotted.
+        self.reduced_pattern  = reduced_pattern and self.analyzer.reducible
+        self.avg_gain         = avg_gain
+        self.use_symmetry     = use_symmetry and self.symmetric
+        # With a Nec_Cache the cards are recorded and NEC computes
+        # only results not already computed for the same cards.
+        self.nec_cache        = nec_cache
+        # With port_reduction NEC computes only the structure (reduced
+        # to the ports of sources, networks and lumped loads), these are
+        # applied by matrix algebra, see nport.Port_Context. The average
+        # gain is not supported by this.
+        self.port_reduction   = port_reduction and not avg_gain
+        self.port_cache       = nec_cache
+        if self.port_reduction and nec_cache is None:
+            self.port_cache = Nec_Cache (self.port_cache_size)
+        # Voltages of the excitations overriding those of the model,
+        # see set_excitation
+        self.ex_voltages      = None
+        # With far_field NEC computes only the currents, the radiation
+        # patterns are computed from these, see farfield.Far_Field. If
+        # the geometry of the model can't be replayed by Segments, NEC
+        # computes the radiation patterns, see rebind.
+        self.far_field        = far_field
+        # With mbpe the input impedance is interpolated by a rational
+        # function from NEC solutions at a few frequencies, see
+        # mbpe.MBPE and impedance_fit.
+        self.mbpe             = mbpe
+        self.rebind ()
+    # end def __init__
+
+    def rebind (self, nec = None):
+        """ Generate geometry and parameter cards into the given nec
+            context (a new one if none is given) and forget all results
+            computed so far. This can be used to re-evaluate a model
+            after changing some of its parameters without going through
+            the argument processing of the constructor again.
+            Note that a PyNEC context cannot be reset: After geometry
+            has been completed and results have been computed, adding
+            new geometry to the same context will silently return the
+            old results. So the context passed here must be unused.
+            Allocating a new context is cheap compared to the NEC
+            computation, see bench/bench_context.py.
+            With a nec_cache a new Recording_Context is used instead,
+            with port_reduction a new Port_Context (with a cache of the
+            model if no nec_cache is given).
+        """
+        if nec is None:
+            nec = self.new_context ()
         # This can be set by register_frequency_callback and is called
         # for each frequency. We can implement frequency dependent
         # network cards where the admittance is different for each
         # frequency.
-        self.tl_by_frq        = None
-        self.nec              = PyNEC.nec_context ()
-        self.avg_gain         = avg_gain
-        self.rp               = {}
-        self.rp_avg_gain      = {}
+        self.tl_by_frq         = None
+        self.nec               = nec
+        self.rp                = {}
+        self.rp_avg_gain       = {}
+        self.z_sweep           = {}
+        self.z_fit             = {}
+        self.segments          = None
+        # nec contexts of patterns computed by nec_pattern by frequency
+        self.rp_context        = {}
         self.geometry          ()
+        if self.far_field:
+            segments = Segments ()
+            self.geometry (segments)
+            if segments.replayable:
+                self.segments = segments
         self.geometry_complete ()
         self.nec_params        ()
         self.transmission_line ()
         self.handle_frequency  ()
-    # end def __init__
+    # end def rebind
+
+    def new_context (self):
+        """ A new (empty) nec context: A PyNEC context or a stand-in
+            for it with nec_cache or port_reduction.
+        """
+        if self.port_reduction:
+            return Port_Context (self.port_cache)
+        if self.nec_cache is None:
+            return PyNEC.nec_context ()
+        return Recording_Context (self.nec_cache)
+    # end def new_context
 
     def as_nec (self, compute = True):
         c = self.cmdline ().split ('\n')
@@ -295,33 +441,123 @@ class Antenna_Model (autosuper):
         return ''
     # end def cmdline
 
-    def _compute (self, nec = None, avgain = False):
+    def _compute (self, nec = None, avgain = False, impedance_only = False):
+        """ Emit frequency and radiation pattern cards.
+            With impedance_only we emit an XQ card instead of the RP
+            card: This computes only the currents and the input
+            impedance, no radiation pattern.
+        """
         if nec is None:
             nec = self.nec
         if avgain:
             self.nec_params_avg_gain (nec)
         else:
             self.nec_params_compute (nec)
+        partial = \
+            (   (self.reduced_pattern or self.adaptive_pattern)
+            and nec is self.nec
+            and not avgain
+            and not impedance_only
+            and self.segments is None
+            )
+        # Index of next radiation pattern in nec context
+        self.rp_count = self.avg_offset
         for n, (lo, hi) in enumerate (self.frq_ranges):
-            if callable (self.tl_by_frq):
+            if callable (self.tl_by_frq) or partial:
+                f = lo
                 for i in range (self.frq_max_idx):
-                    f = lo + i * self.frq_inc [n]
-                    self.tl_by_frq (nec, f)
+                    if callable (self.tl_by_frq):
+                        f = lo + i * self.frq_inc [n]
+                        self.tl_by_frq (nec, f)
                     nec.fr_card (0, 1, f, 0)
-                    nec.rp_card \
-                        ( 0, self.theta_max, self.phi_max
-                        , 0, 0, 0, int (self.avg_gain), 0, 0
-                        , self.theta_inc, self.phi_inc, 0, 0
-                        )
+                    if partial:
+                        self._compute_partial (nec, n * self.frq_step_max + i)
+                    else:
+                        self._execute (nec, impedance_only)
+                    # NEC adds the increment for each step of an FR
+                    # card, do the same to get identical frequencies.
+                    f += self.frq_inc [n]
             else:
                 nec.fr_card (0, self.frq_max_idx, lo, self.frq_inc [n])
-                nec.rp_card \
-                    ( 0, self.theta_max, self.phi_max
-                    , 0, 0, 0, int (self.avg_gain), 0, 0
-                    , self.theta_inc, self.phi_inc, 0, 0
-                    )
+                self._execute (nec, impedance_only)
     # end def _compute
 
+    def _execute (self, nec, impedance_only = False):
+        if impedance_only or (self.segments is not None and nec is self.nec):
+            nec.xq_card (0)
+        else:
+            nec.rp_card \
+                ( 0, self.theta_max, self.phi_max
+                , 0, 0, 0, int (self.avg_gain), 0, 0
+                , self.theta_inc, self.phi_inc, 0, 0
+                )
+    # end def _execute
+
+    def _compute_partial (self, nec, idx):
+        """ Compute the radiation pattern for the current frequency only
+            for the directions needed by max_f_r_gain: First the
+            allowed forward directions, then the rear window around the
+            maximum forward gain. Each needs one or a few RP cards
+            covering rectangular regions of the full grid.
+            For an adaptive pattern both are searched coarse to fine.
+        """
+        a  = self.analyzer
+        rp = Radiation_Pattern \
+            (a.theta_max, a.phi_max, a.theta_inc, a.phi_inc)
+        if self.adaptive_pattern:
+            t, p   = np.argwhere (a.mask) [0]
+            self._refine (nec, rp, a.mask, self.adaptive_steps, t, p)
+            n1, n2 = a.forward_index (rp.get_gain () [np.newaxis])
+            n1, n2 = n1 [0], a.wrap (n2 [0] - a.phi_max // 2, a.phi_max)
+            rear   = a.rear_window (n1, n2 + a.phi_max // 2)
+            self._refine (nec, rp, rear, self.adaptive_rear_steps, n1, n2)
+        else:
+            for region in a.forward_regions:
+                self._compute_region (nec, rp, *region)
+            for region in a.rear_regions (rp.get_gain ()):
+                self._compute_region (nec, rp, *region)
+        self.rp [idx] = rp
+    # end def _compute_partial
+
+    def _refine (self, nec, rp, allowed, steps, n1, n2):
+        """ Search the maximum gain in the allowed directions (a boolean
+            array) coarse to fine: For each step (in degrees) compute
+            the directions on a grid with that step, after the first
+            step only around the maximum found so far. The grid of the
+            first step contains the direction with theta index n1 and
+            phi index n2, later grids contain the maximum found so far.
+            The steps must divide 180 degrees.
+        """
+        a    = self.analyzer
+        area = allowed
+        for n, step in enumerate (steps):
+            s = int (round (step / self.adaptive_inc))
+            if n:
+                gains  = rp.get_gain ()
+                n1, n2 = a.max_index (gains [np.newaxis], allowed)
+                n1, n2 = n1 [0], n2 [0]
+                area   = allowed & a.box (n1, n2, last)
+            t0, p0 = int (n1 % s), int (n2 % s)
+            need   = area & np.isnan (rp.get_gain ())
+            for t, nt, p, np_ in a.regions (need [t0::s, p0::s]):
+                self._compute_region \
+                    (nec, rp, t0 + t * s, nt, p0 + p * s, np_, s)
+            last = s
+    # end def _refine
+
+    def _compute_region \
+        (self, nec, rp, theta_idx, n_theta, phi_idx, n_phi, step = 1):
+        nec.rp_card \
+            ( 0, n_theta, n_phi
+            , 0, 0, 0, 0
+            , theta_idx * rp.theta_inc, phi_idx * rp.phi_inc
+            , step * rp.theta_inc, step * rp.phi_inc, 0, 0
+            )
+        pattern = nec.get_radiation_pattern (self.rp_count)
+        rp.add (pattern, theta_idx, phi_idx, step)
+        self.rp_count += 1
+    # end def _compute_region
+
     def compute (self, frq_step = None, avgain = False):
         self._compute (avgain = avgain)
         rp  = self.rp
@@ -335,10 +571,23 @@ class Antenna_Model (autosuper):
         for n, (lo, hi) in enumerate (self.frq_ranges):
             idx = n * self.frq_step_max + frq_step
             if idx not in rp:
-                rp [idx] = self.nec.get_radiation_pattern (idx + off)
+                rp [idx] = self.radiation_pattern (idx + off)
         a = 0
     # end def compute
 
+    def compute_impedance (self):
+        """ Compute only the input impedance (and therefore the VSWR)
+            without a radiation pattern. This is much cheaper than
+            compute and is used for screening candidates during
+            optimization. To compute radiation patterns afterwards the
+            model must be re-bound to a new nec context, see rebind.
+        """
+        self._compute (impedance_only = True)
+        # No average gain pass has been run in this context
+        self.avg_offset = 0
+        self.z_sweep    = {}
+    # end def compute_impedance
+
     def frq_step_range (self, step = 1):
         return range (0, self.frq_step_max, step)
     # end def frq_step_range
@@ -349,6 +598,17 @@ class Antenna_Model (autosuper):
         raise NotImplemented ("Derived class must implement 'geometry'")
     # end def geometry
 
+    def mirror (self, geo):
+        """ Complete a geometry generated for x >= 0 by reflecting it
+            at the y-z plane. The tags of the reflected wires are those
+            of the original wires incremented by the number of tags used
+            so far. Wires must not lie in the y-z plane and wires
+            crossing it must be split there.
+        """
+        geo.reflect (1, 0, 0, self.tag - 1)
+        self.tag += self.tag - 1
+    # end def mirror
+
     def geometry_complete (self, nec = None):
         """ Currently no ground model
             Derived classes may implement a 'ground' method, if this
@@ -394,11 +654,34 @@ class Antenna_Model (autosuper):
         nec.set_extended_thin_wire_kernel (True)
         if isinstance (self.ex, Excitation):
             self.ex = [self.ex]
+        if self.ex_voltages is not None:
+            if len (self.ex_voltages) != len (self.ex):
+                raise ValueError \
+                    ( "Got %d voltages for %d excitations"
+                    % (len (self.ex_voltages), len (self.ex))
+                    )
+            for ex, u in zip (self.ex, self.ex_voltages):
+                ex.voltage = u
         for ex in self.ex:
             nec.ex_card \
                 (0, ex.tag, ex.segment, 0, ex.u_real, ex.u_imag, 0, 0, 0, 0)
     # end def nec_params
 
+    def set_excitation (self, voltages):
+        """ Set the (complex) voltages of the excitations (in the order
+            of self.ex) and re-bind the model, e.g. for studying the
+            phasing of several feeds. With port_reduction the structure
+            is computed by NEC only once for unit excitations of the
+            feed segments, the impedances and patterns for any other
+            voltages are a linear combination of these. None restores
+            the voltages of the model.
+        """
+        self.ex_voltages = voltages
+        if voltages is not None:
+            self.ex_voltages = list (voltages)
+        self.rebind ()
+    # end def set_excitation
+
     def nec_params_compute (self, nec = None):
         """ NEC cards to set when doing the *real* computation, if
             average gain computation has been specified these must not
@@ -425,85 +708,153 @@ class Antenna_Model (autosuper):
             nec.gn_card (1, 0, 0, 0, 0, 0, 0, 0)
     # end def nec_params_avg_gain
 
+    def avg_gain_correction (self, idx):
+        """ If we have requested average gain computation, this returns
+            the correction (in dB) for the gain with the given index.
+        """
+        if not self.avg_gain:
+            return 0.0
+        avg  = self.rp_avg_gain [idx].get_average_power_gain ()
+        # Seems to happen for ill-conditioned antennas, obviously
+        # the average gain should be always positive.
+        # We make it very large to subtract a high amount from the
+        # gain
+        if avg <= 0:
+            avg = 1e12
+        exp  = 1.0
+        if hasattr (self, 'ground'):
+            assert self.theta_range == 90
+            exp = 2.0
+        avdb = 10 * (log (exp / avg) / log (10))
+        # We don't want ill-conditioned antennas where we correct
+        # the gain *up*. Only down corrections of the gain happen.
+        if avdb < 0:
+            return avdb
+        return 0.0
+    # end def avg_gain_correction
+
+    def get_pattern (self, idx):
+        """ Get radiation pattern (and average gain pattern if
+            requested) with the given index.
+        """
+        if idx not in self.rp:
+            self.rp [idx] = self.radiation_pattern (idx + self.avg_offset)
+        if self.avg_gain and idx not in self.rp_avg_gain:
+            self.rp_avg_gain [idx] = self.radiation_pattern (idx)
+        return self.rp [idx]
+    # end def get_pattern
+
+    def radiation_pattern (self, index):
+        """ Radiation pattern with the given index of the nec context.
+            With far_field it is computed from the currents of the NEC
+            execution with that index for the grid of the pattern
+            analyzer, e.g. with adaptive_pattern this is the full grid
+            with the resolution of the adaptive search. If the segments
+            don't match those of NEC, the pattern is computed by NEC.
+        """
+        if self.segments is None:
+            return self.nec.get_radiation_pattern (index)
+        a        = self.analyzer
+        avgain   = index < self.avg_offset
+        currents = self.nec.get_structure_currents (index)
+        try:
+            ff = Far_Field \
+                ( self.segments
+                , currents
+                , self.nec.get_input_parameters (index).get_power ().sum ()
+                , self.ground_card (avgain)
+                )
+        except ValueError:
+            return self.nec_pattern (currents.get_frequency () / 1e6, avgain)
+        return ff.pattern \
+            ( np.arange (a.theta_max) * a.theta_inc
+            , np.arange (a.phi_max)   * a.phi_inc
+            )
+    # end def radiation_pattern
+
+    def nec_pattern (self, f, avgain = False):
+        """ Radiation pattern for frequency f (in MHz) computed by NEC
+            in a new nec context, the pattern is only valid as long as
+            its context exists, so we keep the context.
+        """
+        key = (f, avgain)
+        if key not in self.rp_context:
+            nec = self.new_context ()
+            self.replay (nec, avgain)
+            if callable (self.tl_by_frq):
+                self.tl_by_frq (nec, f)
+            nec.fr_card (0, 1, f, 0)
+            self._execute (nec)
+            self.rp_context [key] = nec
+        return self.rp_context [key].get_radiation_pattern (0)
+    # end def nec_pattern
+
+    def replay (self, nec, avgain = False):
+        """ Emit all cards of the model up to the frequency into the
+            given (new) nec context
+        """
+        self.geometry          (nec)
+        self.geometry_complete (nec)
+        self.nec_params        (nec)
+        self.transmission_line (nec)
+        if avgain:
+            self.nec_params_avg_gain (nec)
+        else:
+            self.nec_params_compute (nec)
+    # end def replay
+
+    def ground_card (self, avgain = False):
+        """ Arguments of the GN card of the computation (or of the
+            average gain computation), None without ground
+        """
+        r = Recording_Context (None)
+        if avgain:
+            self.nec_params_avg_gain (r)
+        else:
+            self.nec_params_compute (r)
+        gn = [args for target, name, args in r.cards if name == 'gn_card']
+        if gn:
+            return gn [-1]
+        return None
+    # end def ground_card
+
     def max_f_r_gain (self, frq = 0, frq_step = None):
         """ Maximum forward and backward gain
             If we have requested average gain computation, this corrects
             the gain by the average gain.
+            The analysis of the pattern is done by the pattern analyzer,
+            see max_f_r_gains for computing all frequency steps at once.
         """
         if frq_step is None:
             frq_step = self.frq_step_max // 2
         idx = frq * self.frq_step_max + frq_step
-        if idx not in self.rp:
-            self.rp [idx] = self.nec.get_radiation_pattern \
-                (idx + self.avg_offset)
-        if self.avg_gain and idx not in self.rp_avg_gain:
-            self.rp_avg_gain [idx] = self.nec.get_radiation_pattern (idx)
-        gains = self.rp [idx].get_gain ()
-        n1max = n2max = -1
-        gmax  = None
-        # First loop is theta, second is phi
-        for n1, ga in enumerate (gains):
-            for n2, g in enumerate (ga):
-                if not self.force_horizontal or n1 == self.theta_horz:
-                    if  (  (not self.force_forward and not self.force_backward)
-                        or (self.force_forward  and n2 ==  0)
-                        or (self.force_backward and n2 == self.phi_mid)
-                        ):
-                        if gmax is None or g > gmax:
-                            gmax = g
-                            n1max = n1
-                            n2max = n2
-        # The other side of gmax: Find the maximum 30 deg around the
-        # opposite side but with the same theta angle (also +- 30 deg)
-        rmax = None
-        phi2 = self.phi_max   // 2
-        the2 = self.theta_max // 2
-        p30  = 30 // self.phi_inc
-        t30  = 30 // self.theta_inc
-        tm   = None
-        pm   = None
-        trange = range (n1max - t30, n1max + t30 + 1)
-        if self.force_same_theta:
-            trange = [n1max]
-        for t in trange:
-            theta = t
-            if theta < 0:
-                theta += self.theta_max - 1
-            if theta >= self.theta_max:
-                theta -= self.theta_max - 1
-            assert 0 <= theta < self.theta_max
-            for p in range (n2max - p30 - phi2, n2max + p30 + 1 - phi2):
-                phi = p
-                if phi < 0:
-                    phi += self.phi_max - 1
-                if phi >= self.phi_max:
-                    phi -= self.phi_max - 1
-                assert 0 <= phi < self.phi_max
-                if rmax is None or gains [theta][phi] > rmax:
-                    rmax = gains [theta][phi]
-                    pm   = phi
-                    tm   = theta
+        gains = self.get_pattern (idx).get_gain ()
+        gmax, rmax = self.analyzer.max_f_r_gain (gains)
         if self.avg_gain:
-            avg  = self.rp_avg_gain [idx].get_average_power_gain ()
-            # Seems to happen for ill-conditioned antennas, obviously
-            # the average gain should be always positive.
-            # We make it very large to subtract a high amount from the
-            # gain
-            if avg <= 0:
-                avg = 1e12
-            exp  = 1.0
-            if hasattr (self, 'ground'):
-                assert self.theta_range == 90
-                exp = 2.0
-            avdb = 10 * (log (exp / avg) / log (10))
-            # We don't want ill-conditioned antennas where we correct
-            # the gain *up*. Only down corrections of the gain happen.
-            if avdb < 0:
-                gmax += avdb
-                rmax += avdb
+            avdb  = self.avg_gain_correction (idx)
+            gmax += avdb
+            rmax += avdb
         return gmax, rmax
     # end def max_f_r_gain
 
+    def max_f_r_gains (self, frq = 0, frq_steps = None):
+        """ Maximum forward and backward gain for several frequency
+            steps (by default all of frq_step_range) of the given
+            frequency range. Returns two arrays with one entry per
+            frequency step.
+        """
+        if frq_steps is None:
+            frq_steps = self.frq_step_range ()
+        idxs  = [frq * self.frq_step_max + s for s in frq_steps]
+        gains = np.array ([self.get_pattern (i).get_gain () for i in idxs])
+        gmax, rmax = self.analyzer.max_f_r_gain (gains)
+        if self.avg_gain:
+            avdb  = np.array ([self.avg_gain_correction (i) for i in idxs])
+            gmax += avdb
+            rmax += avdb
+        return gmax, rmax
+    # end def max_f_r_gains
+
     def show_gains (self, frq_idx = 0, prefix = ''):
         r = []
         step = self.frq_step_max // 2
@@ -521,13 +872,16 @@ class Antenna_Model (autosuper):
                       , rpa.get_average_power_solid_angle ()
                       )
             r.append (rr)
-        vswrs = list \
-            (self.vswr (frq_idx, i) for i in self.frq_step_range (step))
+        vswrs = self.vswr_array (frq_idx, self.frq_step_range (step))
         r.append ("SWR: %1.2f %1.2f %1.2f" % tuple (vswrs))
         return r
     # end def show_gains
 
     def plot (self, frq_idx = 0, frq_step = None):
+        # Importing matplotlib dominates the start-up time, so we
+        # import it only when plotting, see bench/bench_import.py
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D
         if frq_step is None:
             frq_step = self.frq_step_max // 2
         idx = self.frq_step_max * frq_idx + frq_step
@@ -588,29 +942,233 @@ class Antenna_Model (autosuper):
     def swr_plot (self):
         """ If we have several frequency ranges we do a plot for each
         """
-        fun   = self.nec.get_radiation_pattern
+        import matplotlib.pyplot as plt
         for frq in range (len (self.frq_ranges)):
-            offset = frq * self.frq_step_max + self.avg_offset
-            frqs  = []
-            vswrs = []
-            for i in self.frq_step_range ():
-                frqs.append  (fun (i + offset).get_frequency ())
-                vswrs.append (self.vswr (frq, i))
+            frqs   = self.impedance_sweep (frq) [0]
+            vswrs  = self.vswr_array (frq)
             fig = plt.figure ()
             ax  = fig.add_subplot (111)
             ax.plot (frqs, vswrs)
-            ax.set_title ('Freq range: %.2f - %.2f MHz' % self.frq_ranges [frq])
+            title = 'Freq range: %.2f - %.2f MHz' % self.frq_ranges [frq]
+            if self.mbpe:
+                f, err, vswr_fit, vswr_nec = self.mbpe_error (frq)
+                title += \
+                    ( '\nHold-out %.2f MHz: error %.2g%%'
+                      ' VSWR fit: %.3f NEC: %.3f'
+                    % (f, err * 100, vswr_fit, vswr_nec)
+                    )
+            ax.set_title (title)
             plt.show ()
     # end def swr_plot
 
-    def vswr (self, frq_idx, frq_step):
+    def frequencies (self, frq_idx):
+        """ Frequencies (in Hz) of all steps of the given frequency
+            range as computed by NEC.
+        """
+        offset = frq_idx * self.frq_step_max
+        return np.array \
+            ([ self.get_pattern (i + offset).get_frequency ()
+               for i in self.frq_step_range ()
+            ])
+    # end def frequencies
+
+    def impedances (self, frq_idx, frq_steps):
+        """ Input impedances for the given frequency steps of the
+            given frequency range as an array.
+        """
+        if self.mbpe:
+            lo  = self.frq_ranges [frq_idx][0]
+            f   = lo + np.asarray (frq_steps) * self.frq_inc [frq_idx]
+            return self.impedance_fit (frq_idx) (f)
         off = frq_idx * self.frq_step_max + self.avg_offset
-        ipt = self.nec.get_input_parameters (off + frq_step)
-        z   = ipt.get_impedance ()
+        return np.array \
+            ([ self.nec.get_input_parameters (off + s).get_impedance () [0]
+               for s in frq_steps
+            ])
+    # end def impedances
+
+    def impedance_fit (self, frq_idx):
+        """ Rational fit (an MBPE object) of the input impedance over
+            the given frequency range (frequencies in MHz). NEC solves
+            the model only at the frequencies chosen by MBPE, this is
+            done in a new nec context, so the results of the model's
+            context are not affected. The hold-out impedance of the fit
+            gives an estimate of its error, see mbpe_error.
+        """
+        if frq_idx not in self.z_fit:
+            nec = self.new_context ()
+            self.replay (nec)
+            z = []
+            def solve (frqs):
+                for f in frqs:
+                    if callable (self.tl_by_frq):
+                        self.tl_by_frq (nec, f)
+                    nec.fr_card (0, 1, f, 0)
+                    nec.xq_card (0)
+                    ip = nec.get_input_parameters (len (z))
+                    z.append (ip.get_impedance () [0])
+                return z [-len (frqs):]
+            lo, hi = self.frq_ranges [frq_idx]
+            self.z_fit [frq_idx] = MBPE \
+                ( solve, lo, hi
+                , tolerance  = self.mbpe_tolerance
+                , max_points = self.mbpe_max_points
+                )
+        return self.z_fit [frq_idx]
+    # end def impedance_fit
+
+    def mbpe_error (self, frq_idx):
+        """ Error estimate of the fitted impedance of the given
+            frequency range from its hold-out impedance: Returns the
+            frequency (in MHz) of the hold-out, the relative error of
+            the impedance and the VSWR of the fit and of NEC there.
+        """
+        fit = self.impedance_fit (frq_idx)
+        z   = np.array ([fit (fit.holdout_frequency), fit.holdout_impedance])
         rho = np.abs ((z - self.impedance) / (z + self.impedance))
-        return ((1. + rho) / (1. - rho)) [0]
+        vswr_fit, vswr_nec = (1. + rho) / (1. - rho)
+        return fit.holdout_frequency, fit.error, vswr_fit, vswr_nec
+    # end def mbpe_error
+
+    def impedance_sweep (self, frq_idx):
+        """ Frequencies (in Hz) and input impedances of all frequency
+            steps of the given frequency range as arrays. This needs
+            only the impedances (e.g. from compute_impedance), the
+            result is kept until the next rebind. With mbpe the
+            impedances are computed from the rational fit.
+        """
+        if frq_idx not in self.z_sweep and self.mbpe:
+            lo = self.frq_ranges [frq_idx][0]
+            f  = lo + np.arange (self.frq_step_max) * self.frq_inc [frq_idx]
+            self.z_sweep [frq_idx] = \
+                (f * 1e6, self.impedance_fit (frq_idx) (f))
+        if frq_idx not in self.z_sweep:
+            off = frq_idx * self.frq_step_max + self.avg_offset
+            ip  = [ self.nec.get_input_parameters (off + s)
+                    for s in self.frq_step_range ()
+                  ]
+            self.z_sweep [frq_idx] = \
+                ( np.array ([p.get_frequency () for p in ip])
+                , np.array ([p.get_impedance () [0] for p in ip])
+                )
+        return self.z_sweep [frq_idx]
+    # end def impedance_sweep
+
+    def feedline (self, frq_idx, cables, lengths):
+        """ Transform the impedance sweep of the given frequency range
+            through a feed line for each of the given cables (objects
+            from coaxmodel) and lengths (in m). The computation is
+            vectorized over lengths and frequencies. Returns the
+            frequencies and the impedance at the transmitter, the SWR
+            at the transmitter and the total loss of the cable (in dB),
+            each with shape (cables, lengths, frequencies).
+        """
+        f, z = self.impedance_sweep (frq_idx)
+        l    = np.asarray (lengths, dtype = float) [:, None]
+        z_tx = np.array ([c.z_d (f, l, z) for c in cables])
+        loss = np.array ([c.total_loss (f, l, z) for c in cables])
+        rho  = np.abs ((z_tx - self.impedance) / (z_tx + self.impedance))
+        return f, z_tx, (1. + rho) / (1. - rho), loss
+    # end def feedline
+
+    def show_feedline (self, frq_idx, cables, lengths):
+        r = []
+        f, z_tx, swr, loss = self.feedline (frq_idx, cables, lengths)
+        swr_ant = self.vswr_array (frq_idx)
+        r.append ('FRQ Range: %.2f-%.2f' % self.frq_ranges [frq_idx])
+        for i, cable in enumerate (cables):
+            for j, l in enumerate (lengths):
+                r.append ('Feedline: %.2f m %s' % (l, cable.name))
+                for k, frq in enumerate (f):
+                    r.append \
+                        ( "FRQ: %3.2f SWR antenna: %1.2f transmitter: %1.2f"
+                          " loss: %.2f dB"
+                        % ( frq / 1e6, swr_ant [k]
+                          , swr [i, j, k], loss [i, j, k]
+                          )
+                        )
+        return r
+    # end def show_feedline
+
+    def verify_symmetry (self):
+        """ Compute the model once with the full geometry and once with
+            the half geometry reflected by NEC (see mirror) and compare
+            the impedances and the forward and backward gains of all
+            frequency steps. Splitting wires at the plane of symmetry
+            changes the segmentation, so small differences are
+            expected. Returns the lines of a report, afterwards the
+            model is re-bound with its original setting of use_symmetry.
+        """
+        if not self.symmetric:
+            return \
+                ['Geometry of %s is not symmetric' % self.__class__.__name__]
+        use_symmetry = self.use_symmetry
+        results      = []
+        for sym in (False, True):
+            self.use_symmetry = sym
+            self.rebind ()
+            t = time.time ()
+            if self.avg_gain:
+                self.compute (avgain = True)
+            self.compute ()
+            z = [self.impedances (n, self.frq_step_range ())
+                 for n in range (len (self.frq_ranges))
+                ]
+            g = [self.max_f_r_gains (n)
+                 for n in range (len (self.frq_ranges))
+                ]
+            results.append ((time.time () - t, z, g))
+        self.use_symmetry = use_symmetry
+        self.rebind ()
+        (tf, zf, gf), (ts, zs, gs) = results
+        r = []
+        r.append \
+            ( "Time full: %.2f s symmetric: %.2f s speed-up: %.1f"
+            % (tf, ts, tf / ts)
+            )
+        for n in range (len (self.frq_ranges)):
+            dz = np.abs (zs [n] - zf [n]) / np.abs (zf [n])
+            k  = self.frq_step_max // 2
+            r.append ('FRQ Range: %.2f-%.2f' % self.frq_ranges [n])
+            r.append \
+                ( "Z full: %.2f%+.2fj symmetric: %.2f%+.2fj"
+                  " max. difference: %.2f%%"
+                % ( zf [n][k].real, zf [n][k].imag
+                  , zs [n][k].real, zs [n][k].imag
+                  , dz.max () * 100
+                  )
+                )
+            for name, i in (('fw', 0), ('bw', 1)):
+                r.append \
+                    ( "%s full: %2.2f symmetric: %2.2f"
+                      " max. difference: %.2f dB"
+                    % ( name, gf [n][i][k], gs [n][i][k]
+                      , np.abs (gs [n][i] - gf [n][i]).max ()
+                      )
+                    )
+        return r
+    # end def verify_symmetry
+
+    def vswr (self, frq_idx, frq_step):
+        return self.vswr_array (frq_idx, (frq_step,)) [0]
     # end def vswr
 
+    def vswr_array (self, frq_idx, frq_steps = None):
+        """ VSWR for several frequency steps (by default all of
+            frq_step_range) of the given frequency range. The
+            impedances are collected into one array and the reflection
+            coefficient and VSWR are computed for all steps at once.
+        """
+        if frq_steps is None:
+            z = self.impedance_sweep (frq_idx) [1]
+        else:
+            z = self.impedances (frq_idx, frq_steps)
+        rho = np.abs ((z - self.impedance) / (z + self.impedance))
+        # A short (e.g. by a stub of length 0) has infinite VSWR
+        with np.errstate (divide = 'ignore'):
+            return (1. + rho) / (1. - rho)
+    # end def vswr_array
+
     def register_frequency_callback (self, method):
         self.tl_by_frq = method
     # end def register_frequency_callback
@@ -618,19 +1176,29 @@ class Antenna_Model (autosuper):
 # end class Antenna_Model
 
 class Antenna_Phenotype (autosuper):
-    def __init__ (self, optimizer, antenna, frq_idx):
+    """ Evaluation results of an antenna for the given frequency range.
+        If screened is set, the antenna was rejected by the SWR screen
+        of the optimizer and no radiation pattern has been computed,
+        we use the same penalty for the gain as for a negative SWR.
+        The results computed from the antenna (VSWRs and gains) are
+        kept in raw, when raw is given (e.g. from the disk cache of the
+        optimizer) the antenna is not used for computing anything.
+    """
+    def __init__ \
+        (self, optimizer, antenna, frq_idx, screened = False, raw = None):
         self.optimizer = optimizer
         self.antenna   = antenna
         self.frq_idx   = frq_idx
         self.offset    = frq_idx * antenna.frq_step_max
-        self.vswrs     = vswrs = list \
-            (antenna.vswr (frq_idx, i) for i in antenna.frq_step_range ())
+        if raw is None:
+            raw = self.raw_results (antenna, frq_idx, screened)
+        self.raw       = raw
+        self.vswrs     = vswrs = list (raw ['vswrs'])
         # Looks like NEC sometimes computes negative SWR
         # We set the SWR to something very high in that case
         for swr in vswrs:
             if swr < 0:
                 swr_eval = swr_med = 1e6
-                gmax, rmax = (-20.0, 0.0)
                 break
         else:
             swr_eval  = sum (vswrs) / 3.0
@@ -643,19 +1211,8 @@ class Antenna_Phenotype (autosuper):
             # below optimizer.maxswr
             if optimizer.relax_swr and max (vswrs) <= optimizer.maxswr:
                 swr_eval = 1.0
-
-            # We take the *minimum* gain over all frequencies
-            # and the *maximum* rear gain over all frequencies
-            gmax = None
-            rmax = None
-            for idx in antenna.frq_step_range ():
-                f, b = antenna.max_f_r_gain (frq_idx, idx)
-                if gmax is None or gmax > f:
-                    gmax = f
-                if rmax is None or rmax < b:
-                    rmax = b
-        mid = antenna.frq_step_range () [len (antenna.frq_step_range ()) // 2]
-        self.gmid, self.rmid = antenna.max_f_r_gain (frq_idx, mid)
+        gmax, rmax = raw ['gmax'], raw ['rmax']
+        self.gmid, self.rmid = raw ['gmid'], raw ['rmid']
         if optimizer.nofb:
             rmax = 0.0
         swr_eval **= (1./2)
@@ -664,14 +1221,62 @@ class Antenna_Phenotype (autosuper):
         self.swr_eval = swr_eval
         self.swr_med  = swr_med
     # end def __init__
+
+    @staticmethod
+    def raw_results (antenna, frq_idx, screened = False):
+        """ Compute VSWRs and gains for the given frequency range
+            from the antenna, returns a dictionary.
+        """
+        vswrs = antenna.vswr_array (frq_idx)
+        # We take the *minimum* gain over all frequencies
+        # and the *maximum* rear gain over all frequencies
+        if screened or min (vswrs) < 0:
+            gmax, rmax = (-20.0, 0.0)
+        else:
+            f, b = antenna.max_f_r_gains (frq_idx)
+            gmax = f.min ()
+            rmax = b.max ()
+        if screened:
+            gmid, rmid = (-20.0, 0.0)
+        else:
+            mid = antenna.frq_step_range () \
+                [len (antenna.frq_step_range ()) // 2]
+            gmid, rmid = antenna.max_f_r_gain (frq_idx, mid)
+        return dict \
+            ( vswrs = [float (v) for v in vswrs]
+            , gmax  = float (gmax)
+            , rmax  = float (rmax)
+            , gmid  = float (gmid)
+            , rmid  = float (rmid)
+            )
+    # end def raw_results
 # end class Antenna_Phenotype
 
+# The optimizer used by the worker processes of the process pool, this
+# is set before the pool is created so that the workers inherit it.
+_optimizer = None
+
+def _evaluate_parameters (parameters):
+    """ Evaluate an antenna in a worker process of the process pool,
+        see Antenna_Optimizer.evaluate_pool.
+    """
+    return _optimizer.evaluate_parameters (parameters)
+# end def _evaluate_parameters
+
 class Antenna_Optimizer (pga.PGA, autosuper):
     """ Optimize given antenna, needs to be subclassed.
     """
 
     resolution = 0.5e-3 # 0.5 mm in meter
     ant_cls    = Antenna_Model
+    # Further attributes that determine the antenna, see cache_options
+    cache_attributes = ()
+    # Counters updated in the worker processes of the process pool
+    pool_counters    = \
+        ( 'pattern_skipped', 'pattern_computed'
+        , 'disk_cache_hits', 'disk_cache_misses'
+        , 'nec_cache_hits', 'nec_cache_misses'
+        )
 
     def __init__ \
         ( self
@@ -700,6 +1305,15 @@ class Antenna_Optimizer (pga.PGA, autosuper):
         , use_mid          = False
         , frq_min          = None
         , frq_max          = None
+        , swr_screen       = None
+        , adaptive_pattern = None
+        , jobs             = None
+        , cache_size       = 64
+        , disk_cache       = None
+        , nec_cache        = None
+        , use_symmetry     = False
+        , port_reduction   = False
+        , far_field        = False
         , ** kw
         ):
         self.verbose          = verbose
@@ -724,6 +1338,15 @@ class Antenna_Optimizer (pga.PGA, autosuper):
         self.min_gain         = min_gain
         self.min_fb           = min_fb
         self.use_mid          = use_mid
+        self.swr_screen       = swr_screen
+        self.adaptive_pattern = adaptive_pattern
+        self.use_symmetry     = use_symmetry
+        self.port_reduction   = port_reduction
+        self.far_field        = far_field
+        self.jobs             = jobs
+        self.pool             = None
+        self.pre_eval_count   = 0
+        self.parameters       = None
         if frq_min:
             self.frq_ranges = []
             for fl, fh in zip (frq_min, frq_max):
@@ -819,10 +1442,22 @@ class Antenna_Optimizer (pga.PGA, autosuper):
         self.last_best = [float ('nan')] * (self.num_eval - self.num_constraint)
         if self.title is None:
             self.title = "%s %s" % (self.__class__.__name__, self.random_seed)
-        self.cache = {}
+        self.cache = LRU_Cache (cache_size * 1024 * 1024)
         self.cache_hits = 0
         self.nohits     = 0
         self.file       = sys.stdout
+        self.pattern_skipped   = 0
+        self.pattern_computed  = 0
+        self.disk_cache        = None
+        self.disk_cache_hits   = 0
+        self.disk_cache_misses = 0
+        if disk_cache:
+            self.disk_cache = Disk_Cache (disk_cache)
+        self.nec_cache         = None
+        # The reduced structures of port_reduction are kept in the
+        # nec_cache, so they are shared by the evaluated antennas.
+        if nec_cache or port_reduction:
+            self.nec_cache = Nec_Cache ((nec_cache or 64) * 1024 * 1024)
     # end def __init__
 
     @property
@@ -838,10 +1473,109 @@ class Antenna_Optimizer (pga.PGA, autosuper):
             , force_same_theta = self.force_same_theta
             , wire_radius      = self.wire_radius
             , frq_step_max     = 3
+            , reduced_pattern  = True
+            , adaptive_pattern = self.adaptive_pattern
+            , nec_cache        = self.nec_cache
+            , use_symmetry     = self.use_symmetry
+            , port_reduction   = self.port_reduction
+            , far_field        = self.far_field
             )
         return d
     # end def antenna_args
 
+    @property
+    def nec_cache_hits (self):
+        if self.nec_cache is None:
+            return 0
+        return self.nec_cache.hits
+    # end def nec_cache_hits
+
+    @nec_cache_hits.setter
+    def nec_cache_hits (self, value):
+        if self.nec_cache is not None:
+            self.nec_cache.hits = value
+    # end def nec_cache_hits
+
+    @property
+    def nec_cache_misses (self):
+        if self.nec_cache is None:
+            return 0
+        return self.nec_cache.misses
+    # end def nec_cache_misses
+
+    @nec_cache_misses.setter
+    def nec_cache_misses (self, value):
+        if self.nec_cache is not None:
+            self.nec_cache.misses = value
+    # end def nec_cache_misses
+
+    @property
+    def cache_options (self):
+        """ Options that determine the results computed for an antenna,
+            these are part of the key of the disk cache. Subclasses that
+            pass further options to the antenna name them in
+            cache_attributes.
+        """
+        d = dict \
+            ( self.antenna_args
+            , nec_cache  = None
+            , frq_ranges = self.frq_ranges
+            , swr_screen = self.swr_screen
+            , avg_gain   = self.avg_gain
+            )
+        for a in self.cache_attributes:
+            d [a] = getattr (self, a)
+        return d
+    # end def cache_options
+
+    def disk_cache_key (self, p, pop):
+        """ The key consists of the class of the optimizer and the
+            antenna, the parameters quantized to our resolution and the
+            cache_options. Classes are qualified by their module, e.g.
+            several modules define a Folded_Dipole.
+        """
+        params = \
+            [ int (round (self.get_parameter (p, pop, i) / self.resolution))
+              for i in range (len (self.minmax))
+            ]
+        key = dict \
+            ( optimizer  = self.class_name (self.__class__)
+            , antenna    = self.class_name (self.ant_cls)
+            , parameters = params
+            , options    = self.cache_options
+            )
+        return json.dumps (key, sort_keys = True, default = self.json_default)
+    # end def disk_cache_key
+
+    @staticmethod
+    def class_name (cls):
+        """ Name of cls qualified by its module, for a module run as a
+            script (python -m) this is the name of the module, too.
+        """
+        module = cls.__module__
+        spec   = getattr (sys.modules.get (module), '__spec__', None)
+        if spec is not None:
+            module = spec.name
+        return '%s.%s' % (module, cls.__qualname__)
+    # end def class_name
+
+    @staticmethod
+    def json_default (obj):
+        """ Encode cache options JSON doesn't know: Complex numbers
+            (e.g. a load impedance) and objects with a name (e.g. a
+            cable model), anything else raises TypeError like the
+            default of json.dumps.
+        """
+        if isinstance (obj, complex):
+            return [obj.real, obj.imag]
+        if hasattr (obj, 'name'):
+            return obj.name
+        raise TypeError \
+            ( "Object of type %s is not JSON serializable"
+            % type (obj).__name__
+            )
+    # end def json_default
+
     @property
     def nfreq (self):
         return len (self.frq_ranges)
@@ -871,7 +1605,11 @@ class Antenna_Optimizer (pga.PGA, autosuper):
     def get_parameter (self, p, pop, i):
         """ Get floating-point value from encoded allele
             We tried gray code but now use binary (BCD) encoding.
+            When evaluating given parameters (see evaluate_parameters)
+            we return these instead.
         """
+        if self.parameters is not None:
+            return self.parameters [i]
         if self.use_de:
             return self.get_allele (p, pop, i)
         return self.get_real_from_binary \
@@ -899,9 +1637,15 @@ class Antenna_Optimizer (pga.PGA, autosuper):
     # end def set_parameter
 
     def cache_key (self, p, pop):
+        """ For Differential Evolution the alleles are quantized to
+            our resolution: Antennas that differ by less than that
+            can't be built anyway.
+        """
         if self.use_de:
             return tuple \
-                (self.get_allele (p, pop, k) for k in range (len (self)))
+                ( int (round (self.get_allele (p, pop, k) / self.resolution))
+                  for k in range (len (self))
+                )
         ck = 0
         for k in range (len (self)):
             ck <<= 1
@@ -910,27 +1654,159 @@ class Antenna_Optimizer (pga.PGA, autosuper):
     # end def cache_key
 
     def pre_eval (self, pop):
-        # Do not run before very first eval
-        if pop != pga.PGA_NEWPOP:
-            return
+        """ Look up the individuals that are not up to date in the
+            cache and evaluate the remaining ones here (sequentially or
+            in the process pool) so that all evaluations are cached.
+            Individuals with the same cache key (e.g. with DE alleles
+            that differ by less than the resolution) are evaluated only
+            once, the others count as cache hits.
+            With MPI the remaining individuals are left to PGApack.
+        """
+        todo = {}
         for p in range (self.pop_size):
             if self.get_evaluation_up_to_date (p, pop):
                 continue
             ck = self.cache_key (p, pop)
             if ck in self.cache:
                 self.cache_hits += 1
-                self.set_evaluation (p, pop, self.cache [ck])
-                self.set_evaluation_up_to_date (p, pop, True)
+                self.set_evaluation_value (p, pop, self.cache [ck])
+            elif ck in todo:
+                self.cache_hits += 1
+                todo [ck].append (p)
             else:
                 self.nohits += 1
+                todo [ck] = [p]
+        if not todo:
+            return
+        keys  = list (todo)
+        first = [todo [ck][0] for ck in keys]
+        if self.jobs and self.jobs > 1:
+            result = self.evaluate_pool (pop, first)
+        elif self.mpi_n_proc > 1:
+            return
+        else:
+            result = [self.evaluate (p, pop) for p in first]
+        for ck, ev in zip (keys, result):
+            for p in todo [ck]:
+                self.set_evaluation_value (p, pop, ev)
+            self.cache [ck] = ev
+        self.pre_eval_count += len (keys)
     # end def pre_eval
 
+    def set_evaluation_value (self, p, pop, ev):
+        """ Set evaluation as returned by evaluate and mark it up to date
+        """
+        if isinstance (ev, tuple):
+            self.set_evaluation (p, pop, *ev)
+        else:
+            self.set_evaluation (p, pop, ev)
+        self.set_evaluation_up_to_date (p, pop, True)
+    # end def set_evaluation_value
+
+    def evaluate_pool (self, pop, todo):
+        """ Evaluate the given individuals of the population in a pool
+            of worker processes. This is an alternative to parallel
+            evaluation with MPI. The workers are forked from the
+            optimizer and therefore don't need to import the modules
+            again, we only pass the parameters of the antenna to a
+            worker and get back the evaluation.
+        """
+        global _optimizer
+        if self.pool is None:
+            _optimizer = self
+            ctx        = multiprocessing.get_context ('fork')
+            self.pool  = ctx.Pool (self.jobs)
+        n      = len (self.minmax)
+        params = \
+            [ [self.get_parameter (p, pop, i) for i in range (n)]
+              for p in todo
+            ]
+        result = []
+        for ev, counts in self.pool.map (_evaluate_parameters, params):
+            result.append (ev)
+            for c, v in zip (self.pool_counters, counts):
+                setattr (self, c, getattr (self, c) + v)
+        return result
+    # end def evaluate_pool
+
+    def evaluate_parameters (self, parameters):
+        """ Evaluate the antenna with the given parameters instead of
+            an individual of the population. Returns the evaluation and
+            the changes of the counters in pool_counters.
+        """
+        counters = [getattr (self, c) for c in self.pool_counters]
+        self.parameters = parameters
+        try:
+            ev = self.evaluate (None, None)
+        finally:
+            self.parameters = None
+        return \
+            ( ev
+            , [getattr (self, c) - v
+               for c, v in zip (self.pool_counters, counters)
+              ]
+            )
+    # end def evaluate_parameters
+
+    def run (self):
+        try:
+            return self.__super.run ()
+        finally:
+            if self.pool is not None:
+                self.pool.close ()
+                self.pool.join ()
+                self.pool = None
+    # end def run
+
+    def swr_screen_passed (self, antenna):
+        """ Check the VSWR computed by antenna.compute_impedance against
+            the SWR screen: The antenna is rejected if for some
+            frequency range there is a negative SWR (see
+            Antenna_Phenotype) or the SWR is above swr_screen for all
+            frequencies of the range.
+        """
+        for n in range (len (antenna.frq_ranges)):
+            vswrs = antenna.vswr_array (n)
+            if min (vswrs) < 0 or min (vswrs) > self.swr_screen:
+                return False
+        return True
+    # end def swr_screen_passed
+
     def phenotype (self, p, pop):
-        antenna = self.compute_antenna (p, pop)
-        antenna.compute ()
+        """ With an SWR screen we first compute only the impedance
+            of the antenna and skip the (expensive) radiation pattern
+            computation if the antenna doesn't pass the screen.
+            With a disk cache we look up the results computed for the
+            antenna in an earlier run and store new results.
+        """
+        antenna  = self.compute_antenna (p, pop)
+        if self.disk_cache is not None:
+            key = self.disk_cache_key (p, pop)
+            raw = self.disk_cache.get (key)
+            if raw is not None:
+                self.disk_cache_hits += 1
+                return list \
+                    ( Antenna_Phenotype (self, antenna, n, raw = r)
+                      for n, r in enumerate (raw)
+                    )
+            self.disk_cache_misses += 1
+        screened = False
+        if self.swr_screen:
+            antenna.compute_impedance ()
+            if self.swr_screen_passed (antenna):
+                antenna.rebind ()
+            else:
+                screened = True
+        if screened:
+            self.pattern_skipped  += 1
+        else:
+            self.pattern_computed += 1
+            antenna.compute ()
         pheno = []
         for n, frq in enumerate (antenna.frq_ranges):
-            pheno.append (Antenna_Phenotype (self, antenna, n))
+            pheno.append (Antenna_Phenotype (self, antenna, n, screened))
+        if self.disk_cache is not None:
+            self.disk_cache [key] = [ph.raw for ph in pheno]
         return pheno
     # end def phenotype
 
@@ -1071,9 +1947,44 @@ class Antenna_Optimizer (pga.PGA, autosuper):
             ( "Cache hits: %s/%s %2.2f%%" % (ch, cn, 100.0 * ch / cn)
             , file = file
             )
+        print \
+            ( "Cache misses: %s evictions: %s entries: %s (%.1f MB)"
+            % ( self.nohits, self.cache.evictions, len (self.cache)
+              , self.cache.nbytes / 1024. / 1024.
+              )
+            , file = file
+            )
+        if self.disk_cache is not None:
+            dh = self.disk_cache_hits
+            dn = self.disk_cache_hits + self.disk_cache_misses
+            print \
+                ( "Disk cache hits: %s/%s %2.2f%%"
+                % (dh, dn, 100.0 * dh / max (dn, 1))
+                , file = file
+                )
+        if self.nec_cache is not None:
+            nh = self.nec_cache_hits
+            nn = self.nec_cache_hits + self.nec_cache_misses
+            print \
+                ( "NEC cache hits: %s/%s %2.2f%% entries: %s (%.1f MB)"
+                % ( nh, nn, 100.0 * nh / max (nn, 1), len (self.nec_cache)
+                  , self.nec_cache.nbytes / 1024. / 1024.
+                  )
+                , file = file
+                )
+        if self.swr_screen:
+            ps = self.pattern_skipped
+            pn = self.pattern_skipped + self.pattern_computed
+            print \
+                ( "Pattern computations skipped: %s/%s %2.2f%%"
+                % (ps, pn, 100.0 * ps / max (pn, 1))
+                , file = file
+                )
+        # Evaluations in pre_eval are not counted by PGApack
+        ne = self.eval_count + self.pre_eval_count
         print \
             ( "Iter: %s Evals: %s Stag: %s"
-            % (self.GA_iter, self.eval_count, self.stag_count)
+            % (self.GA_iter, ne, self.stag_count)
             , file = file
             )
         file.flush ()
@@ -1110,7 +2021,12 @@ class Arg_Handler:
     """ Encapsulate options that occur in (almost) every antenna
         or optimizer for an antenna.
     """
-    actions = ['optimize', 'necout', 'swr', 'gain', 'frgain']
+    actions = \
+        [ 'optimize', 'necout', 'swr', 'gain', 'frgain', 'feedline'
+        , 'symmetry'
+        ]
+    feedline_cable  = 'sytronic_RG_213_U'
+    feedline_length = 30.0
 
     def __init__ (self, **default):
         self.default = default
@@ -1126,12 +2042,43 @@ class Arg_Handler:
                         " optimization"
                         " (unsupported by xnec2c)"
             )
+        cmd.add_argument \
+            ( '--cache-size'
+            , help    = "Maximum memory used by the evaluation cache in MB"
+                        ", default=%(default)g"
+            , type    = float
+            , default = self.default.get ('cache_size', 64)
+            )
+        cmd.add_argument \
+            ( '--disk-cache'
+            , help    = "SQLite database for caching evaluation results"
+                        " across optimizer runs"
+            )
         cmd.add_argument \
             ( '--epsilon-generation'
             , help    = "Use epsilon constraints until this generation"
             , type    = int
             , default = 0
             )
+        cmd.add_argument \
+            ( '--feedline'
+            , help    = "Cable of feed line for feedline action, one of %s,"
+                        " can be specified multiple times, default: %s"
+                      % (', '.join (coax_models), self.feedline_cable)
+            , action  = 'append'
+            , choices = list (coax_models)
+            , default = []
+            , metavar = 'CABLE'
+            )
+        cmd.add_argument \
+            ( '--feedline-length'
+            , help    = "Length of feed line (m) for feedline action,"
+                        " can be specified multiple times, default: %g"
+                      % self.feedline_length
+            , action  = 'append'
+            , type    = float
+            , default = []
+            )
         cmd.add_argument \
             ( '--frq-max'
             , help    = "Add a maximum frequency, must be matched with "
@@ -1217,6 +2164,12 @@ class Arg_Handler:
             , help    = "Verbose reporting in every generation"
             , action  = 'store_true'
             )
+        cmd.add_argument \
+            ( '--nec-cache'
+            , help    = "Share NEC results between antennas producing the"
+                        " same NEC cards using a cache of this size in MB"
+            , type    = float
+            )
         cmd.add_argument \
             ( '--no-rtr'
             , help    = "Do not use restricted tournament replacement"
@@ -1291,6 +2244,63 @@ class Arg_Handler:
             , type    = float
             , default = 0.0
             )
+        cmd.add_argument \
+            ( '--adaptive-pattern'
+            , help    = "Search maximum forward and backward gain on"
+                        " a coarse grid first, then refine"
+            , action  = 'store_true'
+            , default = None
+            )
+        cmd.add_argument \
+            ( '-j', '--jobs'
+            , help    = "Number of worker processes for evaluating the"
+                        " population, default is to evaluate in the"
+                        " optimizer process"
+            , type    = int
+            )
+        cmd.add_argument \
+            ( '--symmetry'
+            , help    = "Generate only half of a symmetric geometry and let"
+                        " NEC reflect it, this is faster but changes the"
+                        " segmentation of wires crossing the plane of"
+                        " symmetry, the symmetry action compares the results"
+                        " to those of the full geometry"
+            , dest    = 'use_symmetry'
+            , action  = 'store_true'
+            )
+        cmd.add_argument \
+            ( '--port-reduction'
+            , help    = "Let NEC compute only the wire structure reduced to"
+                        " the ports of sources, networks and lumped loads"
+                        " and apply these by matrix algebra, structures"
+                        " are cached so antennas differing only in networks"
+                        " or loads are computed once, not supported with"
+                        " the average gain"
+            , action  = 'store_true'
+            )
+        cmd.add_argument \
+            ( '--far-field'
+            , help    = "Let NEC compute only the currents and compute the"
+                        " radiation patterns from these, with"
+                        " --adaptive-pattern the full pattern is computed"
+                        " with the resolution of the adaptive search"
+            , action  = 'store_true'
+            )
+        cmd.add_argument \
+            ( '--mbpe'
+            , help    = "Let NEC compute the input impedance only for a few"
+                        " adaptively chosen frequencies and interpolate it"
+                        " with a rational function for the swr and feedline"
+                        " actions"
+            , action  = 'store_true'
+            )
+        cmd.add_argument \
+            ( '--swr-screen'
+            , help    = "Compute only the SWR first and skip the radiation"
+                        " pattern computation for antennas with an SWR"
+                        " above this value at all frequencies"
+            , type    = float
+            )
         cmd.add_argument \
             ( '--use-mid'
             , help    = "Use middle frequency for gain and f/b ratio"
@@ -1336,8 +2346,17 @@ class Arg_Handler:
             , min_gain           = self.args.min_gain
             , min_fb             = self.args.min_fb
             , use_mid            = self.args.use_mid
+            , swr_screen         = self.args.swr_screen
+            , adaptive_pattern   = self.args.adaptive_pattern
+            , jobs               = self.args.jobs
+            , cache_size         = self.args.cache_size
+            , disk_cache         = self.args.disk_cache
+            , nec_cache          = self.args.nec_cache
             , frq_min            = self.args.frq_min
             , frq_max            = self.args.frq_max
+            , use_symmetry       = self.args.use_symmetry
+            , port_reduction     = self.args.port_reduction
+            , far_field          = self.args.far_field
             )
         return d
     # end def default_optimization_args
@@ -1347,14 +2366,23 @@ class Arg_Handler:
         frq_step_max = self.args.frq_step_max
         if self.args.action in ('frgain', 'necout'):
             frq_step_max = 3
+        # Plotting needs the full grid
+        adaptive = self.args.adaptive_pattern
+        if self.args.action == 'gain':
+            adaptive = False
         d = dict \
-            ( avg_gain       = self.args.average_gain
-            , frq_step_max   = frq_step_max
-            , frq_step_nec   = self.args.frq_step_max
-            , wire_radius    = self.args.wire_radius
-            , copper_loading = self.args.copper_loading
-            , frq_min        = self.args.frq_min
-            , frq_max        = self.args.frq_max
+            ( adaptive_pattern = adaptive
+            , avg_gain         = self.args.average_gain
+            , frq_step_max     = frq_step_max
+            , frq_step_nec     = self.args.frq_step_max
+            , wire_radius      = self.args.wire_radius
+            , copper_loading   = self.args.copper_loading
+            , frq_min          = self.args.frq_min
+            , frq_max          = self.args.frq_max
+            , use_symmetry     = self.args.use_symmetry
+            , port_reduction   = self.args.port_reduction
+            , far_field        = self.args.far_field
+            , mbpe             = self.args.mbpe
             )
         return d
     # end def default_antenna_args
@@ -1377,6 +2405,15 @@ def antenna_actions (cmd, args, antenna):
         print (antenna.as_nec ())
     elif args.action not in cmd.actions:
         cmd.print_usage ()
+    elif args.action in ('swr', 'feedline') and antenna.mbpe:
+        # Impedances are computed by the rational fit
+        pass
+    elif args.action == 'feedline':
+        # No radiation pattern needed
+        antenna.compute_impedance ()
+    elif args.action == 'symmetry':
+        # Computes the model twice itself
+        pass
     else:
         if antenna.avg_gain:
             antenna.compute (avgain = True)
@@ -1389,4 +2426,14 @@ def antenna_actions (cmd, args, antenna):
     elif args.action == 'frgain':
         for frq_idx in range (len (antenna.frq_ranges)):
             print ('\n'.join (antenna.show_gains ()))
+    elif args.action == 'feedline':
+        cables  = [coax_models [c]
+                   for c in args.feedline or [cmd.feedline_cable]
+                  ]
+        lengths = args.feedline_length or [cmd.feedline_length]
+        for frq_idx in range (len (antenna.frq_ranges)):
+            r = antenna.show_feedline (frq_idx, cables, lengths)
+            print ('\n'.join (r))
+    elif args.action == 'symmetry':
+        print ('\n'.join (antenna.verify_symmetry ()))
 # end def antenna_actions
@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+from __future__ import print_function
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import numpy as np
+import PyNEC
+from collections import OrderedDict
+
+class LRU_Cache (object):
+    """ Cache of evaluations with a memory ceiling: When the (estimated)
+        memory used by the cache exceeds max_bytes, the least recently
+        used entries are evicted. Keys and values are expected to be
+        numbers or (flat) tuples of numbers.
+
+    >>> c = LRU_Cache (3 * (LRU_Cache.size ((1, 2)) + LRU_Cache.size (1.0)))
+    >>> for k in range (3):
+    ...     c [(k, k)] = float (k)
+    >>> c [(0, 0)]
+    0.0
+    >>> c [(3, 3)] = 3.0
+    >>> (1, 1) in c, (0, 0) in c, len (c), c.evictions
+    (False, True, 3, 1)
+    """
+
+    # Approximate per-entry overhead of the underlying dictionary
+    overhead = 100
+
+    def __init__ (self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes    = 0
+        self.evictions = 0
+        self.entries   = OrderedDict ()
+    # end def __init__
+
+    def __contains__ (self, key):
+        return key in self.entries
+    # end def __contains__
+
+    def __getitem__ (self, key):
+        self.entries.move_to_end (key)
+        return self.entries [key][0]
+    # end def __getitem__
+
+    def __len__ (self):
+        return len (self.entries)
+    # end def __len__
+
+    def __setitem__ (self, key, value):
+        if key in self.entries:
+            self.nbytes -= self.entries.pop (key)[1]
+        size = self.size (key) + self.size (value)
+        self.entries [key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes and len (self.entries) > 1:
+            k, (v, s) = self.entries.popitem (last = False)
+            self.nbytes    -= s
+            self.evictions += 1
+    # end def __setitem__
+
+    @classmethod
+    def size (cls, obj):
+        """ Estimated memory used by a cache entry for obj (key or value)
+        """
+        size = sys.getsizeof (obj) + cls.overhead // 2
+        if isinstance (obj, tuple):
+            size += sum (sys.getsizeof (x) for x in obj)
+        return size
+    # end def size
+
+# end class LRU_Cache
+
+class Disk_Cache (object):
+    """ Persistent cache in an SQLite database that can be shared by
+        several optimizer runs (and by several worker processes of
+        one run). Keys are strings, values are stored as JSON. The
+        database uses a write-ahead log so that readers don't block a
+        writer, concurrent writers wait up to timeout seconds for the
+        lock. SQLite connections must not be shared with a forked
+        process, so each process opens its own connection.
+
+    >>> import tempfile
+    >>> d = tempfile.mkdtemp ()
+    >>> c = Disk_Cache (os.path.join (d, 'cache.db'))
+    >>> c ['k'] = [dict (gmax = 7.5, vswrs = [1.5, 1.25])]
+    >>> Disk_Cache (os.path.join (d, 'cache.db')).get ('k')
+    [{'gmax': 7.5, 'vswrs': [1.5, 1.25]}]
+    >>> print (c.get ('x'))
+    None
+    """
+
+    def __init__ (self, filename, timeout = 60):
+        self.filename   = filename
+        self.timeout    = timeout
+        self.connection = None
+        self.pid        = None
+    # end def __init__
+
+    @property
+    def db (self):
+        if self.pid != os.getpid ():
+            db = sqlite3.connect \
+                (self.filename, timeout = self.timeout, isolation_level = None)
+            db.execute ('pragma journal_mode = wal')
+            db.execute \
+                ( 'create table if not exists cache'
+                  ' (key text primary key, value text not null)'
+                )
+            self.connection = db
+            self.pid        = os.getpid ()
+        return self.connection
+    # end def db
+
+    def get (self, key, default = None):
+        row = self.db.execute \
+            ('select value from cache where key = ?', (key,)).fetchone ()
+        if row is None:
+            return default
+        return json.loads (row [0])
+    # end def get
+
+    def __setitem__ (self, key, value):
+        self.db.execute \
+            ( 'insert or replace into cache (key, value) values (?, ?)'
+            , (key, json.dumps (value))
+            )
+    # end def __setitem__
+
+# end class Disk_Cache
+
+class Nec_Result (object):
+    """ Snapshot of a result object of a NEC context (input parameters
+        or radiation pattern): The values of the given get_ methods are
+        retrieved once and returned by the methods of the same name.
+        This doesn't keep the NEC context alive.
+    """
+
+    def __init__ (self, result, methods):
+        self.values = {}
+        for m in methods:
+            v = getattr (result, m) ()
+            if isinstance (v, np.ndarray):
+                v = v.copy ()
+            self.values [m] = v
+    # end def __init__
+
+    def __getattr__ (self, name):
+        try:
+            v = self.values [name]
+        except KeyError:
+            raise AttributeError (name)
+        return lambda: v
+    # end def __getattr__
+
+    def __sizeof__ (self):
+        return object.__sizeof__ (self) + sum \
+            (getattr (v, 'nbytes', 8) for v in self.values.values ())
+    # end def __sizeof__
+
+# end class Nec_Result
+
+class Computed_Result (Nec_Result):
+    """ Result object with the given values for the get_ methods, used
+        for results computed without NEC (e.g. by a Port_Context)
+    """
+
+    def __init__ (self, **values):
+        self.values = values
+    # end def __init__
+
+# end class Computed_Result
+
+class Nec_Cache (LRU_Cache):
+    """ Cache of NEC results keyed by the card stream that produced
+        them, see Recording_Context.
+    """
+
+    # The methods of the NEC context that return results and the
+    # methods of the result objects stored in the cache.
+    results = dict \
+        ( get_input_parameters =
+            ( 'get_current', 'get_frequency', 'get_impedance'
+            , 'get_power', 'get_segment', 'get_tag', 'get_voltage'
+            )
+        , get_radiation_pattern =
+            ( 'get_average_power_gain', 'get_average_power_solid_angle'
+            , 'get_delta_phi', 'get_delta_theta', 'get_frequency'
+            , 'get_gain', 'get_nphi', 'get_ntheta', 'get_phi_angles'
+            , 'get_phi_start', 'get_pol_axial_ratio'
+            , 'get_pol_sense_index', 'get_pol_tilt', 'get_theta_angles'
+            , 'get_theta_start'
+            )
+        )
+
+    def __init__ (self, max_bytes):
+        LRU_Cache.__init__ (self, max_bytes)
+        self.hits   = 0
+        self.misses = 0
+    # end def __init__
+
+    @classmethod
+    def size (cls, obj):
+        return sys.getsizeof (obj) + cls.overhead // 2
+    # end def size
+
+# end class Nec_Cache
+
+class Recording_Context (object):
+    """ Stand-in for a NEC context (and its geometry) that records the
+        cards emitted by an antenna model instead of passing them to
+        NEC immediately. When a result is requested, the hash of all
+        cards recorded so far together with the request is looked up in
+        the cache. Only on a cache miss the cards are passed to a real
+        NEC context (which is allocated at that point) and the result
+        is computed by NEC and stored in the cache. So two models that
+        emit the same cards share one NEC computation, independent of
+        how the model computed the cards.
+        Floating-point arguments are rounded to 10 significant digits
+        for the hash, like the TL and NT cards in an NEC file.
+    """
+
+    def __init__ (self, cache):
+        self.cache     = cache
+        self.cards     = []
+        self.hash      = hashlib.sha1 ()
+        self.nec       = None
+        self.forwarded = 0
+        # Results already requested from this context
+        self.seen      = {}
+    # end def __init__
+
+    def __getattr__ (self, name):
+        if name.startswith ('get_'):
+            return lambda *args: self.result (name, *args)
+        return lambda *args: self.record (None, name, args)
+    # end def __getattr__
+
+    def get_geometry (self):
+        return Recording_Geometry (self)
+    # end def get_geometry
+
+    @staticmethod
+    def canonical (args):
+        return ' '.join \
+            ( '%.10g' % a if isinstance (a, float) else repr (a)
+              for a in args
+            )
+    # end def canonical
+
+    def record (self, target, name, args):
+        self.cards.append ((target, name, args))
+        self.hash.update \
+            (('%s.%s %s\n' % (target, name, self.canonical (args))).encode ())
+    # end def record
+
+    def forward (self):
+        """ Pass all cards not yet seen by NEC to the real context
+        """
+        if self.nec is None:
+            self.nec = PyNEC.nec_context ()
+        for target, name, args in self.cards [self.forwarded:]:
+            obj = self.nec
+            if target is not None:
+                obj = self.nec.get_geometry ()
+            getattr (obj, name) (*args)
+        self.forwarded = len (self.cards)
+    # end def forward
+
+    def result (self, name, *args):
+        if name not in self.cache.results:
+            self.forward ()
+            return getattr (self.nec, name) (*args)
+        h = self.hash.copy ()
+        h.update (('%s %s' % (name, self.canonical (args))).encode ())
+        key = h.hexdigest ()
+        if key in self.seen:
+            return self.seen [key]
+        if key in self.cache:
+            self.cache.hits += 1
+            r = self.cache [key]
+        else:
+            self.cache.misses += 1
+            self.forward ()
+            r = Nec_Result \
+                (getattr (self.nec, name) (*args), self.cache.results [name])
+            self.cache [key] = r
+        self.seen [key] = r
+        return r
+    # end def result
+
+# end class Recording_Context
+
+class Recording_Geometry (object):
+    """ Geometry of a Recording_Context, records geometry cards
+    """
+
+    def __init__ (self, context):
+        self.context = context
+    # end def __init__
+
+    def __getattr__ (self, name):
+        return lambda *args: self.context.record ('geometry', name, args)
+    # end def __getattr__
+
+# end class Recording_Geometry
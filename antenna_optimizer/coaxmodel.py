@@ -1,12 +1,12 @@
 #!/usr/bin/python3
 
+import os
+import json
+import hashlib
 import numpy as np
 from math import atanh
-from scipy.optimize import curve_fit
 from argparse import ArgumentParser
 from rsclib.capacitance import c
-from mpl_toolkits.mplot3d import axes3d
-import matplotlib.pyplot as plt
 
 m_per_ft = 0.3048
 
@@ -742,6 +742,11 @@ class Manufacturer_Data_Cable:
         self.use_sabin = use_sabin
     # end def __init__
 
+    # Attributes computed by fit, fit_version must be incremented when
+    # the fit changes so that the fit cache is not used.
+    fitted      = ('loss_data', 'f0', 'a0r', 'a0g', 'g')
+    fit_version = 1
+
     def _units (self, metric = True):
         unit = units = 'm'
         cv   = 1.0
@@ -793,10 +798,30 @@ class Manufacturer_Data_Cable:
         return self.loss_r (f, a0r) + self.loss_g (f, a0g, g)
     # end def loss
 
-    def fit (self, loss_data):
+    def __getattr__ (self, name):
+        """ Fit a cable registered with fit (..., lazy = True) when
+            one of the fitted constants is used for the first time.
+        """
+        if name in self.fitted and 'lazy_loss_data' in self.__dict__:
+            self.fit_cached (self.__dict__.pop ('lazy_loss_data'))
+            return getattr (self, name)
+        raise AttributeError (name)
+    # end def __getattr__
+
+    def fit (self, loss_data, lazy = False):
         """ Gets a list of frequency/loss pairs
             Note that the loss is in dB per 100m (not ft)
+            With lazy the fit is deferred until the fitted constants
+            are needed, then the constants are taken from the fit cache
+            on disk if possible, see fit_cached.
         """
+        if lazy:
+            for k in self.fitted:
+                self.__dict__.pop (k, None)
+            self.lazy_loss_data = loss_data
+            return
+        # Importing scipy is expensive, only needed when fitting
+        from scipy.optimize import curve_fit
         self.loss_data = np.array (loss_data)
         self.f0 = (self.loss_data [0][0] + self.loss_data [-1][0]) / 2.0
         x = self.loss_data [:,0]
@@ -805,6 +830,36 @@ class Manufacturer_Data_Cable:
         self.a0r, self.a0g, self.g = popt
     # end def fit
 
+    def fit_cached (self, loss_data):
+        """ Like fit but look up the fitted constants in the fit cache
+            (keyed by the loss data) first and store them there after
+            fitting. Errors writing the cache are ignored.
+        """
+        fn  = fit_cache_file ()
+        key = hashlib.sha1 \
+            (json.dumps ([self.fit_version, loss_data]).encode ()).hexdigest ()
+        try:
+            with open (fn) as f:
+                cache = json.load (f)
+        except (OSError, ValueError):
+            cache = {}
+        if key in cache:
+            self.loss_data = np.array (loss_data)
+            self.f0, self.a0r, self.a0g, self.g = cache [key]
+            return
+        self.fit (loss_data)
+        cache [key] = [float (self.f0), float (self.a0r), float (self.a0g)]
+        cache [key].append (float (self.g))
+        try:
+            os.makedirs (os.path.dirname (fn), exist_ok = True)
+            tmp = '%s.%d' % (fn, os.getpid ())
+            with open (tmp, 'w') as f:
+                json.dump (cache, f)
+            os.replace (tmp, fn)
+        except OSError:
+            pass
+    # end def fit_cached
+
     def resonator_q (self, f = None):
         """ Resonator Q
             loss_dB = a * l / 100 = a * (lambda / 4) / 100
@@ -1083,12 +1138,66 @@ class Manufacturer_Data_Cable:
         frq = [ 10e6, 20e6, 50e6, 100e6, 200e6, 300e6, 500e6, 800e6, 1e9
               , 2.4e9, 5e9, 10e9, 20e9
               ]
-        for f in frq:
-            a = self.loss (f) * cv
+        for f, a in zip (frq, self.loss (np.array (frq)) * cv):
             r.append ("  %5.0f %8.2f" % (f / 1e6, a))
         return '\n'.join (r)
     # end def summary_loss
 
+    def summary_map (self, metric = True):
+        """ Compute the match_map for a grid of frequencies and load
+            impedances (from self.map_f, self.map_r, self.map_x with the
+            cable length self.l and power self.p) and write it to the
+            file self.map_file in numpy .npz format. The arrays of the
+            map have the shape (frequencies, resistances, reactances),
+            the stub arrays have an additional leading dimension, see
+            match_map, the file also contains the axes f, r, and x and
+            the matched loss per frequency. Lengths are in m. To keep
+            the file small the map is stored in single precision.
+            Returns a summary of the map.
+        """
+        def single (v):
+            if v.dtype.kind == 'f':
+                return v.astype (np.float32)
+            if v.dtype.kind == 'c':
+                return v.astype (np.complex64)
+            return v
+        unit, units, cv = self._units (metric)
+        f = self.map_f [:, None, None]
+        z = self.map_r [:, None] + 1j * self.map_x
+        m = self.match_map (f, z, self.l, self.p)
+        np.savez_compressed \
+            ( self.map_file
+            , f            = self.map_f
+            , r            = self.map_r
+            , x            = self.map_x
+            , matched_loss = self.loss (self.map_f) / 100 * self.l
+            , cable        = self.name
+            , length       = self.l
+            , power        = self.p
+            , **dict ((k, single (v)) for k, v in m.items ())
+            )
+        ok = m ['matchable']
+        r  = []
+        r.append \
+            ( '%.2f %s at %.2f-%.2f MHz with %.0f W applied'
+            % ( self.l / cv, units
+              , self.map_f [0] * 1e-6, self.map_f [-1] * 1e-6, self.p
+              )
+            )
+        r.append \
+            ( '%25s %d x %d x %d written to %s'
+            % (('Map',) + ok.shape + (self.map_file,))
+            )
+        r.append ('%25s %.1f %%' % ('Matchable', ok.mean () * 100))
+        r.append \
+            ( '%25s %.3f-%.3f dB'
+            % ('Total Loss', m ['loss'].min (), m ['loss'].max ())
+            )
+        r.append ('%25s %.2f V RMS' % ('Maximum Voltage', m ['u_max'].max ()))
+        r.append ('%25s %.2f A RMS' % ('Maximum Current', m ['i_max'].max ()))
+        return '\n'.join (r)
+    # end def summary_map
+
     def summary_match \
         ( self
         , f      = None
@@ -1245,6 +1354,9 @@ class Manufacturer_Data_Cable:
 
     # The Y-Parameters (Admittance Parameters)
     # These are needed for simulating a lossy cable in NEC
+    # Like z_d these accept arrays of frequencies and/or lengths (which
+    # are broadcast against each other) so that the parameters of a
+    # whole frequency sweep are computed in one call.
 
     def y11 (self, f, l):
         """ Admittance Parameter Y11: This is simply the reciprocal
@@ -1255,18 +1367,23 @@ class Manufacturer_Data_Cable:
         return 1.0 / self.z_d_short (f, l)
     # end def y11
 
-    def y22 (self, f, l, z_l = None):
+    def y22 (self, f, l, z_l = None, y11 = None):
         """ Admittance Parameter Y22: This simply adds 1/z_l in parallel
             to y11. Default value for z_l is open circuit.
+            An already computed y11 for the same f and l may be passed.
         """
+        if y11 is None:
+            y11 = self.y11 (f, l)
         if z_l is None:
-            return self.y11 (f, l)
+            return y11
         elif z_l == 0:
+            if np.ndim (y11):
+                return np.full_like (y11, 1e50)
             return 1e50
-        return 1.0 / z_l + self.y11 (f, l)
+        return 1.0 / z_l + y11
     # end def y22
 
-    def y12 (self, f, l):
+    def y12 (self, f, l, y11 = None):
         """ Admittance Parameter Y12: Since this is a reciprocal network
             Y12 = Y21.
             Y_in = Y11 - Y12 ** 2 / (Y22 + Y_L)
@@ -1278,15 +1395,36 @@ class Manufacturer_Data_Cable:
             See Wikipedia https://en.wikipedia.org/wiki/Admittance_parameters
             Note that we set Y_L to 0 (open circuit) to compute the
             cable parameter y12 and we set y11 = y22.
+            An already computed y11 for the same f and l may be passed.
         """
         y_in = 1 / self.z_d_open (f, l)
-        y11  = self.y11 (f, l)
+        if y11 is None:
+            y11 = self.y11 (f, l)
         r    = np.sqrt (y11 ** 2 - y_in * (y11))
-        if r.real < 0:
-            return -r
-        return r
+        return np.where (r.real < 0, -1, 1) * r
     # end def y12
 
+    def y_params (self, f, l, z_l = None):
+        """ All three admittance parameters y11, y12, y22 (with load
+            z_l, see y22) as an array, the first index is the parameter.
+            This computes y11 only once.
+
+        >>> cable = Manufacturer_Data_Cable (50, 0.66)
+        >>> cable.set_loss_constants (10e6, 1.4 / m_per_ft)
+        >>> y = cable.y_params (np.array ([10e6, 12e6, 14e6]), 3.3, 150.0)
+        >>> y.shape
+        (3, 3)
+        >>> print (np.allclose (y [:, 1], [ cable.y11 (12e6, 3.3)
+        ...                                , cable.y12 (12e6, 3.3)
+        ...                                , cable.y22 (12e6, 3.3, 150.0)
+        ...                                ]))
+        True
+        """
+        y11 = self.y11 (f, l)
+        return np.array \
+            ([y11, self.y12 (f, l, y11), self.y22 (f, l, z_l, y11)])
+    # end def y_params
+
     def z0f_witt (self, f, z0, r, g):
         """ From Witt [3]
         """
@@ -1351,17 +1489,11 @@ class Manufacturer_Data_Cable:
         """
         x = np.arange (-1.5, 1.5, 0.02)
         y = np.arange (49-0.5, 51+0.5, 0.02)
-        z = []
-        for vx in x:
-            zz = []
-            z.append (zz)
-            for vy in y:
-                z0  = 50 + 0j
-                z0f = self.z0f (f, vy + vx*1j)
-                zz.append (abs (z0 - z0f))
-                #zz.append ((z0 - z0f).real)
-                #zz.append ((z0 - z0f).imag)
-        z    = np.array (z)
+        z0  = 50 + 0j
+        z0f = self.z0f (f, y [np.newaxis, :] + x [:, np.newaxis] * 1j)
+        z   = abs (z0 - z0f)
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import axes3d
         x, y = np.meshgrid (x, y)
         fig  = plt.figure ()
         ax   = fig.add_subplot (111, projection = '3d')
@@ -1548,6 +1680,258 @@ class Manufacturer_Data_Cable:
         return d, l
     # end def stub_match_iterative
 
+    def stub_y (self, f, l, shortcircuit = True, gm = None, y0 = None):
+        """ Admittance of a stub with length l and its derivative with
+            respect to l, f and l may be arrays.
+            The already computed propagation constant gm and admittance
+            y0 = 1 / z0f of the cable for f may be passed.
+        """
+        if y0 is None:
+            y0 = 1.0 / self.z0f (f)
+        if gm is None:
+            gm = self.gamma (f)
+        t  = np.tanh (gm * l)
+        if shortcircuit:
+            return y0 / t, -y0 * gm * (1 - t ** 2) / t ** 2
+        return y0 * t, y0 * gm * (1 - t ** 2)
+    # end def stub_y
+
+    def stub_length_batch \
+        ( self, f, b
+        , shortcircuit = True
+        , tol          = eps ** 2
+        , maxiter      = 50
+        , gm           = None
+        , y0           = None
+        ):
+        """ Lengths of stubs with susceptance b for arrays of
+            frequencies f and susceptances b, the vectorized variant of
+            stub_short_open_iter (with b = (1/z).imag). We start with
+            the lossless stub and correct for the loss with
+            newton_bracketed. The susceptance of a lossless stub is
+            monotonically increasing with the length between its poles
+            (at 0 and lamda/2 for a short stub and at lamda/4 for an
+            open stub) which gives the bracket. We solve for
+            arctan (Z0 * b) which (without loss) is linear in the
+            length, so Newton needs very few steps. For gm and y0 see
+            stub_y.
+            Returns the lengths and the number of iterations.
+        """
+        f, b  = np.broadcast_arrays (f, b)
+        half  = np.pi / self.beta (f)
+        z0b   = b * self.Z0
+        if shortcircuit:
+            ls = half * (0.5 + np.arctan (z0b) / np.pi)
+            lo = np.zeros_like (half)
+        else:
+            ls = half * (np.arctan (z0b) / np.pi % 1)
+            lo = np.where (z0b < 0, half / 2, 0)
+        hi = lo + np.where (shortcircuit, half, half / 2)
+        if y0 is None:
+            y0 = 1.0 / self.z0f (f)
+        if gm is None:
+            gm = self.gamma (f)
+        gm, y0, goal = \
+            (np.broadcast_to (v, f.shape).ravel () for v in (gm, y0, z0b))
+        goal = np.arctan (goal)
+        def fun (x, i):
+            y, dy = self.stub_y (None, x, shortcircuit, gm [i], y0 [i])
+            v     = self.Z0 * y.imag
+            return np.arctan (v) - goal [i], self.Z0 * dy.imag / (1 + v ** 2)
+        return newton_bracketed \
+            (fun, ls, lo + half * eps, hi - half * eps, tol, maxiter)
+    # end def stub_length_batch
+
+    def stub_match_batch \
+        ( self, f, z_l
+        , capacitive   = True
+        , shortcircuit = True
+        , tol          = eps ** 2
+        , maxiter      = 50
+        ):
+        """ Stub matching for arrays of frequencies f and load
+            impedances z_l (broadcast against each other), the batched
+            variant of stub_match_iterative for matching to Z0 with a
+            stub in parallel. For each element we search the distance d
+            from the load where the real part of the admittance of line
+            and stub (with the stub length compensating the susceptance
+            of the line at d) equals 1/Z0.
+            The start value and the bracket come from the lossless
+            line: The real part of the admittance is minimal at the
+            voltage maximum and maximal at the voltage minimum, the
+            match point with capacitive admittance is in the quarter
+            wave after the voltage maximum, the inductive one in the
+            quarter wave before it. Both are within half a wavelength
+            from the load. The loss is corrected by newton_bracketed
+            using the derivatives of line and stub admittance, for
+            each step d the stub length is solved by stub_length_batch.
+            Returns distance d and stub length l of the match and the
+            number of iterations for d and (summed over all steps) for
+            l. The iterations are a handful where the bisection in
+            stub_match_iterative needs dozens. Where the iteration
+            doesn't converge to a match (the residual of the real part
+            of the admittance relative to 1/Z0 is at least the square
+            root of tol) the load can't be matched, d and l are NaN
+            for these elements.
+
+        >>> cable = Manufacturer_Data_Cable (50, 0.66)
+        >>> cable.set_loss_constants (10e6, 1.4 / m_per_ft)
+        >>> cable.set_freq_params (14e6, 100 * m_per_ft, 1500, 50-500j)
+        >>> d, l, nd, nl = cable.stub_match_batch \\
+        ...     (np.array ([14e6, 21e6, 28e6]), 50 -500j)
+        >>> print ("%.4f %.4f" % cable.stub_match_iterative ())
+        2.9130 0.4083
+        >>> print ("%.4f %.4f" % (d [0], l [0]))
+        2.9130 0.4083
+        >>> z = cable.stub_impedance (21e6, d [1], l [1], 50 -500j)
+        >>> print ("%.3f %+.3fj" % (z.real, abs (z.imag)))
+        50.000 +0.000j
+        >>> print (nd.max () <= 10, nl.max () <= 50)
+        True True
+        >>> cable.set_freq_params (14e6, 100 * m_per_ft, 1500, 77+15j)
+        >>> z_l = np.array ([77+15j, 25-10j, 10+100j])
+        >>> d, l, nd, nl = cable.stub_match_batch \\
+        ...     (14e6, z_l, capacitive = False, shortcircuit = False)
+        >>> print ("%.4f %.4f" % cable.stub_match_iterative (False, False))
+        5.5248 0.9561
+        >>> print ("%.4f %.4f" % (d [0], l [0]))
+        5.5248 0.9561
+        >>> z = cable.stub_impedance (14e6, d, l, z_l, shortcircuit = False)
+        >>> print (np.allclose (z, 50))
+        True
+
+        For a short and (with a lossy cable) for a load of Z0 there is
+        no capacitive match point:
+
+        >>> d, l, nd, nl = cable.stub_match_batch (14e6, [0, 50, 77+15j])
+        >>> print (np.isnan (d), np.isnan (l))
+        [ True  True False] [ True  True False]
+        """
+        f, z_l = np.broadcast_arrays (f, np.asarray (z_l, dtype = complex))
+        y0   = 1.0 / self.Z0
+        y0f  = 1.0 / self.z0f (f)
+        gm   = self.gamma (f)
+        beta = self.beta (f)
+        half = np.pi / beta
+        zz   = z_l * y0f
+        rho  = (zz - 1) / (zz + 1)
+        # The reflection coefficient at d has the phase
+        # angle (rho) - 2 * beta * d, the match point has phase -phi for
+        # a capacitive and +phi for an inductive admittance, the voltage
+        # maximum has phase 0 and the minimum phase +-pi.
+        phi  = np.arccos (-np.minimum (np.abs (rho), 1))
+        th   = np.angle (rho)
+        if capacitive:
+            phi = -phi
+        d    = (th - phi) / (2 * beta)
+        k    = np.floor (d / half)
+        d   -= k * half
+        vmax = th / (2 * beta) - k * half
+        vmin = vmax + np.where (capacitive, half / 2, -half / 2)
+        gm, y0f, zz, f = (np.ravel (v) for v in (gm, y0f, zz, f))
+        ls   = np.zeros (d.size)
+        nl   = np.zeros (d.size, dtype = int)
+        res  = np.zeros (d.size)
+        def fun (x, i):
+            g, yc, z = gm [i], y0f [i], zz [i]
+            t   = np.tanh (g * x)
+            y   = yc * (1 + z * t) / (z + t)
+            dy  = yc * (z ** 2 - 1) / (z + t) ** 2 * g * (1 - t ** 2)
+            l, n = self.stub_length_batch \
+                (f [i], -y.imag, shortcircuit, tol, maxiter, g, yc)
+            ys, dys = self.stub_y (None, l, shortcircuit, g, yc)
+            ls [i]  = l
+            nl [i] += n
+            res [i] = y.real + ys.real - y0
+            # Derivative of the stub length is -dy.imag / dys.imag
+            return res [i], dy.real - dys.real * dy.imag / dys.imag
+        # A short or open load gives infinite or NaN admittances
+        with np.errstate (divide = 'ignore', invalid = 'ignore'):
+            d, nd = newton_bracketed (fun, d, vmax, vmin, tol, maxiter)
+        # The last evaluation of each element is at the returned d
+        bad = ~(np.abs (res) < np.sqrt (tol) * y0).reshape (d.shape)
+        d   = np.where (bad, np.nan, d)
+        ls  = np.where (bad, np.nan, ls.reshape (d.shape))
+        return d, ls, nd, nl.reshape (d.shape)
+    # end def stub_match_batch
+
+    def total_loss (self, f, l, z_l):
+        """ Total loss in dB (matched loss and additional loss due to
+            reflections, see combined_loss) of a cable with length l
+            terminated with z_l for frequency f, all parameters may be
+            arrays (broadcast against each other).
+
+        >>> cable = Manufacturer_Data_Cable (50, 0.66)
+        >>> cable.set_loss_constants (10e6, 1.4 / m_per_ft)
+        >>> cable.set_freq_params (28e6, 15, 100, 77+15j)
+        >>> l = cable.total_loss (np.array ([14e6, 28e6]), 15, 77+15j)
+        >>> print ("%.5f %.5f" % (l [1], cable.combined_loss))
+        1.24019 1.24019
+        """
+        z_i = self.z_d (f, l, z_l)
+        gl  = self.gamma (f) * l
+        # Ratio of voltage at load and input
+        u   = np.cosh (gl) - self.z0f (f) / z_i * np.sinh (gl)
+        return -10 * np.log10 \
+            (np.abs (u) ** 2 * (1.0 / z_l).real / (1.0 / z_i).real)
+    # end def total_loss
+
+    def match_map (self, f, z_l, l, p):
+        """ Matching data for arrays of frequencies f and load impedances
+            z_l (broadcast against each other) of a cable with length l
+            and power p applied, this computes the data of summary_match
+            for all combinations at once. The result is a dict of
+            arrays with the broadcast shape of f and z_l: Input
+            impedance, VSWR at load and input, total loss (the matched
+            loss only depends on f), maximum voltage and current, and
+            position and length of a short-circuited stub for the
+            capacitive and the inductive match point (with an
+            additional leading dimension, index 0 is capacitive).
+            The match is flagged as matchable if the stub match
+            converges for both match points, see stub_match_batch.
+
+        >>> cable = Manufacturer_Data_Cable (50, 0.66)
+        >>> cable.set_loss_constants (10e6, 1.4 / m_per_ft)
+        >>> l = 100 * m_per_ft
+        >>> m = cable.match_map \\
+        ...     (np.array ([14e6, 28e6]) [:, None], [50 -500j, 77+15j], l, 100)
+        >>> m ['stub_d'].shape
+        (2, 2, 2)
+        >>> cable.set_freq_params (28e6, l, 100, 77+15j)
+        >>> print ("%.3f %.3f" % (m ['loss'] [1, 1], cable.combined_loss))
+        2.516 2.516
+        >>> print ("%.2f %.2f" % (m ['u_max'] [1, 1], cable.U_max))
+        81.42 81.42
+        >>> print (m ['matchable'].all ())
+        True
+        """
+        f, z_l = np.broadcast_arrays (f, np.asarray (z_l, dtype = complex))
+        z0     = self.Z0
+        z_i    = self.z_d (f, l, z_l)
+        rho_l  = np.abs ((z_l - z0) / (z_l + z0))
+        rho_i  = np.abs ((z_i - z0) / (z_i + z0))
+        vswr_i = (1 + rho_i) / (1 - rho_i)
+        d      = []
+        sl     = []
+        ok     = np.ones (f.shape, dtype = bool)
+        for capacitive in True, False:
+            sd, ln, nd, nl = self.stub_match_batch (f, z_l, capacitive)
+            ok &= ~np.isnan (sd)
+            d.append  (sd)
+            sl.append (ln)
+        return dict \
+            ( z_i       = z_i
+            , vswr_l    = (1 + rho_l) / (1 - rho_l)
+            , vswr_i    = vswr_i
+            , loss      = self.total_loss (f, l, z_l)
+            , u_max     = np.sqrt (p * z0 * vswr_i)
+            , i_max     = np.sqrt (p * vswr_i / z0)
+            , stub_d    = np.array (d)
+            , stub_l    = np.array (sl)
+            , matchable = ok
+            )
+    # end def match_map
+
     def stub_short (self, z, f = None):
         """ Compute length of a short-circuited (closed) stub that has
             the given reactance as the imaginary part of a complex number.
@@ -1796,18 +2180,42 @@ class Manufacturer_Data_Cable:
             Special case z_l = None is open circuit.
             Note that we may return None for an open circuit if too near
             the load.
+            The frequency f and distance d may be arrays, the result is
+            then an array with the broadcast shape of f and d. In that
+            case the open circuit near the load is returned as infinity.
+
+        >>> cable = Manufacturer_Data_Cable (50, 0.66)
+        >>> cable.set_loss_constants (10e6, 1.4 / m_per_ft)
+        >>> f = np.array ([10e6, 20e6])
+        >>> d = np.array ([[0.0], [1.0], [2.0]])
+        >>> z = cable.z_d (f, d, 25 + 10j)
+        >>> z.shape
+        (3, 2)
+        >>> print (z [0, 0], np.isclose (z [2, 1], cable.z_d (20e6, 2, 25+10j)))
+        (25+10j) True
+        >>> z = cable.z_d (f, d, None)
+        >>> print (z [0, 0], np.isclose (z [1, 0], cable.z_d_open (10e6, 1)))
+        (inf+0j) True
         """
         z0 = self.z0f   (f)
         gm = self.gamma (f)
-        ep = np.e ** (gm * d)
-        if abs (d) < 1e-20:
+        is_array = np.ndim (d) or np.ndim (f)
+        if is_array:
+            near = np.abs (d) < 1e-20
+            d    = np.where (near, 1.0, d)
+        elif abs (d) < 1e-20:
             return z_l
+        ep = np.e ** (gm * d)
         if z_l is None:
-            return z0 * (ep + 1/ep) / (ep - 1/ep)
-        zz = z_l / z0
-        return z0 * ( (ep * (zz + 1) + (zz - 1) / ep)
-                    / (ep * (zz + 1) - (zz - 1) / ep)
-                    )
+            z = z0 * (ep + 1/ep) / (ep - 1/ep)
+        else:
+            zz = z_l / z0
+            z  = z0 * ( (ep * (zz + 1) + (zz - 1) / ep)
+                      / (ep * (zz + 1) - (zz - 1) / ep)
+                      )
+        if is_array:
+            z = np.where (near, np.inf if z_l is None else z_l, z)
+        return z
     # end def z_d
 
     def z_d_open (self, f, d):
@@ -1894,6 +2302,14 @@ class Measured_Cable:
 
 # end class Measured_Cable
 
+def fit_cache_file ():
+    """ File caching the fitted constants of the cable catalog below
+    """
+    d = os.environ.get ('XDG_CACHE_HOME') \
+        or os.path.join (os.path.expanduser ('~'), '.cache')
+    return os.path.join (d, 'antenna_optimizer', 'coaxmodel-fit.json')
+# end def fit_cache_file
+
 def admittance (y11, y12, y22, z_l):
     """ Given the admittance matrix for a cable (note that y12 = y21)
         compute z_i from z_l.
@@ -1907,6 +2323,56 @@ def admittance (y11, y12, y22, z_l):
     return y11 - (y12 ** 2) / (y22 + y_l)
 # end def admittance
 
+def newton_bracketed (fun, x, xl, xh, tol = eps ** 2, maxiter = 50):
+    """ Vectorized root finding of fun for arrays of start values x
+        with brackets xl and xh (fun (xl) < 0 < fun (xh) for each
+        element, xl may be larger than xh). We take Newton steps and
+        fall back to bisection if a step leaves the bracket (the
+        safeguarded Newton of Numerical Recipes rtsafe), so convergence
+        is quadratic near the root and never worse than bisection.
+        Iteration stops for an element when abs (fun (x)) < tol or the
+        step is below tol times the bracket width.
+        The function is only evaluated for the elements not yet
+        converged: fun (x, idx) gets these and their indices into the
+        flattened (broadcast) arrays and must return the function
+        value and its derivative.
+        Returns the roots and the number of iterations per element.
+
+    >>> x, n = newton_bracketed \\
+    ...     (lambda x, i: (x ** 2 - 2, 2 * x), np.ones (3), 0, [2, 3, 4])
+    >>> print (np.allclose (x, np.sqrt (2)), n.max () <= 6)
+    True True
+    """
+    x, xl, xh = np.broadcast_arrays (x, xl, xh)
+    shape     = x.shape
+    x, xl, xh = (np.array (v, dtype = float).ravel () for v in (x, xl, xh))
+    w   = np.abs (xh - xl)
+    n   = np.zeros (x.shape, dtype = int)
+    idx = np.arange (x.size)
+    for k in range (maxiter):
+        if not idx.size:
+            break
+        xa    = x [idx]
+        g, dg = fun (xa, idx)
+        n [idx] += 1
+        neg   = g < 0
+        xl [idx] = np.where (neg,  xa, xl [idx])
+        xh [idx] = np.where (~neg, xa, xh [idx])
+        with np.errstate (divide = 'ignore', invalid = 'ignore'):
+            xn = xa - g / dg
+        lo    = np.minimum (xl [idx], xh [idx])
+        hi    = np.maximum (xl [idx], xh [idx])
+        bad   = ~np.isfinite (xn) | (xn <= lo) | (xn >= hi)
+        xn    = np.where (bad, (lo + hi) / 2, xn)
+        # NaN in g (no solution) also stops
+        keep  = (np.abs (g) >= tol) & (np.abs (xn - xa) >= tol * w [idx])
+        if k + 1 == maxiter:
+            break
+        idx   = idx [keep]
+        x [idx] = xn [keep]
+    return x.reshape (shape), n.reshape (shape)
+# end def newton_bracketed
+
 # Definining new cable parameters:
 # We make a list of attenuation per 100m
 # Then we call the constructor of Measured_Cable with
@@ -1929,7 +2395,7 @@ belden_8295_data = \
 
 belden_8295 = Manufacturer_Data_Cable \
     (50, .66, 30.8e-12 / m_per_ft, name = 'belden_8295')
-belden_8295.fit (belden_8295_data)
+belden_8295.fit (belden_8295_data, lazy = True)
 
 sytronic_RG_213_UBX_data = \
     [ ( 10e6,  2.0)
@@ -1944,7 +2410,7 @@ sytronic_RG_213_UBX_data = \
     ]
 sytronic_RG_213_UBX = Manufacturer_Data_Cable \
     (50, .66, 103e-12, name = 'SYTRONIC RG 213 UBX (also RG 8/U)')
-sytronic_RG_213_UBX.fit (sytronic_RG_213_UBX_data)
+sytronic_RG_213_UBX.fit (sytronic_RG_213_UBX_data, lazy = True)
 
 sytronic_RG_213_U_data = \
     [ ( 10e6,  1.8)
@@ -1959,7 +2425,7 @@ sytronic_RG_213_U_data = \
     ]
 sytronic_RG_213_U = Manufacturer_Data_Cable \
     (50, .66, 103e-12, name = 'SYTRONIC RG 213/U')
-sytronic_RG_213_U.fit (sytronic_RG_213_U_data)
+sytronic_RG_213_U.fit (sytronic_RG_213_U_data, lazy = True)
 
 sytronic_RG_58_C_U_data = \
     [ ( 10e6,  4.7)
@@ -1974,7 +2440,7 @@ sytronic_RG_58_C_U_data = \
     ]
 sytronic_RG_58_C_U = Manufacturer_Data_Cable \
     (50, .66, 103e-12, name = 'SYTRONIC RG 58 C/U')
-sytronic_RG_58_C_U.fit (sytronic_RG_58_C_U_data)
+sytronic_RG_58_C_U.fit (sytronic_RG_58_C_U_data, lazy = True)
 
 sytronic_RG_174_A_U_data = \
     [ (10e6,    9.6)
@@ -1989,7 +2455,7 @@ sytronic_RG_174_A_U_data = \
     ]
 sytronic_RG_174_A_U = Manufacturer_Data_Cable \
     (50, 0.66, 103e-12, name = 'SYTRONIC RG 174 A/U (Reichelt RG 174-50)')
-sytronic_RG_174_A_U.fit (sytronic_RG_174_A_U_data)
+sytronic_RG_174_A_U.fit (sytronic_RG_174_A_U_data, lazy = True)
 
 rs_222_8610_RG174A_U_data = \
     [ (200e6, 42.0)
@@ -1998,7 +2464,7 @@ rs_222_8610_RG174A_U_data = \
     ]
 rs_222_8610_RG174A_U = Manufacturer_Data_Cable \
     (50, 0.659, 106e-12, name = 'RS 222-8610 RG174A/U')
-rs_222_8610_RG174A_U.fit (rs_222_8610_RG174A_U_data)
+rs_222_8610_RG174A_U.fit (rs_222_8610_RG174A_U_data, lazy = True)
 
 sytronic_RG_316_B_U_data = \
     [ (50e6,   19.2)
@@ -2008,7 +2474,7 @@ sytronic_RG_316_B_U_data = \
     ]
 sytronic_RG_316_B_U = Manufacturer_Data_Cable \
     (50, 0.7, 91e-12, name = 'SYTRONIC RG 316 B/U')
-sytronic_RG_316_B_U.fit (sytronic_RG_316_B_U_data)
+sytronic_RG_316_B_U.fit (sytronic_RG_316_B_U_data, lazy = True)
 
 sytronic_RG_178_B_U_data = \
     [ (50e6,   38.0)
@@ -2021,7 +2487,7 @@ sytronic_RG_178_B_U_data = \
     ]
 sytronic_RG_178_B_U = Manufacturer_Data_Cable \
     (50, 0.7, 94e-12, name = 'SYTRONIC RG 178 B/U')
-sytronic_RG_178_B_U.fit (sytronic_RG_178_B_U_data)
+sytronic_RG_178_B_U.fit (sytronic_RG_178_B_U_data, lazy = True)
 
 # This does not work, curve-fit is not possible with this data.
 # Note that the low-frequency components on the data sheet that have
@@ -2052,7 +2518,7 @@ sytronic_RG_179_B_U_data = \
     ]
 sytronic_RG_179_B_U = Manufacturer_Data_Cable \
     (75, 0.7, 102e-12, name = 'SYTRONIC RG 179 B/U')
-sytronic_RG_179_B_U.fit (sytronic_RG_179_B_U_data)
+sytronic_RG_179_B_U.fit (sytronic_RG_179_B_U_data, lazy = True)
 
 # These are from Funkamateur Taschenkalender 2023
 Airborne5 = Manufacturer_Data_Cable \
@@ -2068,7 +2534,7 @@ Airborne5_data = \
     , ( 432e6, 19)
     , (1296e6, 34.5)
     ]
-Airborne5.fit (Airborne5_data)
+Airborne5.fit (Airborne5_data, lazy = True)
 Airborne10 = Manufacturer_Data_Cable \
     (50, 0.87, name = 'Airborne10')
 Airborne10_data = \
@@ -2082,7 +2548,7 @@ Airborne10_data = \
     , ( 432e6,  7.6)
     , (1296e6, 13.6)
     ]
-Airborne10.fit (Airborne10_data)
+Airborne10.fit (Airborne10_data, lazy = True)
 Aircell5 = Manufacturer_Data_Cable \
     (50, 0.82, name = 'Aircell5')
 Aircell5_data = \
@@ -2095,7 +2561,7 @@ Aircell5_data = \
     , ( 432e6, 19.9)
     , (1296e6, 35.7)
     ]
-Aircell5.fit (Aircell5_data)
+Aircell5.fit (Aircell5_data, lazy = True)
 Aircell7 = Manufacturer_Data_Cable \
     (50, 0.83, name = 'Aircell7')
 Aircell7_data = \
@@ -2108,7 +2574,7 @@ Aircell7_data = \
     , ( 432e6, 13.6)
     , (1296e6, 24.8)
     ]
-Aircell7.fit (Aircell7_data)
+Aircell7.fit (Aircell7_data, lazy = True)
 Aircom = Manufacturer_Data_Cable \
     (50, 0.85, name = 'Aircom Prem.')
 Aircom_data = \
@@ -2119,7 +2585,7 @@ Aircom_data = \
     , ( 432e6,  8.5)
     , (1296e6, 12.5)
     ]
-Aircom.fit (Aircom_data)
+Aircom.fit (Aircom_data, lazy = True)
 Ecoflex10 = Manufacturer_Data_Cable \
     (50, 0.85, name = 'Ecoflex10')
 Ecoflex10_data = \
@@ -2133,7 +2599,7 @@ Ecoflex10_data = \
     , ( 432e6,  8.9)
     , (1296e6, 16.5)
     ]
-Ecoflex10.fit (Ecoflex10_data)
+Ecoflex10.fit (Ecoflex10_data, lazy = True)
 Ecoflex10plus = Manufacturer_Data_Cable \
     (50, 0.85, name = 'Ecoflex10+')
 Ecoflex10plus_data = \
@@ -2145,7 +2611,7 @@ Ecoflex10plus_data = \
     , ( 432e6,  8.9)
     , (1296e6, 16.2)
     ]
-Ecoflex10plus.fit (Ecoflex10plus_data)
+Ecoflex10plus.fit (Ecoflex10plus_data, lazy = True)
 Ecoflex15 = Manufacturer_Data_Cable \
     (50, 0.86, name = 'Ecoflex15')
 Ecoflex15_data = \
@@ -2159,7 +2625,7 @@ Ecoflex15_data = \
     , ( 432e6,  6.1)
     , (1296e6, 11.4)
     ]
-Ecoflex15.fit (Ecoflex15_data)
+Ecoflex15.fit (Ecoflex15_data, lazy = True)
 Ecoflex15plus = Manufacturer_Data_Cable \
     (50, 0.86, name = 'Ecoflex15+')
 Ecoflex15plus_data = \
@@ -2170,7 +2636,7 @@ Ecoflex15plus_data = \
     , ( 432e6,  5.8)
     , (1296e6, 10.5)
     ]
-Ecoflex15plus.fit (Ecoflex15plus_data)
+Ecoflex15plus.fit (Ecoflex15plus_data, lazy = True)
 EcoflexMulti = Manufacturer_Data_Cable \
     (50, 0.85, name = 'Ecoflex Multi.')
 EcoflexMulti_data = \
@@ -2179,7 +2645,7 @@ EcoflexMulti_data = \
     , ( 500e6, 21.6)
     , (1000e6, 31.1)
     ]
-EcoflexMulti.fit (EcoflexMulti_data)
+EcoflexMulti.fit (EcoflexMulti_data, lazy = True)
 H155 = Manufacturer_Data_Cable \
     (50, 0.81, name = 'H155')
 H155_data = \
@@ -2191,7 +2657,7 @@ H155_data = \
     , ( 432e6, 19.8)
     , (1296e6, 34.9)
     ]
-H155.fit (H155_data)
+H155.fit (H155_data, lazy = True)
 H2000_Flex = Manufacturer_Data_Cable \
     (50, 0.85, name = 'H2000-Flex')
 H2000_Flex_data = \
@@ -2204,7 +2670,7 @@ H2000_Flex_data = \
     , ( 432e6,  8.5)
     , (1296e6, 15.7)
     ]
-H2000_Flex.fit (H2000_Flex_data)
+H2000_Flex.fit (H2000_Flex_data, lazy = True)
 H2005 = Manufacturer_Data_Cable \
     (50, 0.85, name = 'H2005')
 H2005_data = \
@@ -2216,7 +2682,7 @@ H2005_data = \
     , ( 432e6, 19.5)
     , (1296e6, 33.8)
     ]
-H2005.fit (H2005_data)
+H2005.fit (H2005_data, lazy = True)
 
 coax_models  = dict \
     ( belden_8295          = belden_8295
@@ -2232,7 +2698,7 @@ coax_models  = dict \
 
 def main ():
     cmd = ArgumentParser ()
-    actions = ['loss', 'loss-data', 'match', 'resonator', 'stub']
+    actions = ['loss', 'loss-data', 'map', 'match', 'resonator', 'stub']
     cmd.add_argument \
         ( 'action'
         , help = "Action to perform, one of %s" % ', '.join (actions)
@@ -2250,6 +2716,18 @@ def main ():
                     "default=%(default)s"
         , default = 3.5e6
         )
+    cmd.add_argument \
+        ( '--frequency-end'
+        , type    = float
+        , help    = "End frequency of map (Hz), default: only the"
+                    " frequency given with -f"
+        )
+    cmd.add_argument \
+        ( '--frequency-steps'
+        , type    = int
+        , help    = "Number of frequencies of map, default=%(default)s"
+        , default = 50
+        )
     cmd.add_argument \
         ( '-I', '--imperial'
         , help    = "Use imperial length (in feet) instead of metric length"
@@ -2273,21 +2751,54 @@ def main ():
         , help    = "Impedance at input to be matched" + eo
         , type    = complex
         )
+    cmd.add_argument \
+        ( '-m', '--map-file'
+        , help    = "Output file of map, default=%(default)s"
+        , default = 'coaxmap.npz'
+        )
     cmd.add_argument \
         ( '-p', '--power'
         , help    = "Power applied to the cable, default=%(default)s"
         , type    = float
         , default = 100.0
         )
+    cmd.add_argument \
+        ( '--r-range'
+        , help    = "Range of load resistance of map (min,max),"
+                    " default=%(default)s"
+        , default = '5,500'
+        )
     cmd.add_argument \
         ( '-x', '--reactance'
         , help    = "Reactance for stub report, default=%(default)s"
         , type    = float
         , default = -100.0
         )
+    cmd.add_argument \
+        ( '--x-range'
+        , help    = "Range of load reactance of map (min,max),"
+                    " default=%(default)s"
+        , default = '-500,500'
+        )
+    cmd.add_argument \
+        ( '--z-steps'
+        , type    = int
+        , help    = "Number of load resistances and reactances of map,"
+                    " default=%(default)s"
+        , default = 200
+        )
     args = cmd.parse_args ()
     cable = coax_models [args.coaxmodel]
     cable.reactance = args.reactance
+    cable.map_file  = args.map_file
+    cable.map_f     = np.array ([args.frequency])
+    if args.frequency_end is not None:
+        cable.map_f = np.linspace \
+            (args.frequency, args.frequency_end, args.frequency_steps)
+    cable.map_r = np.linspace \
+        (*(float (x) for x in args.r_range.split (',')), args.z_steps)
+    cable.map_x = np.linspace \
+        (*(float (x) for x in args.x_range.split (',')), args.z_steps)
     if args.z_load is None and args.z_input is None:
         args.z_load = 50.0
     cable.set_freq_params \
@@ -0,0 +1,443 @@
+#!/usr/bin/python3
+from __future__ import print_function
+
+import numpy as np
+
+from .cache import Computed_Result
+from .nport import nec_c, gain_floor, gain_min
+
+""" Far field of an antenna computed from the segment currents of a NEC
+    solution. NEC computes the far field for each direction requested
+    by an RP card, here the currents are retrieved once (by XQ) and the
+    field for any (possibly very dense) set of directions is computed
+    with NumPy. PyNEC returns only the centers and lengths of the
+    segments, their orientation is obtained by generating the geometry
+    of the model again into a Segments object.
+"""
+
+# Impedance of free space used by NEC
+eta  = 59.96 * 2 * np.pi
+eps0 = 8.854187817e-12
+
+class Segments (object):
+    """ Stand-in for the geometry of a NEC context that computes the
+        start and end points of all segments in the order of NEC. This
+        supports the geometry cards used by the antenna models: Wires
+        (GW, optionally tapered), arcs (GA), helices (GH), moves (GM)
+        and reflections (GX).
+
+    >>> s = Segments ()
+    >>> s.wire (1, 4, 0, 0, 0, 0, 0, 1, 0.001, 1, 1)
+    >>> s.move (0, 0, 0, 1, 0, 0, 1, 1, 1)
+    >>> s.reflect (1, 0, 0, 2)
+    >>> s.tags
+    array([1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4])
+    >>> print (s.centers [[0, 4, 12, 15]])
+    [[ 0.     0.     0.125]
+     [ 1.     0.     0.125]
+     [-1.     0.     0.125]
+     [-1.     0.     0.875]]
+    """
+
+    # Cards changing the segments of NEC that are not replayed here.
+    # A geometry_complete emitted by the geometry of a model itself is
+    # executed a second time by the model, this changes the segments
+    # in NEC (each segment is shortened to its second half).
+    unsupported = set \
+        (( 'geometry_complete', 'scale', 'gx_card', 'sp_card', 'sc_card'
+         , 'arbitrary_shaped_patch', 'rectangular_patch'
+         , 'triangular_patch', 'quadrilateral_patch', 'multiple_patch'
+         , 'generate_cylindrical_structure'
+        ))
+
+    def __init__ (self):
+        self.tags        = np.zeros (0, dtype = int)
+        self.ends        = np.zeros ((0, 2, 3))
+        # Name of the first unsupported card, see replayable
+        self.unsupported_card = None
+    # end def __init__
+
+    def get_geometry (self):
+        return self
+    # end def get_geometry
+
+    def __getattr__ (self, name):
+        """ Other cards of the NEC context (e.g. TL cards emitted by the
+            geometry of a model) do not change the segments, for the
+            unsupported cards we remember that the segments are not
+            those of NEC.
+        """
+        if name.startswith ('_'):
+            raise AttributeError (name)
+        if name in self.unsupported:
+            return lambda *args: self.unsupported_seen (name)
+        return lambda *args: None
+    # end def __getattr__
+
+    def unsupported_seen (self, name):
+        if self.unsupported_card is None:
+            self.unsupported_card = name
+    # end def unsupported_seen
+
+    @property
+    def replayable (self):
+        """ True if no card not replayed here has been emitted
+        """
+        return self.unsupported_card is None
+    # end def replayable
+
+    @property
+    def centers (self):
+        return self.ends.mean (axis = 1)
+    # end def centers
+
+    @property
+    def lengths (self):
+        return np.linalg.norm (self.ends [:, 1] - self.ends [:, 0], axis = 1)
+    # end def lengths
+
+    @property
+    def directions (self):
+        d = self.ends [:, 1] - self.ends [:, 0]
+        return d / self.lengths [:, np.newaxis]
+    # end def directions
+
+    def add (self, tags, ends):
+        self.tags = np.concatenate ((self.tags, tags))
+        self.ends = np.concatenate ((self.ends, ends))
+    # end def add
+
+    def add_points (self, tag, points):
+        """ Add the segments between consecutive points
+        """
+        n = len (points) - 1
+        self.add \
+            ( np.full (n, tag)
+            , np.stack ((points [:-1], points [1:]), axis = 1)
+            )
+    # end def add_points
+
+    def wire (self, tag, segs, x1, y1, z1, x2, y2, z2, r, rdel, rrad):
+        """ With rdel != 1 each segment is rdel times the previous one
+        """
+        t = np.linspace (0, 1, segs + 1)
+        if rdel != 1:
+            t = np.concatenate (([0], np.cumsum (rdel ** np.arange (segs))))
+            t = t / t [-1]
+        p1 = np.array ([x1, y1, z1], dtype = float)
+        p2 = np.array ([x2, y2, z2], dtype = float)
+        self.add_points (tag, p1 + t [:, np.newaxis] * (p2 - p1))
+    # end def wire
+
+    def arc (self, tag, segs, rad, a1, a2, r):
+        """ Arc in the x-z plane, angles (in degrees) from the x axis
+        """
+        a = np.radians (np.linspace (a1, a2, segs + 1))
+        p = np.array ([np.cos (a), np.zeros_like (a), np.sin (a)]).T
+        self.add_points (tag, rad * p)
+    # end def arc
+
+    def helix (self, tag, segs, s, hl, a1, b1, a2, b2, r):
+        """ Helix along the z axis with turn spacing s and length hl,
+            the radii in x and y change linearly from a1, b1 to a2, b2.
+        """
+        z   = np.linspace (0, hl, segs + 1)
+        a   = a1 + (a2 - a1) * z / hl
+        b   = b1 + (b2 - b1) * z / hl
+        phi = 2 * np.pi * z / s
+        p   = np.array ([a * np.cos (phi), b * np.sin (phi), z]).T
+        self.add_points (tag, p)
+    # end def helix
+
+    def move (self, rox, roy, roz, xs, ys, zs, its, nrpt, itgi):
+        """ Rotate (about x, y, then z, angles in degrees) and translate
+            the segments from the first with tag its (all if its is 0).
+            With nrpt copies are generated, incrementing the (non-zero)
+            tags by itgi for each copy.
+        """
+        sx, sy, sz = np.sin (np.radians ([rox, roy, roz]))
+        cx, cy, cz = np.cos (np.radians ([rox, roy, roz]))
+        rot = np.array \
+            ([ [cz * cy, cz * sy * sx - sz * cx, cz * sy * cx + sz * sx]
+             , [sz * cy, sz * sy * sx + cz * cx, sz * sy * cx - cz * sx]
+             , [-sy,     cy * sx,                cy * cx]
+            ])
+        first = 0
+        if its:
+            first = np.flatnonzero (self.tags == its) [0]
+        tags = self.tags [first:]
+        ends = self.ends [first:]
+        if not nrpt:
+            self.ends [first:] = ends @ rot.T + [xs, ys, zs]
+            return
+        for k in range (nrpt):
+            ends = ends @ rot.T + [xs, ys, zs]
+            tags = np.where (tags, tags + itgi, 0)
+            self.add (tags, ends)
+    # end def move
+
+    def reflect (self, ix, iy, iz, itx):
+        """ Reflect at the x-y, x-z, and y-z plane (in this order like
+            NEC), incrementing the (non-zero) tags of the copy by itx.
+        """
+        for axis, flag in ((2, iz), (1, iy), (0, ix)):
+            if flag:
+                ends = self.ends.copy ()
+                ends [..., axis] *= -1
+                self.add (np.where (self.tags, self.tags + itx, 0), ends)
+                itx *= 2
+    # end def reflect
+
+# end class Segments
+
+class Far_Field (object):
+    """ Far field of the segment currents (a structure currents result
+        of NEC) of the given segments, normalized to the input power.
+        Like in NEC the current along each segment is
+        A + B sin (k s) + C cos (k s) (s from the segment center), it
+        is fitted to the current at the center and the currents at the
+        ends of the segment, see basis. The radiation integral of this
+        current over the segment is computed in closed form. The ground
+        is given by the arguments of the GN card: None or type -1 is
+        free space, type 1 is a perfect ground (an image of the
+        currents), for other types the field of the image is multiplied
+        by the Fresnel reflection coefficients of a ground with the
+        given dielectric constant and conductivity, like NEC does for
+        the far field. With ground there is no field below the horizon.
+        The segments are checked against those of NEC.
+
+    >>> import PyNEC
+    >>> def cards (nec):
+    ...     geo = nec.get_geometry ()
+    ...     geo.wire (1, 21, 0, 0, 0, 0, 0, 1, 0.001, 1, 1)
+    ...     geo.move (0, 0, 0, 0, 0, 2, 0, 0, 0)
+    ...     geo.arc (2, 21, 0.5, 0, 180, 0.001)
+    ...     geo.move (30, 20, 10, 0.3, 0, 1.5, 2, 0, 0)
+    >>> s = Segments ()
+    >>> cards (s)
+    >>> for gn in None, (1, 0, 0, 0, 0, 0, 0, 0), (2, 0, 13, 0.005):
+    ...     nec = PyNEC.nec_context ()
+    ...     cards (nec)
+    ...     nec.geometry_complete (0)
+    ...     if gn:
+    ...         nec.gn_card (*(gn + (0,) * (8 - len (gn))))
+    ...     nec.ex_card (0, 1, 11, 0, 1, 0, 0, 0, 0, 0)
+    ...     nec.fr_card (0, 1, 140, 0)
+    ...     nec.rp_card (0, 19, 37, 0, 0, 0, 1, 0, 0, 5, 10, 0, 0)
+    ...     rp = nec.get_radiation_pattern (0)
+    ...     power = nec.get_input_parameters (0).get_power ().sum ()
+    ...     ff = Far_Field (s, nec.get_structure_currents (0), power, gn)
+    ...     p  = ff.pattern (rp.get_theta_angles (), rp.get_phi_angles ())
+    ...     g1, g2 = rp.get_gain (), p.get_gain ()
+    ...     a1, a2 = rp.get_average_power_gain (), p.get_average_power_gain ()
+    ...     ok = g1 > g1.max () - 30
+    ...     print ( "%.2f" % g1.max (), np.abs (g1 - g2) [ok].max () < 0.05
+    ...           , abs (a1 / a2 - 1) < 0.01
+    ...           , "%.2f" % p.get_average_power_solid_angle ()
+    ...           )
+    2.33 True True 2.00
+    8.33 True True 2.00
+    3.46 True True 2.00
+    """
+
+    # Maximum number of entries of the (directions x segments) matrix
+    # computed at once
+    chunk = 1 << 20
+
+    def __init__ (self, segments, currents, power, ground = None):
+        self.frequency  = currents.get_frequency ()
+        self.wavelength = nec_c / self.frequency
+        self.k          = 2 * np.pi / self.wavelength
+        self.current    = np.asarray (currents.get_current ())
+        self.power      = power
+        self.ground     = ground
+        if ground is not None and ground [0] == -1:
+            self.ground = None
+        centers = np.array \
+            ([ currents.get_current_segment_center_x ()
+             , currents.get_current_segment_center_y ()
+             , currents.get_current_segment_center_z ()
+            ]).T * self.wavelength
+        if  (  len (segments.tags) != len (self.current)
+            or not np.allclose
+                (segments.centers, centers, atol = 1e-4 * self.wavelength)
+            ):
+            raise ValueError ("Segments do not match those of NEC")
+        self.centers    = segments.centers
+        self.lengths    = segments.lengths
+        self.directions = segments.directions
+        self.basis (segments.ends)
+    # end def __init__
+
+    def basis (self, ends):
+        """ Coefficients A, B, C of the current along each segment
+            through the current at its center and the (estimated)
+            currents at its ends: At a junction of segments (including a
+            free end of a wire, a junction of one segment) the currents
+            flowing out of the junction must sum up to zero. For this
+            the center currents (in the direction out of the junction)
+            are corrected in proportion to the segment lengths. For two
+            segments this interpolates linearly between their centers,
+            at a free end the current is zero. With ground the current
+            at an end on the ground continues into the image and is
+            the center current.
+        """
+        n    = len (self.current)
+        ends = ends.reshape (-1, 3)
+        keys = np.round (ends / (1e-3 * self.lengths.min ()))
+        junction = np.unique (keys, axis = 0, return_inverse = True) [1]
+        junction = junction.reshape (-1)
+        sign = np.tile ([1, -1], n)
+        out  = sign * np.repeat (self.current, 2)
+        w    = np.repeat (self.lengths, 2)
+        tot  = np.bincount (junction, out.real) \
+             + np.bincount (junction, out.imag) * 1j
+        end  = out - tot [junction] * w / np.bincount (junction, w) [junction]
+        if self.ground is not None:
+            on_ground = np.abs (ends [:, 2]) < 1e-3 * self.lengths.min ()
+            end [on_ground] = out [on_ground]
+        i1, i2 = (sign * end).reshape (n, 2).T
+        kh = 0.5 * self.k * self.lengths
+        self.b = (i2 - i1) / (2 * np.sin (kh))
+        self.c = ((i1 + i2) / 2 - self.current) / (np.cos (kh) - 1)
+        self.a = self.current - self.c
+    # end def basis
+
+    def vector (self, r, centers, directions, odd = 1):
+        """ Sum of the segment moments (with directions) for the unit
+            vectors r with the phase of each segment and the integral
+            of its current over its length. For the image the current
+            along the (reversed) segment is mirrored, odd is -1.
+        """
+        h  = 0.5 * self.lengths
+        a  = self.k * (r @ directions.T)
+        sp = h * np.sinc ((a + self.k) * h / np.pi)
+        sm = h * np.sinc ((a - self.k) * h / np.pi)
+        f  = 2 * h * self.a * np.sinc (a * h / np.pi) \
+           - 1j * odd * self.b * (sp - sm) + self.c * (sp + sm)
+        f *= np.exp (1j * self.k * (r @ centers.T))
+        return f @ directions
+    # end def vector
+
+    def fields (self, theta, phi):
+        """ Theta and phi component of the far field (normalized to a
+            distance of 1m) for the directions given by theta and phi
+            (in degrees, broadcast against each other).
+        """
+        theta, phi = np.broadcast_arrays \
+            (np.radians (theta), np.radians (phi))
+        shape = theta.shape
+        theta = theta.reshape (-1)
+        phi   = phi.reshape (-1)
+        st, ct = np.sin (theta), np.cos (theta)
+        sp, cp = np.sin (phi),   np.cos (phi)
+        r     = np.array ([st * cp, st * sp, ct]).T
+        u_th  = np.array ([ct * cp, ct * sp, -st]).T
+        u_ph  = np.array ([-sp, cp, np.zeros_like (sp)]).T
+        e_th  = np.zeros (len (theta), dtype = complex)
+        e_ph  = np.zeros (len (theta), dtype = complex)
+        image = None
+        if self.ground is not None:
+            image = self.image_coefficients (ct, st)
+        n = max (1, self.chunk // len (self.current))
+        for i in range (0, len (theta), n):
+            j = slice (i, i + n)
+            v = self.vector (r [j], self.centers, self.directions)
+            e_th [j] = np.sum (v * u_th [j], axis = 1)
+            e_ph [j] = np.sum (v * u_ph [j], axis = 1)
+            if image is not None:
+                # Image of the currents of a perfect ground
+                c = self.centers * [1, 1, -1]
+                d = self.directions * [-1, -1, 1]
+                v = self.vector (r [j], c, d, odd = -1)
+                e_th [j] += image [0][j] * np.sum (v * u_th [j], axis = 1)
+                e_ph [j] += image [1][j] * np.sum (v * u_ph [j], axis = 1)
+        factor = -1j * self.k * eta / (4 * np.pi)
+        e_th  *= factor
+        e_ph  *= factor
+        if image is not None:
+            e_th [ct < 0] = e_ph [ct < 0] = 0
+        return e_th.reshape (shape), e_ph.reshape (shape)
+    # end def fields
+
+    def image_coefficients (self, ct, st):
+        """ Factors for the theta and phi component of the field of the
+            image for a perfect ground (1, 1) or the Fresnel reflection
+            coefficients of a finite ground.
+        """
+        if self.ground [0] == 1:
+            return np.ones_like (ct), np.ones_like (ct)
+        epse, sig = self.ground [2:4]
+        epsc = epse - 1j * sig / (2 * np.pi * self.frequency * eps0)
+        root = np.sqrt (epsc - st ** 2)
+        rv   = (epsc * ct - root) / (epsc * ct + root)
+        rh   = (ct - root) / (ct + root)
+        return rv, -rh
+    # end def image_coefficients
+
+    def gain (self, theta, phi):
+        """ Power gain (in dB) for the directions theta and phi (in
+            degrees, broadcast against each other).
+        """
+        e_th, e_ph = self.fields (theta, phi)
+        return self.db (e_th, e_ph)
+    # end def gain
+
+    def db (self, e_th, e_ph):
+        g = 2 * np.pi / eta * (abs (e_th) ** 2 + abs (e_ph) ** 2) / self.power
+        g = 10 * np.log10 (np.maximum (g, gain_min))
+        g [g <= 10 * np.log10 (gain_min)] = gain_floor
+        return g
+    # end def db
+
+    def pattern (self, theta, phi):
+        """ Radiation pattern for the grid of the given theta and phi
+            angles (in degrees), implements the methods of a radiation
+            pattern of NEC used by the antenna models. Like NEC the
+            average gain is averaged over the solid angle of the grid.
+        """
+        theta = np.asarray (theta, dtype = float)
+        phi   = np.asarray (phi,   dtype = float)
+        e_th, e_ph = self.fields (theta [:, np.newaxis], phi)
+        gain  = self.db (e_th, e_ph)
+        w     = self.weights (theta, phi)
+        lin   = np.where (gain > gain_floor, 10 ** (gain / 10), 0)
+        angle = w.sum ()
+        return Computed_Result \
+            ( get_frequency                 = self.frequency
+            , get_gain                      = gain
+            , get_e_theta                   = e_th.T.reshape (-1)
+            , get_e_phi                     = e_ph.T.reshape (-1)
+            , get_theta_angles              = theta
+            , get_phi_angles                = phi
+            , get_ntheta                    = len (theta)
+            , get_nphi                      = len (phi)
+            , get_theta_start               = theta [0]
+            , get_phi_start                 = phi [0]
+            , get_delta_theta               = np.diff (theta [:2]).sum ()
+            , get_delta_phi                 = np.diff (phi [:2]).sum ()
+            , get_average_power_gain        = (lin * w).sum () / angle
+            , get_average_power_solid_angle = angle / np.pi
+            )
+    # end def pattern
+
+    @staticmethod
+    def weights (theta, phi):
+        """ Solid angle of each direction of the grid: The band between
+            the midpoints to the neighboring theta angles (limited to
+            the range of the grid) and half the phi increment to each
+            side, the first and last phi only to the inside.
+        """
+        t  = np.radians (theta)
+        p  = np.radians (phi)
+        dt = np.diff (t).mean () if len (t) > 1 else 0
+        wt = np.cos (np.maximum (t - dt / 2, t [0])) \
+           - np.cos (np.minimum (t + dt / 2, t [-1]))
+        wp = np.ones (len (p))
+        if len (p) > 1:
+            wp *= np.diff (p).mean ()
+            wp [[0, -1]] /= 2
+        return np.abs (wt) [:, np.newaxis] * wp
+    # end def weights
+
+# end class Far_Field
@@ -139,6 +139,7 @@ class Folded_Dipole_Optimizer (Antenna_Optimizer):
     """
     # The antenna class
     ant_cls  = Folded_Dipole
+    cache_attributes = ('force_reflector',)
 
     def __init__ (self, force_reflector = False, **kw):
         self.force_reflector = force_reflector
@@ -56,8 +56,16 @@ class Folded_Dipole (Antenna_Model):
     # end def geometry
 
     def _geometry (self, geo):
-        a = ((-90, 90), (90, 270))
-        for n, z in enumerate ((1, -1)):
+        # With use_symmetry only the right arc and the right half of
+        # the straight wires are generated, the feed is on the segment
+        # right of the center
+        a     = ((-90, 90), (90, 270))
+        sides = (1, -1)
+        x1    = -self.lambda_4
+        if self.use_symmetry:
+            sides = sides [:1]
+            x1    = 0
+        for n, z in enumerate (sides):
             a1, a2 = a [n]
             geo.arc \
                 ( self.tag
@@ -81,6 +89,8 @@ class Folded_Dipole (Antenna_Model):
             segs = int (segs)
             if segs % 2 == 0:
                 segs += 1
+        if self.use_symmetry:
+            segs = segs // 2 + 1
         if self.lambda_4 > 0.0:
             for z in (self.dipole_radius, -self.dipole_radius):
                 if self.use_boom:
@@ -98,16 +108,21 @@ class Folded_Dipole (Antenna_Model):
                     geo.wire \
                         ( self.tag
                         , segs
-                        , -self.lambda_4, 0, z
-                        ,  self.lambda_4, 0, z
+                        , x1,            0, z
+                        , self.lambda_4, 0, z
                         , self.wire_radius
                         , 1, 1
                         )
                     self.tag += 1
         if self.use_boom:
             self.ex = Excitation (self.tag - 1, 1)
+        elif self.lambda_4 >= 0.002 and self.use_symmetry:
+            self.ex = Excitation (self.tag - 1, 1)
         elif self.lambda_4 >= 0.002:
             self.ex = Excitation (self.tag - 1, segs // 2 + 1)
+        elif self.use_symmetry:
+            # Mirror image of the last segment of the left round part
+            self.ex = Excitation (roundtag, 1)
         else:
             # If straight piece is too small use last round segment
             self.ex = Excitation (roundtag, self.segs_arc)
@@ -122,8 +137,17 @@ class Folded_Dipole (Antenna_Model):
                 , 1, 1
                 )
             self.tag += 1
+        if self.use_symmetry:
+            self.mirror (geo)
     # end def _geometry
 
+    @property
+    def symmetric (self):
+        """ The boom lies in the plane of symmetry
+        """
+        return not self.use_boom
+    # end def symmetric
+
     @property
     def up (self):
         """ move everything up by max (reflector length, lambda_4 + r)
@@ -141,6 +165,7 @@ class Folded_Dipole_Optimizer (Antenna_Optimizer):
         * 40cm <= lambda_4      <= 150cm
     """
     ant_cls = Folded_Dipole
+    cache_attributes = ('impedance', 'use_boom')
 
     def __init__ \
         (self, impedance = 75.0, allow_loop = False, use_boom = False, **kw):
@@ -61,6 +61,13 @@ class HB9CV (Antenna_Model):
             )
     # end def cmdline
 
+    @property
+    def boom_radius (self):
+        """ The boom uses the same wire as the elements
+        """
+        return self.wire_radius
+    # end def boom_radius
+
     def geometry (self, nec = None):
         if nec is None:
             nec = self.nec
@@ -289,6 +296,7 @@ class HB9CV_Optimizer (Antenna_Optimizer):
         *  5mm   <= stub_height <= 1.5cm
     """
     ant_cls = HB9CV
+    cache_attributes = ('vf',)
 
     def __init__ (self, vf = 0.9, **kw):
         self.minmax = \
@@ -14,6 +14,7 @@ class Folded_Dipole (Antenna_Model):
     segs_end      =   5
     frq_ranges    = [(13.000, 14.350)]
     theta_range   = 90
+    symmetric     = True
 
     def __init__ \
         ( self
@@ -50,18 +51,30 @@ class Folded_Dipole (Antenna_Model):
     # end def geometry
 
     def _geometry (self, geo):
+        # With use_symmetry the dipole wires start at the center, the
+        # feed is on the first segment right of the center then
+        x1   = -self.dipole_len / 2
+        segs = self.segs_dipole
+        ends = (-self.dipole_len / 2, self.dipole_len / 2)
+        if self.use_symmetry:
+            x1   = 0
+            segs = self.segs_dipole // 2 + 1
+            ends = ends [1:]
         for y in (0, self.dipole_dist):
             geo.wire \
                 ( self.tag
-                , self.segs_dipole
-                , -self.dipole_len / 2, 0, y
-                ,  self.dipole_len / 2, 0, y
+                , segs
+                , x1,                  0, y
+                , self.dipole_len / 2, 0, y
                 , self.wire_radius
                 , 1, 1
                 )
             self.tag += 1
-        self.ex = Excitation (1, self.segs_dipole // 2)
-        for x in (-self.dipole_len / 2, self.dipole_len / 2):
+        if self.use_symmetry:
+            self.ex = Excitation (1, 1)
+        else:
+            self.ex = Excitation (1, self.segs_dipole // 2)
+        for x in ends:
             geo.wire \
                 ( self.tag
                 , self.segs_end
@@ -71,6 +84,8 @@ class Folded_Dipole (Antenna_Model):
                 , 1, 1
                 )
             self.tag += 1
+        if self.use_symmetry:
+            self.mirror (geo)
     # end def _geometry
 
     def ground (self, nec = None):
@@ -14,6 +14,7 @@ class Inverted_V (Antenna_Model):
     seg_len       = 0.05
     frq_ranges    = [(13.000, 14.350)]
     theta_range   = 90
+    symmetric     = True
 
     def __init__ \
         ( self
@@ -51,18 +52,26 @@ class Inverted_V (Antenna_Model):
     # end def geometry
 
     def _geometry (self, geo):
-        # Use a horizontal 3-element wire in the middle for excitation
+        # Use a horizontal 3-element wire in the middle for excitation,
+        # with use_symmetry its right half with two segments
+        x1    = -self.seg_len * 3 / 2
+        segs  = 3
+        sides = (-1, 1)
+        if self.use_symmetry:
+            x1    = 0
+            segs  = 2
+            sides = (1,)
         geo.wire \
                 ( self.tag
-                , 3
-                , -self.seg_len * 3 / 2, 0, 0
-                ,  self.seg_len * 3 / 2, 0, 0
+                , segs
+                , x1,                   0, 0
+                , self.seg_len * 3 / 2, 0, 0
                 , self.wire_radius
                 , 1, 1
                 )
         self.ex = Excitation (1, 1)
         self.tag += 1
-        for sgn in (-1, 1):
+        for sgn in sides:
             a = self.dipole_angle / 180 * np.pi
             s = sgn * self.seg_len * 3 / 2
             z = np.cos (a) * self.dipole_half
@@ -77,6 +86,8 @@ class Inverted_V (Antenna_Model):
                 , 1, 1
                 )
             self.tag += 1
+        if self.use_symmetry:
+            self.mirror (geo)
     # end def _geometry
 
     def ground (self, nec = None):
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+from __future__ import print_function
+
+import numpy as np
+from numpy.polynomial import chebyshev
+
+""" Model-based parameter estimation (MBPE) of the input impedance: The
+    impedance of a wire antenna is a smooth function of the frequency,
+    it is well approximated by a rational function of low degree. The
+    impedance is computed (by NEC) only at a few frequencies that are
+    chosen adaptively, the impedance (and therefore the VSWR) for any
+    number of frequencies is computed from the fitted function.
+"""
+
+class Rational_Fit (object):
+    """ Rational function N (f) / D (f) with a numerator of the given
+        degree p and a denominator of degree q fitted to complex
+        samples z at frequencies f. The fit minimizes the relative
+        error of the linearized problem N (f) - z D (f) = 0 in the
+        least-squares sense, with p + q + 1 samples it interpolates.
+        Both polynomials are Chebyshev series of the frequency
+        normalized to [-1, 1] over the interval from lo to hi (by
+        default the range of the samples), the constant term of the
+        denominator is 1.
+
+    >>> def z (f):
+    ...     return (1 + 2j * f) / (1 - 0.1 * f ** 2)
+    >>> f = np.linspace (1, 2, 4)
+    >>> r = Rational_Fit (f, z (f), 1, 2)
+    >>> f = np.linspace (1, 2, 21)
+    >>> print (np.abs (r (f) - z (f)).max () < 1e-10)
+    True
+    """
+
+    def __init__ (self, f, z, p, q, lo = None, hi = None):
+        f = np.asarray (f, dtype = float)
+        z = np.asarray (z, dtype = complex)
+        self.p  = p
+        self.q  = q
+        self.lo = f.min () if lo is None else lo
+        self.hi = f.max () if hi is None else hi
+        x = self.normalize (f)
+        w = 1 / np.abs (z)
+        a = np.concatenate \
+            ( ( chebyshev.chebvander (x, p)
+              , -z [:, None] * chebyshev.chebvander (x, q) [:, 1:]
+              )
+            , axis = 1
+            )
+        c = np.linalg.lstsq (a * w [:, None], z * w, rcond = None) [0]
+        self.num = c [:p + 1]
+        self.den = np.concatenate (([1], c [p + 1:]))
+    # end def __init__
+
+    def __call__ (self, f):
+        x = self.normalize (np.asarray (f, dtype = float))
+        n = chebyshev.chebval (x, self.num)
+        return n / chebyshev.chebval (x, self.den)
+    # end def __call__
+
+    def normalize (self, f):
+        width = self.hi - self.lo
+        if not width:
+            width = 1.0
+        return (2 * f - self.lo - self.hi) / width
+    # end def normalize
+
+# end class Rational_Fit
+
+class MBPE (object):
+    """ Adaptive rational fit of an impedance from lo to hi. The
+        callable solve computes the impedances for an array of
+        frequencies. We start with initial equidistant frequencies and
+        fit two rational functions of different order: One
+        interpolating all samples and one of the next lower order
+        fitted by least squares. The next sample is taken where the
+        two disagree most (on a grid of the given number of points)
+        until the relative difference is below the tolerance or we
+        have max_points samples. After that one more (hold-out)
+        impedance is computed at the frequency of the largest
+        difference, it is not used for the fit: The relative deviation
+        of the fit from that impedance is the error estimate of the
+        fit.
+        The impedance of a lossy open stub (not a rational function of
+        the frequency) near resonance:
+
+    >>> def stub (f):
+    ...     gl = (0.02 + 0.5j * np.pi) * np.asarray (f)
+    ...     return 50 / np.tanh (gl)
+    >>> m = MBPE (stub, 0.5, 1.5)
+    >>> f = np.linspace (0.5, 1.5, 151)
+    >>> err = np.abs (m (f) - stub (f)) / np.abs (stub (f))
+    >>> print (m.solves, err.max () < 1e-3, m.error < 1e-3)
+    8 True True
+    """
+
+    def __init__ \
+        ( self, solve, lo, hi
+        , tolerance  = 1e-3
+        , initial    = 5
+        , max_points = 25
+        , grid       = 201
+        ):
+        self.solve      = solve
+        self.lo         = lo
+        self.hi         = hi
+        self.tolerance  = tolerance
+        self.max_points = max (max_points, initial)
+        self.frequencies = np.linspace (lo, hi, initial)
+        self.impedances  = np.asarray (solve (self.frequencies))
+        self.grid        = np.linspace (lo, hi, grid)
+        spacing          = (hi - lo) / (grid - 1.0)
+        while True:
+            self.fit = self.rational (len (self.frequencies))
+            other    = self.rational (len (self.frequencies) - 1)
+            zf = self.fit (self.grid)
+            d  = np.abs (zf - other (self.grid)) / np.abs (zf)
+            # Don't sample the same frequency twice
+            dist = np.abs (self.grid [:, None] - self.frequencies).min (1)
+            d [dist < spacing / 2] = 0
+            k  = np.argmax (d)
+            n  = len (self.frequencies)
+            if d [k] <= tolerance or n >= self.max_points:
+                break
+            self.frequencies = np.append (self.frequencies, self.grid [k])
+            self.impedances  = np.append \
+                (self.impedances, solve (self.grid [k:k + 1]))
+        fh = self.holdout_frequency = self.grid [k]
+        zh = self.holdout_impedance = np.asarray (solve ([fh])) [0]
+        self.error  = abs (self.fit (fh) - zh) / abs (zh)
+        self.solves = len (self.frequencies) + 1
+    # end def __init__
+
+    def __call__ (self, f):
+        return self.fit (f)
+    # end def __call__
+
+    def rational (self, n):
+        """ Rational function with n coefficients fitted to all samples
+        """
+        return Rational_Fit \
+            ( self.frequencies, self.impedances, n // 2, (n - 1) // 2
+            , self.lo, self.hi
+            )
+    # end def rational
+
+# end class MBPE
@@ -176,6 +176,7 @@ class Multi_Dipole_Optimizer (Antenna_Optimizer):
     """
 
     ant_cls = Multi_Dipole
+    cache_attributes = ('radius_feed', 'feedpoint_h')
 
     def __init__ \
         (self, radius_feed = None, feedpoint_h = 5, **kw):
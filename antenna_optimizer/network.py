@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+from __future__ import print_function
+
+import numpy as np
+from rsclib.capacitance import c
+
+""" Two-port networks built from transmission lines, stubs and lumped
+    impedances. Each block is described by its ABCD (chain) matrix
+    which is computed for a whole array of frequencies at once, the
+    result has the shape of the frequency array with two additional
+    trailing dimensions of size 2. Blocks are cascaded by multiplying
+    their matrices, see Network. Port 1 of each block is the input
+    (source side), port 2 the output (load side).
+    Transmission lines either use a cable model (see coaxmodel) or are
+    lossless with a given characteristic impedance and velocity factor.
+"""
+
+def abcd (a, b, cc, d):
+    """ ABCD matrix from the four (broadcast) entries
+    """
+    a, b, cc, d = np.broadcast_arrays (a, b, cc, d)
+    m = np.empty (a.shape + (2, 2), dtype = complex)
+    m [..., 0, 0] = a
+    m [..., 0, 1] = b
+    m [..., 1, 0] = cc
+    m [..., 1, 1] = d
+    return m
+# end def abcd
+
+def divide (n, d):
+    """ Quotient n / d which is infinite where d is 0, e.g. for the
+        impedance of an open circuit
+    """
+    d    = np.asarray (d)
+    zero = d == 0
+    return np.where (zero, np.inf, n / np.where (zero, 1, d))
+# end def divide
+
+def entries (m):
+    """ The four entries of an ABCD matrix (or array of matrices)
+    """
+    return m [..., 0, 0], m [..., 0, 1], m [..., 1, 0], m [..., 1, 1]
+# end def entries
+
+class Lossless_Cable (object):
+    """ Lossless cable with characteristic impedance Z0 and velocity
+        factor vf, implements the methods of a cable model (see
+        Manufacturer_Data_Cable in coaxmodel) used here.
+    """
+
+    def __init__ (self, Z0 = 50.0, vf = 1.0):
+        self.Z0   = Z0
+        self.vf   = vf
+        self.name = 'lossless %g' % Z0
+    # end def __init__
+
+    def gamma (self, f):
+        return 2j * np.pi * np.asarray (f) / (c * self.vf)
+    # end def gamma
+
+    def z0f (self, f):
+        return self.Z0 + 0j * np.asarray (f)
+    # end def z0f
+
+# end class Lossless_Cable
+
+class Two_Port (object):
+    """ Base class of all blocks, derived classes implement abcd
+    """
+
+    def abcd (self, f):
+        raise NotImplementedError ("Derived class must implement 'abcd'")
+    # end def abcd
+
+    def input_impedance (self, f, z_l):
+        """ Impedance at port 1 with port 2 terminated with z_l (None
+            is an open circuit) for frequency f (in Hz, may be an
+            array).
+        """
+        a, b, cc, d = entries (self.abcd (f))
+        if z_l is None:
+            return divide (a, cc)
+        return divide (a * z_l + b, cc * z_l + d)
+    # end def input_impedance
+
+    def s_parameters (self, f, z0 = 50.0):
+        """ S-parameters with reference impedance z0, the result has
+            the same shape as the ABCD matrix. All blocks are
+            reciprocal (AD - BC = 1) except a short (see Shunt) where
+            the matrix is scaled, so S21 = S12 is computed from the
+            determinant, too.
+        """
+        a, b, cc, d = entries (self.abcd (f))
+        den = a + b / z0 + cc * z0 + d
+        s21 = 2 * (a * d - b * cc) / den
+        return abcd \
+            ( (a + b / z0 - cc * z0 - d) / den
+            , s21
+            , s21
+            , (-a + b / z0 - cc * z0 + d) / den
+            )
+    # end def s_parameters
+
+# end class Two_Port
+
+class Line (Two_Port):
+    """ Transmission line section of the given length (in m) in series
+        between the ports. Without a cable a lossless line with the
+        impedance z0 and velocity factor vf is used.
+
+    >>> from .coaxmodel import Manufacturer_Data_Cable, m_per_ft
+    >>> cable = Manufacturer_Data_Cable (50, 0.66)
+    >>> cable.set_loss_constants (10e6, 1.4 / m_per_ft)
+    >>> f = np.array ([7e6, 14e6])
+    >>> z = Line (3.3, cable).input_impedance (f, 25 + 10j)
+    >>> print (np.allclose (z, cable.z_d (f, 3.3, 25 + 10j)))
+    True
+    >>> z = Line (c / 4e6, z0 = 50).input_impedance (1e6, 100)
+    >>> print ("%.2f %.2f" % (z.real, abs (z.imag)))
+    25.00 0.00
+    """
+
+    def __init__ (self, length, cable = None, z0 = 50.0, vf = 1.0):
+        self.length = length
+        self.cable  = cable or Lossless_Cable (z0, vf)
+    # end def __init__
+
+    def abcd (self, f):
+        gl = self.cable.gamma (f) * self.length
+        z0 = self.cable.z0f (f)
+        ch = np.cosh (gl)
+        sh = np.sinh (gl)
+        return abcd (ch, z0 * sh, sh / z0, ch)
+    # end def abcd
+
+# end class Line
+
+class Series (Two_Port):
+    """ Impedance z in series between the ports, z may be a constant
+        (or an array matching the frequencies) or a function of the
+        frequency.
+        An infinite impedance (e.g. an open stub of length 0) is an
+        open circuit between the ports. Like for a short in Shunt the
+        ABCD matrix is then replaced by its limit scaled with 1 / z.
+
+    >>> s = Series (np.array ([np.inf, 50]))
+    >>> print (s.input_impedance (1e6, 50))
+    [ inf+0.j 100.+0.j]
+    >>> print (np.abs (s.s_parameters (1e6) [..., 1, 0]).round (3))
+    [0.    0.667]
+    """
+
+    def __init__ (self, z):
+        self.z = z
+    # end def __init__
+
+    def impedance (self, f):
+        if callable (self.z):
+            return self.z (f)
+        return self.z
+    # end def impedance
+
+    def abcd (self, f):
+        z       = np.asarray (self.impedance (f))
+        is_open = np.isinf (z)
+        return abcd \
+            ( np.where (is_open, 0, 1), np.where (is_open, 1, z)
+            , 0, np.where (is_open, 0, 1)
+            )
+    # end def abcd
+
+# end class Series
+
+class Shunt (Series):
+    """ Impedance z in parallel to the ports, see Series for z.
+        A zero impedance (e.g. a short-circuited stub of length 0) is
+        a short of the ports, its admittance is infinite. The ABCD
+        matrix is then replaced by its limit scaled with z, this
+        doesn't change impedances and reflection coefficients and
+        nothing is transmitted through the short.
+
+    >>> s = Shunt (np.array ([0, 25]))
+    >>> print (Network ([Line (c / 8e6, z0 = 50), s]).input_impedance
+    ...     (1e6, 50))
+    [ 0.+50.j 30.+40.j]
+    >>> print (np.abs (s.s_parameters (1e6) [..., 1, 0]))
+    [0.  0.5]
+    """
+
+    def abcd (self, f):
+        z     = np.asarray (self.impedance (f))
+        short = z == 0
+        y     = 1.0 / np.where (short, 1, z)
+        return abcd \
+            ( np.where (short, 0, 1), 0
+            , np.where (short, 1, y), np.where (short, 0, 1)
+            )
+    # end def abcd
+
+# end class Shunt
+
+class Stub (Two_Port):
+    """ Stub of the given length made from a cable (lossless with
+        impedance z0 and velocity factor vf if no cable is given), open
+        or short-circuited at the end. The stub is in parallel to the
+        ports or (with is_series) in series.
+
+    >>> s = Stub (c / 8e6, z0 = 50)
+    >>> print ("%.2f" % s.impedance (1e6).imag)
+    50.00
+    >>> s = Stub (c / 8e6, z0 = 50, is_open = True)
+    >>> print ("%.2f" % s.impedance (1e6).imag)
+    -50.00
+    >>> z = Network ([s]).input_impedance (1e6, 50)
+    >>> print ("%.2f %.2f" % (z.real, z.imag))
+    25.00 -25.00
+
+    An open stub of length 0 has an infinite impedance, in parallel
+    it doesn't change anything, in series it disconnects the load:
+
+    >>> s = Stub (0, z0 = 50, is_open = True)
+    >>> print (s.impedance (1e6), s.input_impedance (1e6, 50))
+    (inf+0j) (50+0j)
+    >>> s = Stub (0, z0 = 50, is_open = True, is_series = True)
+    >>> print (s.input_impedance (1e6, 50))
+    (inf+0j)
+    """
+
+    def __init__ \
+        ( self
+        , length
+        , cable     = None
+        , z0        = 50.0
+        , vf        = 1.0
+        , is_open   = False
+        , is_series = False
+        ):
+        self.length    = length
+        self.cable     = cable or Lossless_Cable (z0, vf)
+        self.is_open   = is_open
+        self.is_series = is_series
+    # end def __init__
+
+    def impedance (self, f):
+        """ Impedance of the stub, infinite for an open stub of length 0
+        """
+        if self.is_open:
+            return divide (1.0, self.admittance (f))
+        t = np.tanh (self.cable.gamma (f) * self.length)
+        return self.cable.z0f (f) * t
+    # end def impedance
+
+    def admittance (self, f):
+        """ Admittance of an open stub, this is finite for all lengths
+        """
+        assert self.is_open
+        t = np.tanh (self.cable.gamma (f) * self.length)
+        return t / self.cable.z0f (f)
+    # end def admittance
+
+    def abcd (self, f):
+        if self.is_series:
+            return Series (self.impedance).abcd (f)
+        if self.is_open:
+            return abcd (1, 0, self.admittance (f), 1)
+        return Shunt (self.impedance).abcd (f)
+    # end def abcd
+
+# end class Stub
+
+class Network (Two_Port):
+    """ Cascade of two-ports given in order from port 1 (input) to port
+        2 (load).
+
+    >>> n = Network ([Line (1.0), Shunt (100.0), Series (10j)])
+    >>> m = n.abcd (np.array ([1e6, 2e6, 3e6]))
+    >>> m.shape
+    (3, 2, 2)
+    >>> print (np.allclose (m [..., 0, 0] * m [..., 1, 1]
+    ...                   - m [..., 0, 1] * m [..., 1, 0], 1))
+    True
+    >>> s = Network ([Line (2.0)]).s_parameters (14e6)
+    >>> print ("%.3f %.3f" % (abs (s [0, 0]), abs (s [1, 0])))
+    0.000 1.000
+    """
+
+    def __init__ (self, elements):
+        self.elements = list (elements)
+    # end def __init__
+
+    def abcd (self, f):
+        m = abcd (1, 0, 0, 1) * np.ones (np.shape (f) + (1, 1))
+        for e in self.elements:
+            m = m @ e.abcd (f)
+        return m
+    # end def abcd
+
+# end class Network
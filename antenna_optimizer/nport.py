@@ -0,0 +1,601 @@
+#!/usr/bin/python3
+from __future__ import print_function
+
+import hashlib
+import numpy as np
+import PyNEC
+
+from .cache import Nec_Cache, Computed_Result, Recording_Context
+from .cache import Recording_Geometry
+
+# Velocity of light used by NEC for the length of transmission lines
+nec_c      = 299.792458e6
+# NEC reports the gain (in dB) of a null (a gain below gain_min) as
+# gain_floor
+gain_floor = -999.99
+gain_min   = 1e-20
+
+def load_impedance (ldtyp, r, l, cap, f):
+    """ Impedance of a lumped load (LD card of type ldtyp with the
+        values r, l, and cap) at frequency f (in Hz): A series RLC
+        circuit (type 0), a parallel RLC circuit (type 1) or an
+        impedance r + jl (type 4). Like in NEC a zero value omits the
+        element from the circuit.
+
+    >>> print ("%.2f%+.2fj" % (lambda z: (z.real, z.imag))
+    ...     (load_impedance (0, 10, 1e-6, 1e-9, 1e7)))
+    10.00+46.92j
+    >>> print ("%.2f" % load_impedance (1, 100, 0, 0, 1e7).real)
+    100.00
+    """
+    w = 2 * np.pi * f
+    if ldtyp == 4:
+        return complex (r, l)
+    if ldtyp == 0:
+        z = r + 1j * w * l
+        if cap:
+            z += 1 / (1j * w * cap)
+        return z
+    if ldtyp == 1:
+        y = 1j * w * cap
+        if r:
+            y += 1 / r
+        if l:
+            y += 1 / (1j * w * l)
+        return 1 / y
+    raise ValueError ("Load type %d is not a lumped load" % ldtyp)
+# end def load_impedance
+
+def tl_params (z0, length, f, y1 = 0, y2 = 0):
+    """ Admittance parameters (y11, y12, y22) of a lossless
+        transmission line (TL card) with impedance z0 and the given
+        length at frequency f (in Hz), y1 and y2 are the shunt
+        admittances at the ends. A negative z0 is a crossed line.
+
+    >>> y11, y12, y22 = tl_params (50, nec_c / 4e6, 1e6)
+    >>> print ("%.4f %.4f" % (abs (y11), abs (y12)))
+    0.0000 0.0200
+    """
+    bl  = 2 * np.pi * f * length / nec_c
+    y11 = -1j / (abs (z0) * np.tan (bl))
+    y12 = 1j / (z0 * np.sin (bl))
+    return y11 + y1, y12, y11 + y2
+# end def tl_params
+
+class N_Port (object):
+    """ The wire structure of an antenna (geometry, ground and all
+        loads not at a port) at one frequency reduced to N ports, each
+        port is the gap of a segment given by tag and segment number.
+        NEC computes the currents of all segments (given by tags,
+        numbers and centers, in wavelengths like returned by NEC) for
+        each port excited with 1V while all other gaps are shorted,
+        these are the columns of currents. The rows of the ports form
+        the short-circuit admittance matrix y, the impedance matrix z
+        is its inverse. For each radiation pattern (keyed by the
+        arguments of its RP card) fields contains the far field (theta
+        and phi component) of each of these excitations. The currents
+        and field of any other excitation are a superposition, see
+        excite.
+        Sources, lumped loads at ports and networks between ports are
+        applied by small-matrix algebra in solve, so they can be varied
+        without computing the structure again.
+    """
+
+    def __init__ (self, frequency, ports, tags, numbers, centers, currents):
+        self.frequency     = frequency
+        self.ports         = ports
+        self.index         = dict ((p, i) for i, p in enumerate (ports))
+        self.tags          = tags
+        self.numbers       = numbers
+        self.centers       = centers
+        self.currents      = currents
+        self.segments      = np.array \
+            ([np.flatnonzero (tags == t) [s - 1] for t, s in ports])
+        self.y             = currents [self.segments]
+        self.fields        = {}
+        self.gain_constant = None
+    # end def __init__
+
+    def __sizeof__ (self):
+        return object.__sizeof__ (self) + sum \
+            ( a.nbytes for a in
+              ( self.tags, self.numbers, self.centers, self.currents
+              , self.y
+              )
+            ) + sum (e.nbytes for f in self.fields.values () for e in f)
+    # end def __sizeof__
+
+    def excite (self, e):
+        """ Currents of all segments for the excitation e (the voltage
+            across each port gap)
+        """
+        return self.currents @ e
+    # end def excite
+
+    @property
+    def z (self):
+        return np.linalg.inv (self.y)
+    # end def z
+
+    def add_fields (self, rp, e_theta, e_phi, gains):
+        """ Add the far fields (indexed by port, theta and phi) for the
+            radiation pattern rp. The gains (in dB) computed by NEC for
+            each excitation determine the factor from the power
+            density to the gain.
+        """
+        self.fields [rp] = (e_theta, e_phi)
+        if self.gain_constant is None:
+            p = 0.5 * np.diag (self.y).real
+            s = np.abs (e_theta) ** 2 + np.abs (e_phi) ** 2
+            j = np.unravel_index (np.argmax (s), s.shape)
+            self.gain_constant = 10 ** (gains [j] / 10) * p [j [0]] / s [j]
+    # end def add_fields
+
+    def solve (self, sources, loads, networks):
+        """ Solve the structure with the given sources (a dict of
+            voltages by port), loads (a dict of impedances by port) and
+            networks (a list of two ports and their admittance
+            parameters y11, y12, y22). Like in NEC a source at a network
+            port is in parallel to the network, the gaps of all other
+            ports that are not network ports are shorted (except for
+            their loads). Returns the voltages at the ports, the
+            currents delivered to the ports (by sources or networks)
+            and the excitation of the structure (the voltage across the
+            gap minus the voltage at the load).
+        """
+        n  = len (self.ports)
+        v  = np.zeros (n, dtype = complex)
+        zl = np.zeros (n, dtype = complex)
+        for p, z in loads.items ():
+            zl [self.index [p]] += z
+        y = self.y
+        if loads:
+            y = np.linalg.inv (self.z + np.diag (zl))
+        yt = y.copy ()
+        for p1, p2, y11, y12, y22 in networks:
+            i, k = self.index [p1], self.index [p2]
+            yt [i, i] += y11
+            yt [i, k] += y12
+            yt [k, i] += y12
+            yt [k, k] += y22
+        s      = [self.index [p] for p in sources]
+        v [s]  = list (sources.values ())
+        free   = set (self.index [p] for nw in networks for p in nw [:2])
+        free   = sorted (free - set (s))
+        if free:
+            v [free] = np.linalg.solve \
+                (yt [np.ix_ (free, free)], -yt [np.ix_ (free, s)] @ v [s])
+        return v, yt @ v, v - zl * (y @ v)
+    # end def solve
+
+    def pattern (self, rp, e, power):
+        """ Far field (theta and phi component) and gain (in dB) of
+            the radiation pattern rp for the excitation e of the
+            structure and the given input power.
+        """
+        e_theta, e_phi = self.fields [rp]
+        e_theta = np.tensordot (e, e_theta, 1)
+        e_phi   = np.tensordot (e, e_phi,   1)
+        g = self.gain_constant \
+          * (np.abs (e_theta) ** 2 + np.abs (e_phi) ** 2) / power
+        g = 10 * np.log10 (np.maximum (g, gain_min))
+        g [g <= 10 * np.log10 (gain_min)] = gain_floor
+        return e_theta, e_phi, g
+    # end def pattern
+
+# end class N_Port
+
+class Port_Context (object):
+    """ Stand-in for a NEC context that computes the results of an
+        antenna model with port reduction: The cards are recorded and
+        when the model executes (XQ or RP card), the wire structure
+        without sources, networks and lumped loads at single segments
+        is reduced to an N_Port at the segments of these for each
+        frequency. The N_Port is looked up in the cache (keyed by the
+        cards of the structure, the frequency and the ports) and only
+        on a cache miss computed by NEC. Sources, networks and loads
+        are then applied by N_Port.solve, so models that differ only
+        in these share one NEC computation, e.g. the optimization of
+        matching networks or lumped elements.
+        Like in NEC a group of LD, EX, or network (NT and TL) cards
+        replaces the previous group of the same kind when other cards
+        have been emitted in between. Only voltage sources, the XQ
+        card and RP cards for the power gain without averaging are
+        supported, the results implement the methods of NEC results
+        used by the antenna models.
+
+    >>> def cards (nec, length = 0.5):
+    ...     geo = nec.get_geometry ()
+    ...     geo.wire (1, 11, 0.0, 0, 0, 0.0, 0, 1, 0.001, 1, 1)
+    ...     geo.wire (2, 11, 0.3, 0, 0, 0.3, 0, 1, 0.001, 1, 1)
+    ...     nec.geometry_complete (0)
+    ...     nec.ld_card (5, 0, 0, 0, 37735849, 0, 0)
+    ...     nec.ld_card (0, 2, 6, 6, 10, 0, 5e-12)
+    ...     nec.ex_card (0, 1, 6, 0, 1, 0, 0, 0, 0, 0)
+    ...     nec.tl_card (1, 3, 2, 3, 300, length, 0, 0, 0, 0)
+    ...     nec.fr_card (0, 3, 140, 5)
+    ...     nec.rp_card (0, 7, 9, 0, 0, 0, 0, 0, 0, 30, 45, 0, 0)
+    >>> nec = PyNEC.nec_context ()
+    >>> ctx = Port_Context (Nec_Cache (1 << 20))
+    >>> cards (nec)
+    >>> cards (ctx)
+    >>> z1 = [nec.get_input_parameters (i).get_impedance () for i in range (3)]
+    >>> z2 = [ctx.get_input_parameters (i).get_impedance () for i in range (3)]
+    >>> print (np.allclose (z1, z2, rtol = 1e-3))
+    True
+    >>> g1 = nec.get_radiation_pattern (2).get_gain ()
+    >>> g2 = ctx.get_radiation_pattern (2).get_gain ()
+    >>> print (g2.shape, np.allclose (g1, g2, atol = 1e-2))
+    (7, 9) True
+
+    Changing the line does not compute the structure again:
+
+    >>> misses = ctx.cache.misses
+    >>> nec = PyNEC.nec_context ()
+    >>> ctx = Port_Context (ctx.cache)
+    >>> cards (nec, 0.6)
+    >>> cards (ctx, 0.6)
+    >>> z1 = [nec.get_input_parameters (i).get_impedance () for i in range (3)]
+    >>> z2 = [ctx.get_input_parameters (i).get_impedance () for i in range (3)]
+    >>> print (np.allclose (z1, z2, rtol = 1e-3), ctx.cache.misses - misses)
+    True 0
+
+    Two dipoles fed with a phase difference: Only the first phase
+    needs NEC, the currents, impedances and gains for other phases
+    are computed from those of the unit excitations:
+
+    >>> def array (nec, phi):
+    ...     geo = nec.get_geometry ()
+    ...     geo.wire (1, 11, 0.0, 0, -0.5, 0.0, 0, 0.5, 0.001, 1, 1)
+    ...     geo.wire (2, 11, 0.5, 0, -0.5, 0.5, 0, 0.5, 0.001, 1, 1)
+    ...     nec.geometry_complete (0)
+    ...     u = np.exp (-1j * phi)
+    ...     nec.ex_card (0, 1, 6, 0, 1.0, 0, 0, 0, 0, 0)
+    ...     nec.ex_card (0, 2, 6, 0, u.real, u.imag, 0, 0, 0, 0)
+    ...     nec.fr_card (0, 1, 140, 0)
+    ...     nec.rp_card (0, 1, 9, 0, 0, 0, 0, 90, 0, 0, 45, 0, 0)
+    >>> for phi in np.pi / 2, np.pi / 4:
+    ...     misses = ctx.cache.misses
+    ...     nec = PyNEC.nec_context ()
+    ...     ctx = Port_Context (ctx.cache)
+    ...     array (nec, phi)
+    ...     array (ctx, phi)
+    ...     z1 = nec.get_input_parameters (0).get_impedance ()
+    ...     z2 = ctx.get_input_parameters (0).get_impedance ()
+    ...     i1 = nec.get_structure_currents (0).get_current ()
+    ...     i2 = ctx.get_structure_currents (0).get_current ()
+    ...     g1 = nec.get_radiation_pattern (0).get_gain ()
+    ...     g2 = ctx.get_radiation_pattern (0).get_gain ()
+    ...     print ( len (z2), np.allclose (z1, z2, rtol = 1e-3)
+    ...           , np.allclose (i1, i2, rtol = 1e-3, atol = 1e-7)
+    ...           , np.allclose (g1, g2, atol = 1e-2)
+    ...           , ctx.cache.misses - misses
+    ...           )
+    2 True True True 1
+    2 True True True 0
+    """
+
+    # Load types applied at ports: series and parallel RLC, impedance
+    port_load_types = (0, 1, 4)
+
+    def __init__ (self, cache):
+        self.cache     = cache
+        self.geometry  = []
+        self.structure = []
+        self.loads     = []
+        self.sources   = []
+        self.networks  = []
+        self.freqs     = []
+        self.last      = None
+        self.inputs    = []
+        self.currents  = []
+        self.patterns  = []
+        # NEC context for computing the last structure
+        self.nec       = None
+        self.nec_key   = None
+    # end def __init__
+
+    def get_geometry (self):
+        return Recording_Geometry (self)
+    # end def get_geometry
+
+    def record (self, target, name, args):
+        """ Geometry card recorded by Recording_Geometry
+        """
+        self.geometry.append ((name, args))
+        self.last = name
+    # end def record
+
+    def group (self, kind, card):
+        """ Add card to the group of the given kind, a new group is
+            started when the last card was of another kind.
+        """
+        if self.last != kind:
+            setattr (self, kind, [])
+        getattr (self, kind).append (card)
+        self.last = kind
+    # end def group
+
+    def geometry_complete (self, gnd):
+        self.structure.append (('geometry_complete', (gnd,)))
+        self.last = 'geometry_complete'
+    # end def geometry_complete
+
+    def set_extended_thin_wire_kernel (self, flag):
+        self.structure.append (('set_extended_thin_wire_kernel', (flag,)))
+        self.last = 'set_extended_thin_wire_kernel'
+    # end def set_extended_thin_wire_kernel
+
+    def gn_card (self, *args):
+        self.structure.append (('gn_card', args))
+        self.last = 'gn_card'
+    # end def gn_card
+
+    def ld_card (self, *args):
+        self.group ('loads', args)
+    # end def ld_card
+
+    def ex_card (self, *args):
+        if args [0] != 0:
+            raise ValueError ("Port reduction supports only voltage sources")
+        self.group ('sources', args)
+    # end def ex_card
+
+    def nt_card (self, *args):
+        self.group ('networks', ('nt_card', args))
+    # end def nt_card
+
+    def tl_card (self, *args):
+        self.group ('networks', ('tl_card', args))
+    # end def tl_card
+
+    def fr_card (self, ifrq, nfrq, freq_mhz, del_freq):
+        """ Like NEC we add (or multiply by) the increment for each step
+        """
+        self.freqs = []
+        f = freq_mhz
+        for i in range (nfrq):
+            self.freqs.append (f)
+            if ifrq:
+                f *= del_freq
+            else:
+                f += del_freq
+        self.last = 'fr_card'
+    # end def fr_card
+
+    def xq_card (self, flag):
+        if flag:
+            raise ValueError ("Port reduction supports only XQ 0")
+        self.execute (None)
+        self.last = 'xq_card'
+    # end def xq_card
+
+    def rp_card (self, *args):
+        if args [0] or any (args [3:7]):
+            raise ValueError \
+                ("Port reduction supports only power gain patterns"
+                 " without averaging"
+                )
+        if self.last == 'rp_card':
+            # Only patterns for the last structure like in NEC
+            for f in self.freqs:
+                nport, inputs, e, power = self.solve (f, args)
+                self.patterns.append (self.pattern (nport, args, e, power))
+        else:
+            self.execute (args)
+        self.last = 'rp_card'
+    # end def rp_card
+
+    def get_input_parameters (self, index):
+        return self.inputs [index]
+    # end def get_input_parameters
+
+    def get_structure_currents (self, index):
+        return self.currents [index]
+    # end def get_structure_currents
+
+    def get_radiation_pattern (self, index):
+        return self.patterns [index]
+    # end def get_radiation_pattern
+
+    def is_port_load (self, load):
+        ldtyp, tag, first, last = load [:4]
+        return ldtyp in self.port_load_types and tag > 0 and first == last > 0
+    # end def is_port_load
+
+    def ports (self):
+        """ Segments of sources, networks and lumped loads, in this order
+        """
+        ports = []
+        for ex in self.sources:
+            ports.append (ex [1:3])
+        for name, nw in self.networks:
+            ports.extend ((nw [0:2], nw [2:4]))
+        for ld in self.loads:
+            if self.is_port_load (ld):
+                ports.append (ld [1:3])
+        return list (dict.fromkeys (tuple (p) for p in ports))
+    # end def ports
+
+    def key (self, f, ports, fixed):
+        h = hashlib.sha1 ()
+        for name, args in self.geometry + self.structure + fixed:
+            h.update \
+                ( ('%s %s\n' % (name, Recording_Context.canonical (args)))
+                  .encode ()
+                )
+        h.update (('port %.10g %r' % (f, ports)).encode ())
+        return h.hexdigest ()
+    # end def key
+
+    def context (self, key, f, fixed):
+        """ NEC context with the structure for key at frequency f
+        """
+        if self.nec_key != key:
+            self.nec     = nec = PyNEC.nec_context ()
+            self.nec_key = key
+            self.nec_ip  = self.nec_rp = 0
+            geo = nec.get_geometry ()
+            for name, args in self.geometry:
+                getattr (geo, name) (*args)
+            for name, args in self.structure + fixed:
+                getattr (nec, name) (*args)
+            nec.fr_card (0, 1, f, 0)
+        return self.nec
+    # end def context
+
+    def n_port (self, f, rp):
+        """ N_Port of the structure at frequency f (in MHz) with the far
+            fields for the radiation pattern rp (unless rp is None)
+        """
+        fixed = \
+            [ ('ld_card', ld) for ld in self.loads
+              if not self.is_port_load (ld)
+            ]
+        ports = self.ports ()
+        key   = self.key (f, ports, fixed)
+        nport = None
+        if key in self.cache:
+            nport = self.cache [key]
+        if nport is not None and (rp is None or rp in nport.fields):
+            self.cache.hits += 1
+            return nport
+        self.cache.misses += 1
+        nec = self.context (key, f, fixed)
+        currents = []
+        fields   = []
+        for j, (tag, seg) in enumerate (ports):
+            nec.ex_card (0, tag, seg, 0, 1.0, 0, 0, 0, 0, 0)
+            if rp is None:
+                nec.xq_card (0)
+            else:
+                nec.rp_card (*rp)
+                p  = nec.get_radiation_pattern (self.nec_rp)
+                g  = p.get_gain ()
+                nt, np_ = g.shape
+                fields.append \
+                    ( ( p.get_e_theta ().reshape (np_, nt).T
+                      , p.get_e_phi   ().reshape (np_, nt).T
+                      , g
+                      )
+                    )
+                self.nec_rp += 1
+            if nport is None:
+                sc = nec.get_structure_currents (self.nec_ip)
+                currents.append (sc.get_current ())
+            self.nec_ip += 1
+        if nport is None:
+            centers = np.array \
+                ([ sc.get_current_segment_center_x ()
+                 , sc.get_current_segment_center_y ()
+                 , sc.get_current_segment_center_z ()
+                ]).T
+            nport   = N_Port \
+                ( f * 1e6, ports
+                , np.array (sc.get_current_segment_tag ())
+                , np.array (sc.get_current_segment_number ())
+                , centers
+                , np.array (currents).T
+                )
+        if rp is not None:
+            e_theta, e_phi, gains = (np.array (x) for x in zip (*fields))
+            nport.add_fields (rp, e_theta, e_phi, gains)
+        # Set again, the size has changed with the fields
+        self.cache [key] = nport
+        return nport
+    # end def n_port
+
+    def network (self, nport, name, args):
+        """ Ports and admittance parameters of an NT or TL card
+        """
+        p1, p2 = tuple (args [0:2]), tuple (args [2:4])
+        if name == 'nt_card':
+            y11, y12, y22 = \
+                (complex (*args [k:k + 2]) for k in range (4, 10, 2))
+        else:
+            z0, length = args [4:6]
+            if not length:
+                # NEC returns the centers in wavelengths
+                c = nport.centers [nport.segments] * nec_c / nport.frequency
+                length = np.linalg.norm \
+                    (c [nport.index [p1]] - c [nport.index [p2]])
+            y11, y12, y22 = tl_params \
+                ( z0, length, nport.frequency
+                , complex (*args [6:8]), complex (*args [8:10])
+                )
+        return p1, p2, y11, y12, y22
+    # end def network
+
+    def solve (self, f, rp):
+        """ Solve the structure at frequency f (in MHz) with the current
+            sources, networks and loads. Returns the N_Port, the input
+            parameters, the excitation of the structure and the input
+            power.
+        """
+        nport   = self.n_port (f, rp)
+        sources = dict \
+            ((tuple (ex [1:3]), complex (*ex [4:6])) for ex in self.sources)
+        loads   = {}
+        for ld in self.loads:
+            if self.is_port_load (ld):
+                p = tuple (ld [1:3])
+                loads [p] = loads.get (p, 0) \
+                          + load_impedance (ld [0], *ld [4:7], f = f * 1e6)
+        networks = [self.network (nport, *nw) for nw in self.networks]
+        v, i, e  = nport.solve (sources, loads, networks)
+        s        = [nport.index [p] for p in sources]
+        power    = 0.5 * (v [s] * i [s].conj ()).real
+        inputs   = Computed_Result \
+            ( get_frequency = nport.frequency
+            , get_impedance = v [s] / i [s]
+            , get_voltage   = v [s]
+            , get_current   = i [s]
+            , get_power     = power
+            , get_tag       = np.array ([p [0] for p in sources])
+            , get_segment   = nport.numbers [nport.segments [s]]
+            )
+        return nport, inputs, e, power.sum ()
+    # end def solve
+
+    def pattern (self, nport, rp, e, power):
+        e_theta, e_phi, gain = nport.pattern (rp, e, power)
+        nt, np_ = gain.shape
+        return Computed_Result \
+            ( get_frequency    = nport.frequency
+            , get_gain         = gain
+            , get_e_theta      = e_theta.T.reshape (-1)
+            , get_e_phi        = e_phi.T.reshape (-1)
+            , get_ntheta       = nt
+            , get_nphi         = np_
+            , get_theta_start  = rp [7]
+            , get_phi_start    = rp [8]
+            , get_delta_theta  = rp [9]
+            , get_delta_phi    = rp [10]
+            , get_theta_angles = rp [7] + np.arange (nt) * rp [9]
+            , get_phi_angles   = rp [8] + np.arange (np_) * rp [10]
+            )
+    # end def pattern
+
+    def execute (self, rp):
+        """ Input parameters, structure currents (and the pattern rp
+            unless it is None) for all frequencies
+        """
+        for f in self.freqs:
+            nport, inputs, e, power = self.solve (f, rp)
+            self.inputs.append (inputs)
+            self.currents.append \
+                ( Computed_Result
+                    ( get_frequency                = nport.frequency
+                    , get_current                  = nport.excite (e)
+                    , get_current_segment_tag      = nport.tags
+                    , get_current_segment_number   = nport.numbers
+                    , get_current_segment_center_x = nport.centers [:, 0]
+                    , get_current_segment_center_y = nport.centers [:, 1]
+                    , get_current_segment_center_z = nport.centers [:, 2]
+                    )
+                )
+            if rp is not None:
+                self.patterns.append (self.pattern (nport, rp, e, power))
+    # end def execute
+
+# end class Port_Context
@@ -0,0 +1,277 @@
+#!/usr/bin/python3
+from __future__ import print_function
+
+import numpy as np
+
+class Pattern_Analyzer (object):
+    """ Vectorized analysis of radiation patterns computed by NEC.
+        The gains are given as an array indexed by theta and phi (this
+        is what get_gain of a NEC radiation pattern returns) or as a
+        stack of such arrays with the frequency as the first index.
+        For each pattern we find the maximum forward gain (restricted
+        by the force_horizontal, force_forward, and force_backward
+        options) and the maximum gain in a window of +- 30 degrees
+        around the opposite direction (with the same theta angle if
+        force_same_theta is given). Directions that have not been
+        computed are NaN and are ignored.
+
+        Note that the window wraps around at the end of the theta and
+        phi range. Like in the original loop-based implementation the
+        first and the last index of the range are the same direction,
+        so we wrap by one less than the number of angles.
+
+    >>> pa = Pattern_Analyzer (37, 73, 5, 5)
+    >>> gains = np.zeros ((2, 37, 73))
+    >>> gains [0, 10, 3] = 7.0
+    >>> gains [0, 12, 40] = 2.5
+    >>> gains [1, 18, 0] = 5.0
+    >>> gains [1, 18, 36] = 4.0
+    >>> gains [1, 18, 72] = 1.0
+    >>> g, r = pa.max_f_r_gain (gains)
+    >>> print (g, r)
+    [7. 5.] [2.5 4. ]
+    >>> pa = Pattern_Analyzer (37, 73, 5, 5, force_backward = True)
+    >>> g, r = pa.max_f_r_gain (gains)
+    >>> print (g, r)
+    [0. 4.] [0. 5.]
+    >>> pa = Pattern_Analyzer (37, 73, 5, 5, force_horizontal = True)
+    >>> print ("%.1f %.1f" % pa.max_f_r_gain (gains [1]))
+    5.0 4.0
+    """
+
+    def __init__ \
+        ( self
+        , theta_max
+        , phi_max
+        , theta_inc
+        , phi_inc
+        , force_horizontal = False
+        , force_forward    = False
+        , force_backward   = False
+        , force_same_theta = False
+        ):
+        self.theta_max = theta_max
+        self.phi_max   = phi_max
+        self.theta_inc = theta_inc
+        self.phi_inc   = phi_inc
+        self.shape     = (theta_max, phi_max)
+        # Mask of directions allowed for the forward gain
+        mask = np.ones (self.shape, dtype = bool)
+        if force_horizontal:
+            mask &= (np.arange (theta_max) == 90 / theta_inc) [:, None]
+        if force_forward or force_backward:
+            phi = np.zeros (phi_max, dtype = bool)
+            if force_forward:
+                phi [0] = True
+            if force_backward:
+                phi [phi_max // 2] = True
+            mask &= phi [None, :]
+        self.mask = mask
+        # Offsets of the rear window relative to the forward direction
+        t30 = 30 // theta_inc
+        p30 = 30 // phi_inc
+        self.theta_off = np.arange (-t30, t30 + 1)
+        if force_same_theta:
+            self.theta_off = np.zeros (1, dtype = int)
+        self.phi_off = np.arange (-p30, p30 + 1) - phi_max // 2
+    # end def __init__
+
+    @property
+    def reducible (self):
+        """ True if not all directions are allowed for the forward gain.
+            In that case a pattern can be computed in two steps with
+            fewer directions, see forward_regions and rear_regions.
+        """
+        return not self.mask.all ()
+    # end def reducible
+
+    @property
+    def forward_regions (self):
+        """ Rectangular regions covering the allowed forward directions
+        """
+        return self.regions (self.mask)
+    # end def forward_regions
+
+    def rear_regions (self, gains):
+        """ Rectangular regions covering the rear window of the given
+            (partially computed) pattern which are not yet computed.
+            Directions not yet computed are NaN in gains, the
+            forward directions must have been computed.
+        """
+        gains  = np.asarray (gains)
+        n1, n2 = self.forward_index (gains [np.newaxis])
+        need   = self.rear_window (n1 [0], n2 [0]) & np.isnan (gains)
+        return self.regions (need)
+    # end def rear_regions
+
+    def rear_window (self, n1, n2):
+        """ Boolean array of the directions in the rear window for the
+            forward direction with the given theta and phi index.
+        """
+        tidx = self.wrap (n1 + self.theta_off, self.theta_max)
+        pidx = self.wrap (n2 + self.phi_off,   self.phi_max)
+        win  = np.zeros (self.shape, dtype = bool)
+        win [np.ix_ (tidx, pidx)] = True
+        return win
+    # end def rear_window
+
+    def box (self, n1, n2, d):
+        """ Boolean array of the directions at most d indeces away from
+            the direction with the given theta and phi index. Theta is
+            clipped at the end of the range, phi wraps around.
+        """
+        off  = np.arange (-d, d + 1)
+        tidx = np.clip (n1 + off, 0, self.theta_max - 1)
+        pidx = self.wrap (n2 + off, self.phi_max)
+        box  = np.zeros (self.shape, dtype = bool)
+        box [np.ix_ (tidx, pidx)] = True
+        return box
+    # end def box
+
+    @staticmethod
+    def regions (need):
+        """ Cover the True entries of the 2-dimensional boolean array
+            need with rectangles, returns a list of tuples
+            (theta index, number of thetas, phi index, number of phis).
+            Consecutive rows with the same pattern are merged.
+
+        >>> need = np.zeros ((5, 7), dtype = bool)
+        >>> need [1:3, 0] = need [1:3, 4:] = need [4, 2] = True
+        >>> Pattern_Analyzer.regions (need)
+        [(1, 2, 0, 1), (1, 2, 4, 3), (4, 1, 2, 1)]
+        """
+        result = []
+        t = 0
+        while t < need.shape [0]:
+            row = need [t]
+            n   = 1
+            while t + n < need.shape [0] and (need [t + n] == row).all ():
+                n += 1
+            edges = np.diff (np.concatenate (([0], row.astype (int), [0])))
+            start = np.nonzero (edges > 0) [0]
+            end   = np.nonzero (edges < 0) [0]
+            for p, e in zip (start, end):
+                result.append ((t, n, int (p), int (e - p)))
+            t += n
+        return result
+    # end def regions
+
+    @staticmethod
+    def wrap (idx, n):
+        """ Wrap indeces around, the first and last index denote the
+            same direction.
+        """
+        idx = np.where (idx <  0, idx + (n - 1), idx)
+        idx = np.where (idx >= n, idx - (n - 1), idx)
+        return idx
+    # end def wrap
+
+    def forward_index (self, gains):
+        """ Theta and phi index of the maximum forward gain for each
+            pattern in the stack. For several equal maxima the first
+            one (in theta, phi order) is returned.
+        """
+        return self.max_index (gains, self.mask)
+    # end def forward_index
+
+    def max_index (self, gains, allowed):
+        """ Theta and phi index of the maximum gain in the allowed
+            directions (a boolean array) for each pattern in the stack.
+            Directions not computed (NaN) are ignored.
+        """
+        nf     = gains.shape [0]
+        mask   = allowed & ~np.isnan (gains)
+        masked = np.where (mask, gains, -np.inf).reshape (nf, -1)
+        return np.divmod (masked.argmax (axis = 1), self.phi_max)
+    # end def max_index
+
+    def max_f_r_gain (self, gains):
+        """ Maximum forward and rear gain.
+            Given a single pattern (a 2-dimensional array) this returns
+            a tuple of forward and rear gain. For a stack of patterns
+            (3-dimensional with frequency as the first index) the
+            result is a tuple of two arrays with one entry per
+            frequency.
+        """
+        gains  = np.asarray (gains)
+        single = gains.ndim == 2
+        if single:
+            gains = gains [np.newaxis]
+        assert gains.shape [1:] == self.shape
+        nf     = gains.shape [0]
+        fidx   = np.arange (nf)
+        n1, n2 = self.forward_index (gains)
+        gmax   = gains [fidx, n1, n2]
+        tidx   = self.wrap (n1 [:, None] + self.theta_off, self.theta_max)
+        pidx   = self.wrap (n2 [:, None] + self.phi_off,   self.phi_max)
+        rear   = gains \
+            [fidx [:, None, None], tidx [:, :, None], pidx [:, None, :]]
+        rmax   = np.nanmax (rear.reshape (nf, -1), axis = 1)
+        if single:
+            return gmax [0], rmax [0]
+        return gmax, rmax
+    # end def max_f_r_gain
+
+# end class Pattern_Analyzer
+
+class Radiation_Pattern (object):
+    """ A radiation pattern assembled from several partial patterns
+        computed by NEC on the same grid. Directions not computed are
+        NaN. This implements the methods of a NEC radiation pattern
+        used by Antenna_Model.
+
+    >>> rp = Radiation_Pattern (3, 5, 90, 90)
+    >>> class Partial (object):
+    ...     def get_frequency (self):
+    ...         return 435e6
+    ...     def get_gain (self):
+    ...         return np.array ([[1.0, 2.0]])
+    >>> rp.add (Partial (), 1, 3)
+    >>> rp.get_frequency ()
+    435000000.0
+    >>> print (rp.get_gain ())
+    [[nan nan nan nan nan]
+     [nan nan nan  1.  2.]
+     [nan nan nan nan nan]]
+    >>> print (rp.get_phi_angles ())
+    [  0.  90. 180. 270. 360.]
+    """
+
+    def __init__ (self, theta_max, phi_max, theta_inc, phi_inc):
+        self.theta_max = theta_max
+        self.phi_max   = phi_max
+        self.theta_inc = theta_inc
+        self.phi_inc   = phi_inc
+        self.gains     = np.full ((theta_max, phi_max), np.nan)
+        self.frequency = None
+    # end def __init__
+
+    def add (self, pattern, theta_idx, phi_idx, step = 1):
+        """ Add a partial pattern computed with the grid starting at the
+            given theta and phi index. The partial pattern may use a
+            multiple (step) of our angle increments.
+        """
+        g       = pattern.get_gain ()
+        t, p    = theta_idx, phi_idx
+        nt, np_ = g.shape [0] * step, g.shape [1] * step
+        self.gains [t:t + nt:step, p:p + np_:step] = g
+        self.frequency = pattern.get_frequency ()
+    # end def add
+
+    def get_frequency (self):
+        return self.frequency
+    # end def get_frequency
+
+    def get_gain (self):
+        return self.gains
+    # end def get_gain
+
+    def get_phi_angles (self):
+        return np.arange (self.phi_max) * float (self.phi_inc)
+    # end def get_phi_angles
+
+    def get_theta_angles (self):
+        return np.arange (self.theta_max) * float (self.theta_inc)
+    # end def get_theta_angles
+
+# end class Radiation_Pattern
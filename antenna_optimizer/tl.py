@@ -1,11 +1,54 @@
 #!/usr/bin/python3
 from __future__ import print_function
 
+import numpy as np
+from rsclib.capacitance import c
 from .antenna_model import Antenna_Model, Antenna_Optimizer, Excitation
-from .antenna_model import Arg_Handler, antenna_actions
+from .antenna_model import Arg_Handler, antenna_actions, Nec_File
 from .coaxmodel     import coax_models
+from .cache         import LRU_Cache
+from .network       import Network, Line, Stub
+
+# Admittance parameters of cable sections for a frequency sweep, keyed
+# by cable, length, termination and frequencies, see admittance_table.
+admittance_tables = LRU_Cache (16 * 1024 * 1024)
+
+def admittance_table (cable, length, z_l, frequencies):
+    """ Admittance parameters (y11, y12, y22) of a cable section with
+        the given length and termination z_l for all frequencies (a
+        tuple, in MHz). The result is an array indexed by parameter
+        and frequency index. Models with the same section (e.g. several
+        individuals of an optimization with the same stub length)
+        share the table.
+    """
+    key = (cable, length, z_l, frequencies)
+    if key not in admittance_tables:
+        admittance_tables [key] = cable.y_params \
+            (np.array (frequencies) * 1e6, length, z_l)
+    return admittance_tables [key]
+# end def admittance_table
 
 class Transmission_Line_Match (Antenna_Model):
+    """ Matching of a load by a stub. With a cable model the lines are
+        NT cards computed for each frequency, with mbpe these are also
+        needed for frequencies that are not in the sweep:
+
+    >>> kw = dict \\
+    ...     ( stub_dist    = 1.4344915265
+    ...     , stub_len     = 0.1753632447
+    ...     , f_mhz        = 28.85
+    ...     , z_load       = 50-500j
+    ...     , coaxmodel    = coax_models ['belden_8295']
+    ...     , frq_step_max = 21
+    ...     )
+    >>> fit = Transmission_Line_Match (mbpe = True, **kw)
+    >>> nec = Transmission_Line_Match (**kw)
+    >>> nec.compute_impedance ()
+    >>> z_fit = fit.impedance_sweep (0) [1]
+    >>> z_nec = nec.impedance_sweep (0) [1]
+    >>> print (np.abs (z_fit / z_nec - 1).max () < 1e-6)
+    True
+    """
     wire_radius = 2e-3
     wire_len    = 0.005
     # Use wire_len for transmission lines: Since we're specifying the
@@ -177,14 +220,50 @@ class Transmission_Line_Match (Antenna_Model):
         self.ex = Excitation (self.tag, 1)
     # end def geometry
 
-    def handle_coaxmodel (self, nec, f):
+    def admittances (self):
+        """ Admittance tables of the line to the load and of the stub
+            for the frequencies of the current sweep (which differs for
+            NEC output, see handle_frequency), and the index of each
+            frequency into the tables. The frequencies are computed
+            like in _compute so that they can be found in the index.
+        """
+        frequencies = tuple \
+            ( lo + i * inc
+              for (lo, hi), inc in zip (self.frq_ranges, self.frq_inc)
+              for i in range (self.frq_max_idx)
+            )
+        if self.nt_tables is None or self.nt_tables [0] != frequencies:
+            index = dict ((f, i) for i, f in enumerate (frequencies))
+            self.nt_tables = \
+                (frequencies, index) + self.section_tables (frequencies)
+        return self.nt_tables [1:]
+    # end def admittances
+
+    def section_tables (self, frequencies):
+        """ Admittance tables of the line to the load and of the stub
+            for the given frequencies (a tuple, in MHz)
+        """
         z_coax = 0.0
         if self.is_open:
             # We *can* model an open circuit in coaxmodel
             z_coax = None
-        y11 = self.coaxmodel.y11 (f * 1e6, self.stub_dist)
-        y12 = self.coaxmodel.y12 (f * 1e6, self.stub_dist)
-        y22 = self.coaxmodel.y22 (f * 1e6, self.stub_dist, self.z_load)
+        return \
+            ( admittance_table
+                (self.coaxmodel, self.stub_dist, self.z_load, frequencies)
+            , admittance_table
+                (self.coaxmodel, self.stub_len, z_coax, frequencies)
+            )
+    # end def section_tables
+
+    def handle_coaxmodel (self, nec, f):
+        index, feed, stub = self.admittances ()
+        if f in index:
+            idx = index [f]
+        else:
+            # Frequencies not in the sweep, e.g. the samples of mbpe
+            feed, stub = self.section_tables ((f,))
+            idx = 0
+        y11, y12, y22 = feed [:, idx]
         nec.nt_card \
             ( self.stub_point_tag, 1
             , self.load_wire_tag,  1
@@ -192,9 +271,7 @@ class Transmission_Line_Match (Antenna_Model):
             , y12.real, y12.imag
             , y22.real, y22.imag
             )
-        y11 = self.coaxmodel.y11 (f * 1e6, self.stub_len)
-        y12 = self.coaxmodel.y12 (f * 1e6, self.stub_len)
-        y22 = self.coaxmodel.y22 (f * 1e6, self.stub_len, z_coax)
+        y11, y12, y22 = stub [:, idx]
         nec.nt_card \
             ( self.stub_start_tag, 1
             , self.stub_end_tag,   1
@@ -223,6 +300,7 @@ class Transmission_Line_Match (Antenna_Model):
             # We *can* model an open circuit in coaxmodel
             z_coax = None
         if self.coaxmodel:
+            self.nt_tables = None
             self.register_frequency_callback (self.handle_coaxmodel)
         else:
             y_load = 1 / self.z_load
@@ -253,8 +331,225 @@ class Transmission_Line_Match (Antenna_Model):
 
 # end class Transmission_Line_Match
 
+class Transmission_Line_Circuit (Transmission_Line_Match):
+    """ Analytic evaluation of Transmission_Line_Match: The model is
+        a network of transmission lines feeding z_load, so the input
+        impedance can be computed in closed form for all frequencies
+        at once without NEC. The line from the load to the stub point
+        and the stub are modelled with the coaxmodel (if any) or as
+        lossless lines with impedance z0, the stub is in parallel or in
+        series (is_series) to the line, and the feed line is a lossless
+        line like the TL card used for it in NEC. The small wires used
+        for the NEC model are ignored.
+        The circuit doesn't radiate, the gains are -inf. The NEC output
+        (as_nec) is the same as for Transmission_Line_Match (with the
+        analytic results in the comment), so the results can be
+        verified with NEC, see also bench/bench_tl.py.
+    """
+
+    def rebind (self, nec = None):
+        """ Compute the input impedances for all frequencies of all
+            frequency ranges. The nec context is not used.
+        """
+        self.tl_by_frq   = None
+        self.nec         = None
+        self.rp          = {}
+        self.rp_avg_gain = {}
+        self.handle_frequency ()
+        self.frqs = []
+        self.z_in = []
+        for n, (lo, hi) in enumerate (self.frq_ranges):
+            # Like _compute to get the same frequencies as NEC
+            f = lo + np.arange (self.frq_max_idx) * self.frq_inc [n]
+            self.frqs.append (f)
+            self.z_in.append (self.input_impedance (f * 1e6))
+    # end def rebind
+
+    def stub (self, length):
+        return Stub \
+            ( length, self.coaxmodel, self.z0
+            , is_open   = self.is_open
+            , is_series = self.is_series
+            )
+    # end def stub
+
+    def network (self):
+        """ The circuit from the feed point to the load (excluding
+            the load) as a two-port network
+        """
+        return Network \
+            ([ Line (self.feed_len, z0 = self.z0)
+             , self.stub (self.stub_len)
+             , Line (self.stub_dist, self.coaxmodel, self.z0)
+            ])
+    # end def network
+
+    def input_impedance (self, f):
+        """ Input impedance of the circuit for frequency f (in Hz, may
+            be an array)
+        """
+        return self.network ().input_impedance (f, self.z_load)
+    # end def input_impedance
+
+    def _compute (self, nec = None, avgain = False, impedance_only = False):
+        """ Results are already computed by rebind, we only emit
+            cards into a given nec context (e.g. for as_nec).
+        """
+        if nec is not None:
+            self.__super._compute (nec, avgain, impedance_only)
+    # end def _compute
+
+    def compute (self, frq_step = None, avgain = False):
+        pass
+    # end def compute
+
+    def frequencies (self, frq_idx):
+        return self.frqs [frq_idx] * 1e6
+    # end def frequencies
+
+    def impedances (self, frq_idx, frq_steps):
+        return self.z_in [frq_idx][list (frq_steps)]
+    # end def impedances
+
+    def impedance_sweep (self, frq_idx):
+        return self.frequencies (frq_idx), self.z_in [frq_idx]
+    # end def impedance_sweep
+
+    def max_f_r_gain (self, frq = 0, frq_step = None):
+        return -np.inf, -np.inf
+    # end def max_f_r_gain
+
+    def max_f_r_gains (self, frq = 0, frq_steps = None):
+        if frq_steps is None:
+            frq_steps = self.frq_step_range ()
+        n = len (frq_steps)
+        return np.full (n, -np.inf), np.full (n, -np.inf)
+    # end def max_f_r_gains
+
+    def show_gains (self, frq_idx = 0, prefix = ''):
+        r = []
+        step = self.frq_step_max // 2
+        r.append ('FRQ Range: %.2f-%.2f' % self.frq_ranges [frq_idx])
+        for frqstep in self.frq_step_range (step):
+            z = self.z_in [frq_idx][frqstep]
+            r.append \
+                ( "%sFRQ: %3.2f Z: %.2f%+.2fj"
+                % (prefix, self.frqs [frq_idx][frqstep], z.real, z.imag)
+                )
+        vswrs = self.vswr_array (frq_idx, self.frq_step_range (step))
+        r.append ("SWR: %1.2f %1.2f %1.2f" % tuple (vswrs))
+        return r
+    # end def show_gains
+
+# end class Transmission_Line_Circuit
+
+class Stub_Network_Match (Transmission_Line_Circuit):
+    """ Matching network with several stubs and line sections, e.g.,
+        a double-stub match or a quarter-wave transformer. The network
+        is given as a list of elements starting at the load, each
+        element has a length in lengths:
+        'line' is a section of the cable (or a lossless line with z0),
+        'line:Z' is a lossless line section with impedance Z (e.g. a
+        transformer), 'stub' is a stub made from the cable (open or
+        short, in parallel or in series as given by is_open and
+        is_series). As for Transmission_Line_Circuit a lossless feed
+        line connects the network to the source.
+        This is always computed analytically, there is no NEC model
+        for the network.
+
+    >>> m = Stub_Network_Match \\
+    ...     ( ['line:70.71'], [c / 4 / 3.5e6], f_mhz = 3.5, z_load = 100.0
+    ...     , frq_step_max = 3
+    ...     )
+    >>> print (' '.join ('%.2f' % v for v in m.vswr_array (0)))
+    1.00 1.00 1.00
+    >>> m.cmdline ()
+    '-n line:70.71 --lengths 21.4137470000 -f 3.50 -z 100.00+0.00j'
+    """
+
+    def __init__ (self, elements, lengths, **kw):
+        if len (elements) != len (lengths):
+            raise ValueError ("Need a length for each network element")
+        for e in elements:
+            if e not in ('line', 'stub') and not e.startswith ('line:'):
+                raise ValueError ("Invalid network element: %s" % e)
+        self.elements = elements
+        self.lengths  = lengths
+        self.__super.__init__ (stub_dist = None, stub_len = None, **kw)
+    # end def __init__
+
+    def cmdline (self):
+        r = []
+        if self.is_open:
+            r.append ('--is-open')
+        if self.is_series:
+            r.append ('--is-series')
+        if self.coaxmodel:
+            r.append ('-c %s' % self.coaxmodel.name)
+        r.append ('-n %s' % ','.join (self.elements))
+        r.append \
+            ('--lengths %s' % ','.join ('%1.10f' % l for l in self.lengths))
+        r.append ('-f %1.2f' % self.f_mhz)
+        r.append ('-z %.2f%+.2fj' % (self.z_load.real, self.z_load.imag))
+        return ' '.join (r)
+    # end def cmdline
+
+    def network (self):
+        blocks = [Line (self.feed_len, z0 = self.z0)]
+        for e, l in reversed (list (zip (self.elements, self.lengths))):
+            if e == 'stub':
+                blocks.append (self.stub (l))
+            elif e == 'line':
+                blocks.append (Line (l, self.coaxmodel, self.z0))
+            else:
+                blocks.append (Line (l, z0 = float (e.split (':') [1])))
+        return Network (blocks)
+    # end def network
+
+    def as_nec (self, compute = True):
+        """ Only the comments with the analytic results, there is no
+            NEC model for the network.
+        """
+        c = self.cmdline ().split ('\n')
+        if compute:
+            for frq_idx in range (len (self.frq_ranges)):
+                c.extend (self.show_gains (frq_idx))
+        return repr (Nec_File (c))
+    # end def as_nec
+
+# end class Stub_Network_Match
+
+# Evaluation engines of the transmission line model
+engines = dict \
+    ( nec      = Transmission_Line_Match
+    , analytic = Transmission_Line_Circuit
+    )
+
 class Transmission_Line_Optimizer (Antenna_Optimizer):
+    """ Optimize the position and the length of the matching stub.
+        The stub length may reach 0: A short-circuited stub (or an
+        open stub in series) then shorts (or opens) the line, the
+        VSWR is infinite and the evaluation is 0. An open stub of
+        length 0 in parallel has no effect.
+
+    >>> from .antenna_model import Antenna_Phenotype
+    >>> def evaluate (**kw):
+    ...     o = Transmission_Line_Optimizer (engine = 'analytic', **kw)
+    ...     kw.update (o.antenna_args)
+    ...     m = o.ant_cls (stub_dist = 0.2, stub_len = 0, **kw)
+    ...     return m.vswr (0, 1), 1.0 / Antenna_Phenotype (o, m, 0).swr_med
+    >>> print ("%.2f %.2f" % evaluate ())
+    inf 0.00
+    >>> print ("%.2f %.2f" % evaluate (is_open = True))
+    3.00 0.33
+    >>> print ("%.2f %.2f" % evaluate (is_open = True, is_series = True))
+    inf 0.00
+    """
+
     ant_cls = tl = Transmission_Line_Match
+    engines = engines
+    cache_attributes = \
+        ('is_open', 'is_series', 'f_mhz', 'coaxmodel', 'z_load')
 
     def __init__ \
         ( self
@@ -264,8 +559,11 @@ class Transmission_Line_Optimizer (Antenna_Optimizer):
         , f_mhz        = None
         , coaxmodel    = None
         , z_load       = 150.0
+        , engine       = 'nec'
         , **kw
         ):
+        self.ant_cls      = self.engines [engine]
+        self.engine       = engine
         self.is_open      = is_open
         self.is_series    = is_series
         self.add_lambda_4 = add_lambda_4
@@ -278,12 +576,20 @@ class Transmission_Line_Optimizer (Antenna_Optimizer):
         self.lambda_4 = c / 1e6 / self.f_mhz / 4
         if self.coaxmodel:
             self.lambda_4 = self.coaxmodel.lamda (self.f_mhz * 1e6) / 4
-        self.minmax = [(0, self.lambda_4), (0, 2 * self.lambda_4)]
-        if self.add_lambda_4:
-            self.minmax [0] = (self.lambda_4, 2 * self.lambda_4)
+        self.minmax = self.parameter_ranges ()
         self.__super.__init__ (**kw)
     # end def __init__
 
+    def parameter_ranges (self):
+        """ Stub distance up to lambda/4 (or from lambda/4 to lambda/2
+            with add_lambda_4) and stub length up to lambda/2
+        """
+        minmax = [(0, self.lambda_4), (0, 2 * self.lambda_4)]
+        if self.add_lambda_4:
+            minmax [0] = (self.lambda_4, 2 * self.lambda_4)
+        return minmax
+    # end def parameter_ranges
+
     def compute_antenna (self, p, pop):
         stub_dist = self.get_parameter (p, pop, 0)
         stub_len  = self.get_parameter (p, pop, 1)
@@ -318,6 +624,49 @@ class Transmission_Line_Optimizer (Antenna_Optimizer):
 
 # end class Transmission_Line_Optimizer
 
+class Stub_Network_Optimizer (Transmission_Line_Optimizer):
+    """ Optimize the lengths of the elements of a Stub_Network_Match
+        (always computed analytically). Each length may vary up to
+        lambda/2 on the given line.
+    """
+    engines = dict (analytic = Stub_Network_Match)
+    cache_attributes = \
+        Transmission_Line_Optimizer.cache_attributes + ('elements',)
+
+    def __init__ (self, elements, **kw):
+        self.elements = elements
+        self.__super.__init__ (engine = 'analytic', **kw)
+    # end def __init__
+
+    def parameter_ranges (self):
+        minmax = []
+        for e in self.elements:
+            if e.startswith ('line:'):
+                # Lossless line with velocity factor 1
+                lambda_2 = c / 1e6 / self.f_mhz / 2
+            else:
+                lambda_2 = 2 * self.lambda_4
+            minmax.append ((0, lambda_2))
+        return minmax
+    # end def parameter_ranges
+
+    def compute_antenna (self, p, pop):
+        return self.ant_cls \
+            ( elements   = self.elements
+            , lengths    = [ self.get_parameter (p, pop, i)
+                             for i in range (len (self.elements))
+                           ]
+            , is_open    = self.is_open
+            , is_series  = self.is_series
+            , f_mhz      = self.f_mhz
+            , coaxmodel  = self.coaxmodel
+            , z_load     = self.z_load
+            , **self.antenna_args
+            )
+    # end def compute_antenna
+
+# end class Stub_Network_Optimizer
+
 def main ():
     models = ['lossless'] + list (coax_models)
     cmd = Arg_Handler \
@@ -368,6 +717,27 @@ def main ():
         , help    = "Use stub in series with transmission line"
         , action  = "store_true"
         )
+    cmd.add_argument \
+        ( '--lengths'
+        , type    = lambda s: [float (x) for x in s.split (',')]
+        , help    = "Comma-separated lengths of the elements of --network"
+        )
+    cmd.add_argument \
+        ( '-n', '--network'
+        , type    = lambda s: s.split (',')
+        , help    = "Comma-separated elements of a matching network from"
+                    " the load: line (section of the cable), line:Z"
+                    " (lossless line with impedance Z), stub, the"
+                    " network is computed analytically"
+        )
+    cmd.add_argument \
+        ( '--engine'
+        , help    = "Evaluation engine, one of %s, the analytic engine"
+                    " computes the circuit in closed form without NEC,"
+                    " default=%%(default)s" % ', '.join (engines)
+        , choices = list (engines)
+        , default = 'nec'
+        )
     cmd.add_argument \
         ( '--add-lambda-4'
         , help    = "Add lambda/4 to the matching point (optimizer)"
@@ -386,7 +756,18 @@ def main ():
         coaxmodel = None
     else:
         coaxmodel = coax_models [args.coaxmodel]
-    if args.action == 'optimize':
+    if args.action == 'optimize' and args.network:
+        tlo = Stub_Network_Optimizer \
+            ( elements     = args.network
+            , is_open      = args.is_open
+            , is_series    = args.is_series
+            , f_mhz        = args.f_mhz
+            , coaxmodel    = coaxmodel
+            , z_load       = args.z_load
+            , ** cmd.default_optimization_args
+            )
+        tlo.run ()
+    elif args.action == 'optimize':
         tlo = Transmission_Line_Optimizer \
             ( is_open      = args.is_open
             , is_series    = args.is_series
@@ -394,6 +775,7 @@ def main ():
             , f_mhz        = args.f_mhz
             , coaxmodel    = coaxmodel
             , z_load       = args.z_load
+            , engine       = args.engine
             , ** cmd.default_optimization_args
             )
         tlo.run ()
@@ -412,7 +794,12 @@ def main ():
             d ['frqstart'] = args.frqstart_mhz
         if args.frqend_mhz:
             d ['frqend']   = args.frqend_mhz
-        tl = Transmission_Line_Match (** d)
+        if args.network:
+            del d ['stub_dist'], d ['stub_len']
+            tl = Stub_Network_Match \
+                (elements = args.network, lengths = args.lengths, ** d)
+        else:
+            tl = engines [args.engine] (** d)
         antenna_actions (cmd, args, tl)
 # end def main
 
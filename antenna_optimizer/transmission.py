@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 from __future__ import print_function
-from math       import pi, sqrt, acosh, sin, cos, log
+import numpy as np
+from numpy      import pi, sqrt, arccosh, cosh, sin, cos, log, exp
 
 c0        = 2.99792458e8
 mu0       = 4e-7 * pi
@@ -8,6 +9,9 @@ eps0      = 1 / (mu0 * c0 ** 2)
 # alternatively: z0 = mu0 * c0
 z0        = sqrt (mu0 / eps0)
 eps_r_air = 1.00054
+# Fit for the impedance of two square conductors, see
+# transmission_line_z_square
+square_constants = (0.539774145266, 0.404050444546, 0.009504588299)
 
 def transmission_line_z (wire_dia, wire_dist, eps_r = eps_r_air):
     """ Impedance of transmission line
@@ -15,24 +19,44 @@ def transmission_line_z (wire_dia, wire_dist, eps_r = eps_r_air):
         Default eps_r is for air.
         The wire_dist is the distance (center to center) of the two
         wires. Both need to have the same dimension (e.g. mm or cm or in).
+        All parameters may be arrays.
     """
-    zc   = z0 / (pi * sqrt (eps_r)) * acosh (wire_dist / wire_dia)
+    zc   = z0 / (pi * sqrt (eps_r)) * arccosh (wire_dist / wire_dia)
     return zc
 # end def transmission_line_z
 
+def transmission_line_dist (wire_dia, z, eps_r = eps_r_air):
+    """ Inverse of transmission_line_z: The distance of the wires for
+        the given impedance z.
+    >>> print ("%.3f" % transmission_line_dist (10.0, 211.326))
+    30.000
+    >>> d = transmission_line_dist (2.0, np.array ([300.0, 450.0, 600.0]))
+    >>> print (np.allclose (transmission_line_z (2.0, d), [300, 450, 600]))
+    True
+    """
+    return wire_dia * cosh (z * pi * sqrt (eps_r) / z0)
+# end def transmission_line_dist
+
 def transmission_line_z_square (wire_dia, wire_dist):
     """ Impedance of transmission line with two square conductors
         https://www.owenduffy.net/calc/tstl.htm
         https://hamwaves.com/zc.square/en/
         For now no eps_r can be specified.
     """
-    a=0.539774145266
-    b=0.404050444546
-    c=0.009504588299
+    a, b, c = square_constants
     zc = log ((wire_dist / wire_dia - a) / b) / c
     return zc
 # end transmission_line_z_square
 
+def transmission_line_dist_square (wire_dia, z):
+    """ Inverse of transmission_line_z_square
+    >>> print ("%.3f" % transmission_line_dist_square (10.0, 190.063))
+    30.000
+    """
+    a, b, c = square_constants
+    return wire_dia * (a + b * exp (c * z))
+# end def transmission_line_dist_square
+
 class Z_Interpolation (object):
     """ Z-Interpolation by Hartwig Harm, DH2MIC
         http://dh2mic.darc.de/tlc/tlc.pdf
@@ -165,6 +189,22 @@ class Z_Interpolation (object):
     310.07
     >>> f (z_two_wire_line_square,     3.0, 10.0)
     287.18
+
+    All parameters may be arrays, the distance method is the inverse:
+    >>> z = z_rectangular (3.0, np.array ([10.0, 5.0]), 14.0)
+    >>> print (" ".join ("%6.2f" % x for x in z))
+    125.36  86.09
+    >>> for n in 'round', 'l_shaped', 'two_wire_line_square':
+    ...     zi = geometries [n]
+    ...     a  = zi.distance (zi.z_interpolation (3.0, 10.0, 12.0), 3.0, 12.0)
+    ...     print ("%.6f" % a)
+    10.000000
+    10.000000
+    10.000000
+    >>> a = geometries ['two_planes_unequal'].distance \\
+    ...     (np.array ([130.0, 140.0, 160.0, 200.0]), 3.0, 23.0)
+    >>> print (a)
+    [ 7.22663537  8.76389612 13.50182568         nan]
     """
 
     def __init__ (self, name, kmin = 2.0, kmax = 0, exp = 0, mult = 1.0):
@@ -173,7 +213,7 @@ class Z_Interpolation (object):
         self.kmax  = kmax
         if kmax == 0:
             self.k     = kmin
-            self.log2k = log (self.k) / log (2.0)
+            self.log2k = np.log2 (self.k)
         self.mult  = mult
         self.exp   = exp
     # end def __init__
@@ -244,13 +284,15 @@ class Z_Interpolation (object):
             )
         self.q = q
         self.k = 1.0 + m * q
-        self.log2k = log (self.k) / log (2.0)
+        self.log2k = np.log2 (self.k)
     # end def k_factor
 
     def z_interpolation (self, wire_dia, a, b = 0, eps_r = eps_r_air):
+        """ Impedance for the given wire diameter and distances a and b,
+            all parameters may be arrays.
+        """
         if self.kmax:
-            if a > b:
-                a, b = b, a
+            a, b = np.minimum (a, b), np.maximum (a, b)
             self.k_factor (a, b)
         factor = 2.0 * a / wire_dia
         zc = \
@@ -261,9 +303,78 @@ class Z_Interpolation (object):
             )
         return zc * self.mult
     # end def z_interpolation
-    
+
+    def distance \
+        (self, z, wire_dia, b = 0, eps_r = eps_r_air, maxiter = 60):
+        """ Inverse of z_interpolation: The distance a for which the
+            impedance is z, the parameters may be arrays. For the
+            geometries with two distances the distance b is given and
+            we search the nearer distance a <= b, if the impedance
+            cannot be reached with a <= b the result is nan.
+            With F = 2a / wire_dia and x = z sqrt (eps_r) / (60 mult)
+            we have ln F <= x <= ln F + ln k, since the impedance is
+            monotonically increasing in F this brackets ln F for a
+            bisection, the width of the bracket is at most ln 2.
+        """
+        z, wire_dia, b = \
+            (np.asarray (v, dtype = float) for v in (z, wire_dia, b))
+        x  = z * sqrt (eps_r) / (60.0 * self.mult)
+        lo = np.maximum (x - log (max (self.kmin, self.kmax)), 0)
+        hi = np.maximum (x, 0)
+        if self.kmax:
+            hi = np.minimum (hi, log (2.0 * b / wire_dia))
+        for i in range (maxiter):
+            m  = (lo + hi) / 2
+            zm = self.z_interpolation \
+                (wire_dia, wire_dia * exp (m) / 2, b, eps_r)
+            lo = np.where (zm < z, m, lo)
+            hi = np.where (zm < z, hi, m)
+        a  = wire_dia * exp ((lo + hi) / 2) / 2
+        ok = z > 0
+        if self.kmax:
+            zb  = self.z_interpolation (wire_dia, b, b, eps_r)
+            ok &= z <= zb * (1 + 1e-12)
+        return np.where (ok, a, np.nan)
+    # end def distance
+
 # end class Z_Interpolation
 
+class Z_Table (object):
+    """ Lookup table for the inverse of an impedance function zfun of a
+        single distance a (e.g. of one of the z_* functions with a
+        fixed wire diameter) in the range amin to amax. The impedance
+        must be monotonically increasing with a. The table is computed
+        once, after that distance and impedance are cheap
+        interpolations for arrays of any size (nan outside the table).
+        Since the impedance is approximately proportional to log (a)
+        we interpolate log (a), n points give a relative error of
+        roughly (ln (amax / amin) / n) ** 2.
+    >>> t = Z_Table (lambda a: z_round (3.0, a), 1.6, 100.0)
+    >>> a = t.distance (np.array ([50.0, 75.0, 100.0, 1000.0]))
+    >>> print (a)
+    [3.4522404  5.23728148 7.94530918        nan]
+    >>> print (np.abs (z_round (3.0, a [:3]) - [50, 75, 100]).max () < 1e-3)
+    True
+    """
+
+    def __init__ (self, zfun, amin, amax, n = 1000):
+        self.log_a = np.linspace (log (amin), log (amax), n)
+        self.z     = zfun (exp (self.log_a))
+        assert (np.diff (self.z) > 0).all ()
+    # end def __init__
+
+    def distance (self, z):
+        return exp \
+            (np.interp (z, self.z, self.log_a, left = np.nan, right = np.nan))
+    # end def distance
+
+    def impedance (self, a):
+        return np.interp \
+            (log (a), self.log_a, self.z, left = np.nan, right = np.nan)
+    # end def impedance
+
+# end class Z_Table
+
 z_round                    = Z_Interpolation \
     ( "round wire in round outer conductor"
     , kmin = 1.0
@@ -318,6 +429,21 @@ z_two_wire_line_square     = Z_Interpolation \
     , kmin = 1.65, mult = 2.0
     ).z_interpolation
 
+# The geometries by name, the distance method of each geometry is the
+# inverse of the z_<name> function above.
+geometries = dict \
+    ( round                    = z_round.__self__
+    , rectangular              = z_rectangular.__self__
+    , square                   = z_square.__self__
+    , u_shaped                 = z_u_shaped.__self__
+    , l_shaped                 = z_l_shaped.__self__
+    , two_planes_equal         = z_two_planes_equal.__self__
+    , two_planes_unequal       = z_two_planes_unequal.__self__
+    , round_single_wire_plane  = z_round_single_wire_plane.__self__
+    , square_single_wire_plane = z_square_single_wire_plane.__self__
+    , two_wire_line_round      = z_two_wire_line_round.__self__
+    , two_wire_line_square     = z_two_wire_line_square.__self__
+    )
 
 def wire_L_from_Z (z, eps_r = eps_r_air):
     """ Compute L (per length) from Zo
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+""" Validate the adaptive pattern computation against the full grid.
+    For the final design of each test/*.data file (the same one used
+    by the necvrfy rule in test/Makefile) we compute the forward and
+    backward gain with the default 5 degree grid, with the adaptive
+    pattern and with a full grid with the resolution of the adaptive
+    pattern (1 degree by default). The adaptive result should match the
+    fine full grid at a fraction of the computed directions. It may be
+    slightly lower if the coarse grid misses the global maximum, e.g.,
+    for a bidirectional antenna with two nearly equal lobes.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import warnings
+from argparse import ArgumentParser
+from importlib import import_module
+
+import numpy as np
+
+# Test data file to module, see test/Makefile
+designs = \
+    { 'folded-bc'         : 'folded_bc'
+    , 'folded-multi'      : 'folded'
+    , 'folded-refl'       : 'folded_bigrefl'
+    , 'folded-refl-multi' : 'folded_bigrefl'
+    , 'folded3-multi'     : 'folded_3ele'
+    , 'hb9cv'             : 'hb9cv'
+    }
+
+def design_cmdline (filename):
+    """ The line after the last 'Title:' line of the data file
+    """
+    with open (filename) as f:
+        lines = f.read ().split ('\n')
+    for n in reversed (range (len (lines))):
+        if lines [n].startswith ('Title:'):
+            return lines [n + 1].split ()
+# end def design_cmdline
+
+def compute (module, argv):
+    """ Run main of module with the given arguments and the frgain
+        action, return the antenna, the gains and the time needed.
+    """
+    result = []
+    def capture (cmd, args, antenna):
+        result.append (antenna)
+    actions = module.antenna_actions
+    module.antenna_actions = capture
+    sys.argv = [module.__name__] + argv + ['frgain']
+    try:
+        module.main ()
+    finally:
+        module.antenna_actions = actions
+    antenna = result [0]
+    t = time.time ()
+    antenna.compute ()
+    gains = np.array \
+        ([ antenna.max_f_r_gain (n, i)
+           for n in range (len (antenna.frq_ranges))
+           for i in antenna.frq_step_range ()
+        ])
+    return antenna, gains, time.time () - t
+# end def compute
+
+def directions (antenna):
+    n = 0
+    for rp in antenna.rp.values ():
+        g  = rp.get_gain ()
+        n += np.count_nonzero (~np.isnan (g))
+    return n
+# end def directions
+
+def main (argv = sys.argv [1:]):
+    testdir = os.path.join (os.path.dirname (__file__), '..', 'test')
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( 'design'
+        , nargs   = '*'
+        , help    = "Designs to validate, default: %s" % ', '.join (designs)
+        )
+    cmd.add_argument \
+        ( '-d', '--directory'
+        , help    = "Directory with test data, default: %(default)s"
+        , default = testdir
+        )
+    cmd.add_argument \
+        ( '-t', '--tolerance'
+        , type    = float
+        , help    = "Maximum difference to fine grid in dB,"
+                    " default: %(default)s"
+        , default = 0.01
+        )
+    args = cmd.parse_args (argv)
+    warnings.simplefilter ('ignore')
+    ok = True
+    for name in args.design or designs:
+        module  = import_module ('antenna_optimizer.' + designs [name])
+        cmdline = design_cmdline \
+            (os.path.join (args.directory, name + '.data'))
+        a5, g5, t5 = compute (module, cmdline)
+        aa, ga, ta = compute (module, cmdline + ['--adaptive-pattern'])
+        # Full grid with the resolution of the adaptive pattern
+        cls  = a5.__class__
+        save = dict (cls.__dict__)
+        fine = cls.adaptive_inc
+        cls.theta_inc = cls.phi_inc = fine
+        try:
+            af, gf, tf = compute (module, cmdline)
+        finally:
+            for k in 'theta_inc', 'phi_inc':
+                delattr (cls, k)
+                if k in save:
+                    setattr (cls, k, save [k])
+        diff = np.abs (ga - gf).max ()
+        ok   = ok and diff <= args.tolerance
+        print ("%s: %s" % (name, ' '.join (cmdline)))
+        for label, a, g, t in \
+            ( ('grid %g deg' % a5.theta_inc, a5, g5, t5)
+            , ('adaptive',                   aa, ga, ta)
+            , ('grid %g deg' % fine,         af, gf, tf)
+            ):
+            print \
+                ( "  %-12s %7d directions %7.3f s"
+                  " fw: %s bw: %s"
+                % ( label, directions (a), t
+                  , ' '.join ('%.2f' % x for x in g [:, 0])
+                  , ' '.join ('%.2f' % x for x in g [:, 1])
+                  )
+                )
+        print ("  adaptive vs. fine grid max. difference: %g dB" % diff)
+    if not ok:
+        sys.exit (1)
+# end def main
+
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+""" Speed of the cable model for a frequency sweep.
+    For a sweep with the given number of frequencies we compute the
+    admittance parameters (as needed for the NT cards of a transmission
+    line in NEC) and the input impedance of a terminated cable once by
+    calling the methods of Manufacturer_Data_Cable for each frequency
+    and once by calling them with an array of all frequencies. Both must
+    yield the same result (up to rounding).
+"""
+from __future__ import print_function
+
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from antenna_optimizer.coaxmodel import coax_models
+
+def sweep (cable, f, l, z_l):
+    """ Admittance parameters and input impedance for all frequencies f
+        (a scalar or an array) of a cable with length l and load z_l.
+    """
+    return \
+        ( cable.y11 (f, l)
+        , cable.y12 (f, l)
+        , cable.y22 (f, l, z_l)
+        , cable.z_d (f, l, z_l)
+        )
+# end def sweep
+
+def best (fun, number):
+    """ Best time of number calls of fun, returns time and result
+    """
+    t_best = None
+    for n in range (number):
+        t = time.time ()
+        r = fun ()
+        t = time.time () - t
+        if t_best is None or t < t_best:
+            t_best = t
+    return t_best, r
+# end def best
+
+def main (argv = sys.argv [1:]):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( '-c', '--coaxmodel'
+        , help    = "Cable to use, default: %(default)s"
+        , default = 'belden_8295'
+        )
+    cmd.add_argument \
+        ( '-l', '--length'
+        , type    = float
+        , help    = "Cable length in m, default: %(default)s"
+        , default = 3.3
+        )
+    cmd.add_argument \
+        ( '-n', '--number'
+        , type    = int
+        , help    = "Number of repetitions, default: %(default)s"
+        , default = 5
+        )
+    cmd.add_argument \
+        ( '-s', '--steps'
+        , type    = int
+        , help    = "Number of frequencies in sweep, default: %(default)s"
+        , default = 1000
+        )
+    args  = cmd.parse_args (argv)
+    cable = coax_models [args.coaxmodel]
+    f     = np.linspace (1e6, 450e6, args.steps)
+    z_l   = 25 + 10j
+    # Fit the cable before timing
+    cable.loss (f [0])
+    ts, rs = best \
+        ( lambda: [np.array (x) for x in
+                   zip (*(sweep (cable, fs, args.length, z_l) for fs in f))
+                  ]
+        , args.number
+        )
+    tv, rv = best (lambda: sweep (cable, f, args.length, z_l), args.number)
+    diff   = max (np.abs (s - v).max () / np.abs (s).max ()
+                  for s, v in zip (rs, rv))
+    print ("%s, %d frequencies" % (cable.name, args.steps))
+    print ("  per frequency: %8.2f ms" % (ts * 1e3))
+    print ("  vectorized:    %8.2f ms" % (tv * 1e3))
+    print ("  speed-up:      %8.1f" % (ts / tv))
+    print ("  max. relative difference: %g" % diff)
+# end def main
+
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+""" Per-evaluation setup overhead of an antenna model.
+    We compare the time for allocating a NEC context, for constructing
+    a new antenna model (which allocates a context and emits all
+    geometry and parameter cards), for re-binding an existing model to
+    a new context, and for a complete evaluation as done by the
+    optimizer (computation plus VSWR and gain analysis).
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+import warnings
+from argparse import ArgumentParser
+
+import PyNEC
+from antenna_optimizer.folded import Folded_Dipole
+from antenna_optimizer.hb9cv  import HB9CV
+
+models = dict \
+    ( folded = lambda: Folded_Dipole
+        ( dipole_radius = 0.0364
+        , refl_dist     = 0.0444
+        , reflector     = 0.1704
+        , lambda_4      = 0.1075
+        , frq_step_max  = 3
+        )
+    , hb9cv  = lambda: HB9CV (frq_step_max = 3)
+    )
+
+def evaluate (antenna):
+    antenna.compute ()
+    for n in range (len (antenna.frq_ranges)):
+        antenna.max_f_r_gains (n)
+        antenna.vswr_array (n)
+# end def evaluate
+
+def per_call (fun, number):
+    return timeit.timeit (fun, number = number) / number
+# end def per_call
+
+def main (argv = sys.argv [1:]):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( 'model'
+        , nargs   = '*'
+        , help    = "Models to benchmark, default: %s" % ', '.join (models)
+        )
+    cmd.add_argument \
+        ( '-n', '--number'
+        , type    = int
+        , help    = "Number of repetitions, default: %(default)s"
+        , default = 20
+        )
+    args = cmd.parse_args (argv)
+    warnings.simplefilter ('ignore')
+    n = args.number
+    for name in args.model or models:
+        make    = models [name]
+        antenna = make ()
+        t_ctx   = per_call (PyNEC.nec_context, 100 * n)
+        t_new   = per_call (make, n)
+        t_bind  = per_call (antenna.rebind, n)
+        t_eval  = per_call (lambda: evaluate (make ()), n)
+        print ("%s:" % name)
+        print ("  context allocation:  %10.3f ms" % (t_ctx  * 1e3))
+        print ("  model construction:  %10.3f ms" % (t_new  * 1e3))
+        print ("  rebind to context:   %10.3f ms" % (t_bind * 1e3))
+        print ("  complete evaluation: %10.3f ms" % (t_eval * 1e3))
+        print \
+            ( "  setup overhead: %.3f%% (construction) %.3f%% (rebind)"
+            % (100 * t_new / t_eval, 100 * t_bind / t_eval)
+            )
+# end def main
+
+if __name__ == '__main__':
+    main ()
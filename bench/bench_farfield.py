@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+""" Radiation patterns computed from the segment currents (far_field)
+    compared to those computed by NEC: We print the largest gain
+    difference in dB within 3 dB and within 30 dB of the maximum gain,
+    the largest difference of forward and backward gain, and the time
+    of a complete evaluation with and without far_field. Models whose
+    geometry can't be replayed (e.g. logper) fall back to NEC patterns
+    and must show no difference.
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+import warnings
+from argparse import ArgumentParser
+
+import numpy as np
+from antenna_optimizer.folded   import Folded_Dipole
+from antenna_optimizer.hb9cv    import HB9CV
+from antenna_optimizer.logper   import Logperiodic
+from antenna_optimizer.hf_fuchs import Fuchs_Antenna
+
+models = dict \
+    ( folded = Folded_Dipole
+    , hb9cv  = HB9CV
+    , logper = Logperiodic
+    , fuchs  = Fuchs_Antenna
+    )
+
+def evaluate (cls, far_field):
+    antenna = cls (far_field = far_field, frq_step_max = 3)
+    antenna.compute ()
+    steps = antenna.frq_step_max
+    gains = []
+    fr    = []
+    for frq in range (len (antenna.frq_ranges)):
+        for step in range (steps):
+            gains.append (antenna.get_pattern (frq * steps + step).get_gain ())
+            fr.append    (antenna.max_f_r_gain (frq, step))
+    return np.array (gains), np.array (fr)
+# end def evaluate
+
+def main (argv = sys.argv [1:]):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( 'model'
+        , nargs   = '*'
+        , help    = "Models to compare, default: %s" % ', '.join (models)
+        )
+    cmd.add_argument \
+        ( '-n', '--number'
+        , type    = int
+        , help    = "Repetitions for timing, default: %(default)s"
+        , default = 3
+        )
+    args = cmd.parse_args (argv)
+    warnings.simplefilter ('ignore')
+    n = args.number
+    for name in args.model or models:
+        cls = models [name]
+        g_nec, fr_nec = evaluate (cls, False)
+        g_ff,  fr_ff  = evaluate (cls, True)
+        diff  = np.abs (g_nec - g_ff)
+        gmax  = g_nec.max ()
+        t_nec = timeit.timeit (lambda: evaluate (cls, False), number = n) / n
+        t_ff  = timeit.timeit (lambda: evaluate (cls, True),  number = n) / n
+        print ("%s:" % name)
+        print ("  maximum gain:          %8.3f dBi" % gmax)
+        d3    = diff [g_nec > gmax - 3].max ()
+        d30   = diff [g_nec > gmax - 30].max ()
+        dfr   = np.abs (fr_nec - fr_ff).max ()
+        print ("  difference (3 dB):     %8.3f dB" % d3)
+        print ("  difference (30 dB):    %8.3f dB" % d30)
+        print ("  forward/backward:      %8.3f dB" % dfr)
+        print ("  evaluation NEC:        %8.3f ms" % (t_nec * 1e3))
+        print ("  evaluation far_field:  %8.3f ms" % (t_ff  * 1e3))
+# end def main
+
+if __name__ == '__main__':
+    main ()
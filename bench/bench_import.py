@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+""" Start-up latency of the command-line entry points.
+    For each module with an entry point (see pyproject.toml) we measure
+    the time for starting a python interpreter and importing the module
+    (best of several runs, the start of a bare interpreter is
+    subtracted) and list the expensive third-party modules loaded by
+    the import. Plotting (matplotlib) and fitting (scipy) should only
+    be loaded by the actions that need them.
+"""
+from __future__ import print_function
+
+import sys
+import time
+import subprocess
+from argparse import ArgumentParser
+
+# Entry point to module, see [project.scripts] in pyproject.toml
+entry_points = \
+    { 'coaxmodel'              : 'coaxmodel'
+    , 'folded-3ele-antenna'    : 'folded_3ele'
+    , 'folded-antenna'         : 'folded'
+    , 'folded-bc-antenna'      : 'folded_bc'
+    , 'folded-bigrefl-antenna' : 'folded_bigrefl'
+    , 'hb9cv-antenna'          : 'hb9cv'
+    , 'hf-folded-dipole'       : 'hf_folded'
+    , 'hf-fuchs'               : 'hf_fuchs'
+    , 'hf-inverted-v'          : 'hf_inverted_v'
+    , 'logper-antenna'         : 'logper'
+    , 'multi-dipole'           : 'multi_dipole'
+    , 'transmission-line'      : 'tl'
+    }
+
+heavy = ('matplotlib', 'scipy', 'pga', 'PyNEC')
+
+def start (code, number):
+    """ Best time of number runs of a python interpreter executing code
+    """
+    best = None
+    for n in range (number):
+        t = time.time ()
+        subprocess.check_call \
+            ([sys.executable, '-c', code], stderr = subprocess.DEVNULL)
+        t = time.time () - t
+        if best is None or t < best:
+            best = t
+    return best
+# end def start
+
+def loaded (module):
+    """ Expensive modules loaded when importing the given module
+    """
+    code = \
+        ( 'import sys, antenna_optimizer.%s\n'
+          'print (" ".join (m for m in %r if m in sys.modules))'
+        % (module, heavy)
+        )
+    return subprocess.check_output \
+        ( [sys.executable, '-c', code]
+        , stderr             = subprocess.DEVNULL
+        , universal_newlines = True
+        ).strip ()
+# end def loaded
+
+def main (argv = sys.argv [1:]):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( 'entry_point'
+        , nargs   = '*'
+        , help    = "Entry points to measure, default: all"
+        )
+    cmd.add_argument \
+        ( '-n', '--number'
+        , type    = int
+        , help    = "Number of repetitions, default: %(default)s"
+        , default = 5
+        )
+    args = cmd.parse_args (argv)
+    base = start ('pass', args.number)
+    print ("python start-up: %8.1f ms" % (base * 1e3))
+    for name in args.entry_point or sorted (entry_points):
+        module = entry_points [name]
+        t = start ('import antenna_optimizer.%s' % module, args.number)
+        print \
+            ( "%-22s %8.1f ms  loads: %s"
+            % (name, (t - base) * 1e3, loaded (module))
+            )
+# end def main
+
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+""" Speed and accuracy of stub matching for a frequency sweep.
+    For each frequency of the sweep we compute the stub match (position
+    and length of a parallel stub) once with stub_match_iterative (the
+    bisection used by the match action of coaxmodel) and once for all
+    frequencies with stub_match_batch. We report the time, the maximum
+    difference of the results and the worst match achieved by both.
+"""
+from __future__ import print_function
+
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from antenna_optimizer.coaxmodel import coax_models
+
+def iterative (cable, f, z_l, capacitive, shortcircuit):
+    d = []
+    l = []
+    for fs in f:
+        cable.set_freq_params (fs, 1, 100, z_l)
+        dd, ll = cable.stub_match_iterative (capacitive, shortcircuit)
+        d.append (dd)
+        l.append (ll)
+    return np.array (d), np.array (l)
+# end def iterative
+
+def mismatch (cable, f, d, l, z_l, shortcircuit):
+    """ Maximum deviation of the matched impedance from Z0
+    """
+    z = cable.stub_impedance (f, d, l, z_l, shortcircuit)
+    return np.abs (z - cable.Z0).max ()
+# end def mismatch
+
+def main (argv = sys.argv [1:]):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( '-c', '--coaxmodel'
+        , help    = "Cable to use, default: %(default)s"
+        , default = 'belden_8295'
+        )
+    cmd.add_argument \
+        ( '-s', '--steps'
+        , type    = int
+        , help    = "Number of frequencies in sweep, default: %(default)s"
+        , default = 200
+        )
+    cmd.add_argument \
+        ( '-z', '--z-load'
+        , type    = complex
+        , help    = "Load impedance, default: %(default)s"
+        , default = 50-500j
+        )
+    args  = cmd.parse_args (argv)
+    cable = coax_models [args.coaxmodel]
+    f     = np.linspace (1e6, 60e6, args.steps)
+    z_l   = args.z_load
+    print ("%s, %d frequencies, load %s" % (cable.name, args.steps, z_l))
+    for capacitive in True, False:
+        for shortcircuit in True, False:
+            t = time.time ()
+            di, li = iterative (cable, f, z_l, capacitive, shortcircuit)
+            ti = time.time () - t
+            t = time.time ()
+            db, lb, nd, nl = cable.stub_match_batch \
+                (f, z_l, capacitive, shortcircuit)
+            tb = time.time () - t
+            diff = max (np.abs (di - db).max (), np.abs (li - lb).max ())
+            print \
+                ( "%-10s %-5s iterative: %8.2f ms batch: %6.2f ms"
+                  " iterations d: %2d l: %3d max. diff: %.1e m"
+                  " |z-Z0|: %.1e %.1e"
+                % ( 'capacitive' if capacitive else 'inductive'
+                  , 'short' if shortcircuit else 'open'
+                  , ti * 1e3, tb * 1e3, nd.max (), nl.max (), diff
+                  , mismatch (cable, f, di, li, z_l, shortcircuit)
+                  , mismatch (cable, f, db, lb, z_l, shortcircuit)
+                  )
+                )
+# end def main
+
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+""" Verify the analytic engine of the transmission line model against
+    NEC and compare the time needed for evaluating a model.
+    For open and short stubs in parallel and in series, each with a
+    lossless line and with a cable model, we compute the input
+    impedance with NEC (Transmission_Line_Match) and in closed form
+    (Transmission_Line_Circuit). The NEC model contains short wires
+    connecting the transmission lines, so the results differ slightly,
+    more so for higher frequencies and high load impedances.
+"""
+from __future__ import print_function
+
+import sys
+import time
+import warnings
+from argparse import ArgumentParser
+
+import numpy as np
+
+from antenna_optimizer.tl import engines
+from antenna_optimizer.coaxmodel import coax_models
+
+def model (engine, coaxmodel, is_open, is_series, args):
+    return engines [engine] \
+        ( stub_dist      = args.stub_distance
+        , stub_len       = args.stub_length
+        , is_open        = is_open
+        , is_series      = is_series
+        , f_mhz          = args.f_mhz
+        , frqstart       = args.f_mhz * 0.95
+        , frqend         = args.f_mhz * 1.05
+        , coaxmodel      = coaxmodel
+        , z_load         = args.z_load
+        , frq_step_max   = args.steps
+        , wire_radius    = 0.002
+        , copper_loading = False
+        )
+# end def model
+
+def evaluate (engine, coaxmodel, is_open, is_series, args):
+    """ Impedances and VSWRs of all frequency steps and the time needed
+        (best of args.number)
+    """
+    best = None
+    for n in range (args.number):
+        t = time.time ()
+        m = model (engine, coaxmodel, is_open, is_series, args)
+        if engine == 'nec':
+            m.compute_impedance ()
+        z = m.impedances (0, m.frq_step_range ())
+        v = m.vswr_array (0)
+        t = time.time () - t
+        if best is None or t < best:
+            best = t
+    return z, v, best
+# end def evaluate
+
+def main (argv = sys.argv [1:]):
+    cmd = ArgumentParser ()
+    cmd.add_argument \
+        ( '-c', '--coaxmodel'
+        , help    = "Cable to use, default: %(default)s"
+        , default = 'belden_8295'
+        )
+    cmd.add_argument \
+        ( '-d', '--stub-distance'
+        , type    = float
+        , help    = "Distance of stub from load, default: %(default)s"
+        , default = 3.1
+        )
+    cmd.add_argument \
+        ( '-f', '--f-mhz'
+        , type    = float
+        , help    = "Center frequency (MHz), default: %(default)s"
+        , default = 3.5
+        )
+    cmd.add_argument \
+        ( '-l', '--stub-length'
+        , type    = float
+        , help    = "Length of stub, default: %(default)s"
+        , default = 2.2
+        )
+    cmd.add_argument \
+        ( '-n', '--number'
+        , type    = int
+        , help    = "Number of repetitions, default: %(default)s"
+        , default = 3
+        )
+    cmd.add_argument \
+        ( '-s', '--steps'
+        , type    = int
+        , help    = "Number of frequency steps, default: %(default)s"
+        , default = 21
+        )
+    cmd.add_argument \
+        ( '-t', '--tolerance'
+        , type    = float
+        , help    = "Maximum relative difference of the impedance,"
+                    " default: %(default)s"
+        , default = 0.1
+        )
+    cmd.add_argument \
+        ( '-z', '--z-load'
+        , type    = complex
+        , help    = "Load impedance, default: %(default)s"
+        , default = 30+60j
+        )
+    args = cmd.parse_args (argv)
+    warnings.simplefilter ('ignore')
+    ok = True
+    for cable in None, coax_models [args.coaxmodel]:
+        for is_open in False, True:
+            for is_series in False, True:
+                zn, vn, tn = evaluate \
+                    ('nec',      cable, is_open, is_series, args)
+                za, va, ta = evaluate \
+                    ('analytic', cable, is_open, is_series, args)
+                diff = (np.abs (zn - za) / np.abs (zn)).max ()
+                ok   = ok and diff <= args.tolerance
+                print \
+                    ( "%-11s %-5s %-8s"
+                      " z diff: %6.2f%% max. swr: %7.2f %7.2f"
+                      " nec: %7.2f ms analytic: %5.2f ms"
+                    % ( cable.name if cable else 'lossless'
+                      , 'open' if is_open else 'short'
+                      , 'series' if is_series else 'parallel'
+                      , diff * 100, vn.max (), va.max ()
+                      , tn * 1e3, ta * 1e3
+                      )
+                    )
+    if not ok:
+        sys.exit (1)
+# end def main
+
+if __name__ == '__main__':
+    main ()